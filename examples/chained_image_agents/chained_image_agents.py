@@ -1,17 +1,15 @@
-import os
-from dotenv import load_dotenv
-from impossibly import Agent, Graph, START, END
+from pathlib import Path
+from impossibly import Agent, Graph, START, END, get_client, require_env
+
+# Resolve the sample image relative to this file, so the example runs from any working directory
+IMAGE_PATH = Path(__file__).parent.parent / "image_agent" / "image_input.jpeg"
 
 def __main__():
-    # Load environment variables from .env file
-    load_dotenv()
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    if not OPENAI_API_KEY:
-        raise ValueError("OpenAI API key is not set. Please check your .env file.")
+    # Check the API key is set; the .env file is loaded when impossibly is imported
+    require_env("OPENAI_API_KEY")
 
-    # Initialize the OpenAI client
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    # Use the shared OpenAI client so all agents reuse one connection pool
+    client = get_client()
 
     # Initialize Agents
     agent = Agent(
@@ -39,7 +37,7 @@ def __main__():
     graph.add_edge(untrusting, END)
 
     # Invoke the graph with an example prompt and show the thinking process
-    response = graph.invoke("What is in this image?", files = ['examples/image_input.jpeg'], show_thinking=True)
+    response = graph.invoke("What is in this image?", files = [str(IMAGE_PATH)], show_thinking=True)
     print(response)
 
 if __name__ == "__main__":
@@ -1,17 +1,11 @@
-import os
-from dotenv import load_dotenv
-from impossibly import Agent, Graph, START, END
+from impossibly import Agent, Graph, START, END, get_client, require_env
 
 def __main__():
-    # Load environment variables from .env file
-    load_dotenv()
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    if not OPENAI_API_KEY:
-        raise ValueError("OpenAI API key is not set. Please check your .env file.")
+    # Check the API key is set; the .env file is loaded when impossibly is imported
+    require_env("OPENAI_API_KEY")
 
-    # Initialize the OpenAI client
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    # Use the shared OpenAI client so all agents reuse one connection pool
+    client = get_client()
 
     # Initialize Agents
     gating_network = Agent(
@@ -97,9 +91,8 @@ def __main__():
     graph.add_edge(philosopher, [founder, summarizer])
     graph.add_edge(summarizer, END)
 
-    # Invoke the graph with an example prompt and show the thinking process
-    response = graph.invoke("Tell me how I can live my best life. Have both agents have a long discussion to find an answer.", show_thinking=True)
-    print(response)
+    # Invoke the graph with an example prompt, showing the thinking process and streaming the summarizer's answer
+    graph.invoke("Tell me how I can live my best life. Have both agents have a long discussion to find an answer.", show_thinking=True, stream=True)
 
 if __name__ == "__main__":
     __main__()
\ No newline at end of file
@@ -1,17 +1,11 @@
-import os
-from dotenv import load_dotenv
-from impossibly import Agent, Graph, START, END
+from impossibly import Agent, Graph, START, END, get_client, require_env
 
 def __main__():
-    # Load environment variables from .env file
-    load_dotenv()
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    if not OPENAI_API_KEY:
-        raise ValueError("OpenAI API key is not set. Please check your .env file.")
+    # Check the API key is set; the .env file is loaded when impossibly is imported
+    require_env("OPENAI_API_KEY")
 
-    # Initialize the OpenAI client
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    # Use the shared OpenAI client so all agents reuse one connection pool
+    client = get_client()
 
     # Initialize Agents
     gating_network = Agent(
@@ -143,9 +137,10 @@ def __main__():
             """,
         description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem."
     )
+    # Summarizing only condenses text the experts already wrote, so a small model is as good as a reasoning model here
     summarizer = Agent(
         client, 
-        model="o1", 
+        model="gpt-4o-mini", 
         name="Summarizer", 
         system_prompt="""
             You are a Summarizer Agent. Your task is to distill complex or lengthy responses into clear, concise summaries 
@@ -177,9 +172,8 @@ def __main__():
     graph.add_edge([scientist, economist, psychologist, historian, engineer, legal_expert, medical_expert, technology_expert], [scientist, economist, psychologist, historian, engineer, legal_expert, medical_expert, technology_expert, summarizer])
     graph.add_edge(summarizer, END)
 
-    # Invoke the graph with an example prompt and show the thinking process
-    response = graph.invoke("Tell me how I can live my best life. Have all agents have a long discussion to find an answer.", show_thinking=True)
-    print(response)
+    # Invoke the graph with an example prompt, showing the thinking process and streaming the summarizer's answer
+    graph.invoke("Tell me how I can live my best life. Have all agents have a long discussion to find an answer.", show_thinking=True, stream=True)
 
 if __name__ == "__main__":
     __main__()
\ No newline at end of file
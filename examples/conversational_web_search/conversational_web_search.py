@@ -5,10 +5,57 @@ that require web searches, using the Tavily API for real-time information.
 """
 
 import os
-from dotenv import load_dotenv
-from impossibly import Agent, Graph, Tool, START, END
+import asyncio
+from functools import lru_cache
+from impossibly import Agent, Graph, Tool, ResponseCache, START, END, get_client, require_env
+from impossibly.utils.cache import make_key
 
-def perform_web_search(query, max_results=5):
+# The chat model used by every agent, read once when the example loads (the .env file is loaded on import of impossibly)
+MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4-turbo-preview")
+
+# Maximum number of Tavily searches in flight at once, to respect its rate limits
+MAX_CONCURRENT_SEARCHES = 5
+
+# Repeated searches, such as the Researcher and Analyst looking up the same topic, are answered from this cache for an hour
+search_cache = ResponseCache(maxsize=512, ttl=3600)
+
+# Queries with at least this many words, or with any of these keywords, get Tavily's slower "advanced" search
+ADVANCED_SEARCH_MIN_WORDS = 8
+ADVANCED_SEARCH_KEYWORDS = ("compare", "analyze", "analyse", "implications", "challenges", "pros and cons", "impact")
+
+# Search options that are the same for every query, built once rather than on every call
+SEARCH_OPTIONS = {
+    "include_answer": True,  # Include an AI-generated answer in the response
+    "include_raw_content": False,  # Don't include raw HTML content
+    "include_images": False,  # Don't include images
+    "include_image_descriptions": False,  # Don't include image descriptions
+}
+
+def choose_search_depth(query):
+    """
+    Picks Tavily's search depth for a query. Short factual lookups use "basic", which costs and takes about half as 
+    much as "advanced"; long or analytical queries keep "advanced" for more comprehensive results.
+    
+    Args:
+        query (str): The search query
+        
+    Returns:
+        str: "advanced" or "basic"
+    """
+    lowered = query.lower()
+    if len(query.split()) >= ADVANCED_SEARCH_MIN_WORDS or any(keyword in lowered for keyword in ADVANCED_SEARCH_KEYWORDS):
+        return "advanced"
+    return "basic"
+
+@lru_cache(maxsize=None)
+def get_tavily_client():
+    """
+    Returns a shared async Tavily client, so every search reuses one connection pool instead of a new client per call.
+    """
+    from tavily import AsyncTavilyClient
+    return AsyncTavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+
+async def perform_web_search(query, max_results=5):
     """
     Perform a web search using Tavily API and return the results.
     
@@ -19,26 +66,43 @@ def perform_web_search(query, max_results=5):
     Returns:
         dict: The search results from Tavily
     """
-    from tavily import TavilyClient
-    
-    # Initialize Tavily client
-    tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-    
-    # Perform the web search
-    search_results = tavily_client.search(
+    # Skip the round trip for searches made recently
+    cache_key = make_key(query, max_results)
+    search_results = search_cache.get(cache_key)
+    if search_results is not None:
+        return search_results
+
+    # Perform the web search without blocking other agents while waiting on the response
+    search_results = await get_tavily_client().search(
         query=query,
         max_results=max_results,
-        search_depth="advanced",  # Use advanced search for more comprehensive results
-        include_answer=True,  # Include an AI-generated answer in the response
-        include_raw_content=False,  # Don't include raw HTML content
-        include_images=False,  # Don't include images
-        include_image_descriptions=False,  # Don't include image descriptions
-        include_domains=[],  # No specific domains to include
-        exclude_domains=[]  # No specific domains to exclude
+        search_depth=choose_search_depth(query),  # Only use the slower advanced search for complex queries
+        **SEARCH_OPTIONS
     )
     
+    search_cache.set(cache_key, search_results)
     return search_results
 
+async def perform_web_search_batch(queries, max_results=5):
+    """
+    Perform several web searches at once using Tavily API.
+    
+    Args:
+        queries (list[str]): The search queries
+        max_results (int): Maximum number of results to return per query
+        
+    Returns:
+        dict: The search results from Tavily for each query
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
+
+    async def search(query):
+        async with semaphore:
+            return await perform_web_search(query, max_results)
+
+    results = await asyncio.gather(*(search(query) for query in queries))
+    return dict(zip(queries, results))
+
 def format_search_results(search_results, query):
     """
     Format the search results into a prompt for the agent.
@@ -50,40 +114,39 @@ def format_search_results(search_results, query):
     Returns:
         str: Formatted prompt for the agent
     """
-    # Format the search results into a prompt
-    formatted_results = "Here are the search results for your query:\n\n"
+    # Format the search results into a prompt, collecting the parts and joining them once at the end
+    parts = ["Here are the search results for your query:\n\n"]
     
     # Add the AI-generated answer if available
     if search_results.get("answer"):
-        formatted_results += f"AI-Generated Answer: {search_results['answer']}\n\n"
+        parts.append(f"AI-Generated Answer: {search_results['answer']}\n\n")
     
     # Add the search results
     for i, result in enumerate(search_results.get("results", []), 1):
-        formatted_results += f"Source {i}:\n"
-        formatted_results += f"Title: {result.get('title', 'N/A')}\n"
-        formatted_results += f"URL: {result.get('url', 'N/A')}\n"
-        formatted_results += f"Content: {result.get('content', 'N/A')}\n"
-        formatted_results += f"Relevance Score: {result.get('score', 'N/A')}\n\n"
+        parts.append(
+            f"Source {i}:\n"
+            f"Title: {result.get('title', 'N/A')}\n"
+            f"URL: {result.get('url', 'N/A')}\n"
+            f"Content: {result.get('content', 'N/A')}\n"
+            f"Relevance Score: {result.get('score', 'N/A')}\n\n"
+        )
 
     # Add the user's original query
-    formatted_results += f"\nBased on these search results, please answer: {query}"
+    parts.append(f"\nBased on these search results, please answer: {query}")
     
-    return formatted_results
+    return "".join(parts)
+
+# Maximum number of conversations in flight at once, to stay within the OpenAI and Tavily rate limits
+MAX_CONCURRENT_RUNS = 3
 
 def __main__():
-    # Load environment variables from .env file
-    load_dotenv()
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    if not OPENAI_API_KEY:
-        raise ValueError("OpenAI API key is not set. Please check your .env file.")
+    # Check the API key is set; the .env file is loaded when impossibly is imported
+    require_env("OPENAI_API_KEY")
     
-    TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-    if not TAVILY_API_KEY:
-        raise ValueError("Tavily API key is not set. Please check your .env file.")
+    require_env("TAVILY_API_KEY")
 
-    # Initialize the OpenAI client
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    # Use the shared OpenAI client so all agents reuse one connection pool
+    client = get_client()
 
     # Define our web search tool
     web_search_tool = Tool(
@@ -105,6 +168,27 @@ def __main__():
         ]
     )
     
+    # Define our batch web search tool, for running several searches at once
+    web_search_batch_tool = Tool(
+        name="web_search_batch",
+        description="Perform several web searches at once using Tavily API",
+        function=perform_web_search_batch,
+        parameters=[
+            {
+                "name": "queries",
+                "type": list,
+                "items": str,
+                "description": "The search queries"
+            },
+            {
+                "name": "max_results",
+                "type": int,
+                "description": "Maximum number of results to return per query",
+                "default": 5
+            }
+        ]
+    )
+    
     # Define our format results tool
     format_results_tool = Tool(
         name="format_search_results",
@@ -121,20 +205,22 @@ def __main__():
                 "type": str,
                 "description": "The original search query"
             }
-        ]
+        ],
+        cacheable=True  # Formatting only depends on the results and query, so repeated calls are memoized
     )
     
     # Initialize the first web search agent (Researcher)
     researcher = Agent(
         client, 
-        model=os.getenv("MODEL_NAME", "gpt-4-turbo-preview"), 
+        model=MODEL_NAME, 
         name="Researcher", 
         system_prompt="""
             You are a Research Agent specialized in gathering and analyzing information from the web.
             Your role is to search for information, analyze it, and provide insights to the other agent.
             
             When you receive a query:
-            1. Use the web_search tool to find relevant information
+            1. Decide on every search you need up front and request them together in one response (or use web_search_batch), 
+               since independent searches are run in parallel
             2. Format the search results using the format_search_results tool
             3. Analyze the information and provide your insights
             4. Engage in a conversation with the other agent, asking questions or providing information
@@ -144,20 +230,21 @@ def __main__():
             When talking to the other agent, be collaborative and help build on each other's insights.
         """,
         description="A research agent that searches for and analyzes information from the web",
-        tools=[web_search_tool, format_results_tool]
+        tools=[web_search_tool, web_search_batch_tool, format_results_tool]
     )
     
     # Initialize the second web search agent (Analyst)
     analyst = Agent(
         client, 
-        model=os.getenv("MODEL_NAME", "gpt-4-turbo-preview"), 
+        model=MODEL_NAME, 
         name="Analyst", 
         system_prompt="""
             You are an Analysis Agent specialized in interpreting and synthesizing information.
             Your role is to take the information provided by the Researcher, analyze it further, and provide deeper insights.
             
             When you receive information:
-            1. Use the web_search tool to find additional information if needed
+            1. If you need additional information, decide on every search up front and request them together in one response 
+               (or use web_search_batch), since independent searches are run in parallel
             2. Format the search results using the format_search_results tool
             3. Analyze the information and provide your insights
             4. Engage in a conversation with the other agent, asking questions or providing information
@@ -167,13 +254,13 @@ def __main__():
             When talking to the other agent, be collaborative and help build on each other's insights.
         """,
         description="An analysis agent that interprets and synthesizes information from the web",
-        tools=[web_search_tool, format_results_tool]
+        tools=[web_search_tool, web_search_batch_tool, format_results_tool]
     )
     
     # Initialize the summarizer agent
     summarizer = Agent(
         client, 
-        model=os.getenv("MODEL_NAME", "gpt-4-turbo-preview"), 
+        model=MODEL_NAME, 
         name="Summarizer", 
         system_prompt="""
             You are a Summarizer Agent. Your task is to distill complex or lengthy responses into clear, concise summaries 
@@ -208,15 +295,15 @@ def __main__():
     graph.add_edge(analyst, summarizer)
     graph.add_edge(summarizer, END)
 
-    # Test prompts
-    response = graph.invoke("What are the latest developments in quantum computing? Have a detailed conversation about this topic.", show_thinking=True)
-    print(f"Response: {response}")
-    
-    response = graph.invoke("What are the ethical implications of artificial intelligence? Discuss this topic in depth.", show_thinking=True)
-    print(f"Response: {response}")
-    
-    response = graph.invoke("What are the current challenges and solutions for climate change? Have a thorough discussion about this.", show_thinking=True)
-    print(f"Response: {response}")
+    # Test prompts, run concurrently since each conversation is independent. Thinking isn't shown, as the logs of 
+    # concurrent runs would interleave
+    prompts = [
+        "What are the latest developments in quantum computing? Have a detailed conversation about this topic.",
+        "What are the ethical implications of artificial intelligence? Discuss this topic in depth.",
+        "What are the current challenges and solutions for climate change? Have a thorough discussion about this.",
+    ]
+    for response in graph.batch(prompts, max_concurrency=MAX_CONCURRENT_RUNS):
+        print(f"Response: {response}")
 
 if __name__ == "__main__":
     __main__() 
\ No newline at end of file
@@ -6,92 +6,116 @@ based on query complexity, demonstrating how agents can optimize resource alloca
 decision-making and hierarchical collaboration.
 """
 
-import os
-from dotenv import load_dotenv
-from impossibly import Agent, Graph, Tool, START, END
+from functools import lru_cache
+from impossibly import Agent, Graph, Tool, START, END, get_client, require_env
+
+# Expert agent definitions
+EXPERT_DEFINITIONS = {
+    "scientist": {
+        "name": "Scientist",
+        "system_prompt": """
+            You are a Scientist Expert Agent. Your role is to analyze problems using empirical data, scientific methodology, and critical reasoning. When you receive a prompt:
+            1. Examine the problem from a scientific perspective.
+            2. Identify hypotheses and consider experimental evidence.
+            3. Explain complex phenomena in simple terms.
+            4. Suggest practical experiments or data-driven insights.
+            Your response should be analytical, objective, and based on current scientific knowledge.
+        """,
+        "description": "Scientific expert providing evidence-based analysis"
+    },
+    "economist": {
+        "name": "Economist",
+        "system_prompt": """
+            You are an Economist Expert Agent. Your role is to evaluate issues through the lens of economic theory and market dynamics. When you receive a prompt:
+            1. Analyze the economic implications of the problem.
+            2. Consider incentives, costs, and benefits.
+            3. Offer insights on policy, market trends, or resource allocation.
+            4. Present data or models to support your conclusions.
+            Your response should be quantitative where possible and focus on rational economic analysis.
+        """,
+        "description": "Economic expert analyzing financial and market implications"
+    },
+    "psychologist": {
+        "name": "Psychologist",
+        "system_prompt": """
+            You are a Psychology Expert Agent. Your role is to understand problems by exploring human behavior, cognitive processes, and emotional factors. When you receive a prompt:
+            1. Analyze the emotional or cognitive dimensions of the issue.
+            2. Consider motivations, biases, or mental health aspects.
+            3. Suggest strategies for behavior change or improved well-being.
+            4. Draw on established psychological theories.
+            Your response should be empathetic, evidence-based, and practical.
+        """,
+        "description": "Psychological expert addressing behavioral and cognitive aspects"
+    },
+    "engineer": {
+        "name": "Engineer",
+        "system_prompt": """
+            You are an Engineering Expert Agent. Your role is to solve problems by applying technical and design principles. When you receive a prompt:
+            1. Break down the problem into technical components.
+            2. Propose systems, designs, or practical solutions.
+            3. Evaluate feasibility and resource requirements.
+            4. Use clear technical language and diagrams if needed.
+            Your response should be logical, precise, and geared towards implementable solutions.
+        """,
+        "description": "Engineering expert providing technical solutions"
+    },
+    "legal_expert": {
+        "name": "Legal Expert",
+        "system_prompt": """
+            You are a Legal Expert Agent. Your role is to analyze issues from a legal and regulatory perspective. When you receive a prompt:
+            1. Identify relevant laws, regulations, or legal precedents.
+            2. Assess risks and legal implications.
+            3. Provide clear advice on compliance or risk mitigation.
+            4. Use plain language while ensuring legal accuracy.
+            Your response should be cautious, well-informed, and focused on protecting rights and interests.
+        """,
+        "description": "Legal expert analyzing regulatory and compliance aspects"
+    }
+}
+
+@lru_cache(maxsize=None)
+def get_team_templates():
+    """
+    Builds the expert and synthesizer agents once. Teams work with clones of these templates, which share everything 
+    but the conversation history, instead of constructing new agents on every delegation.
+    
+    Returns:
+        The expert agents keyed by expert type, and the team synthesizer agent
+    """
+    client = get_client(asynchronous=True)
+    experts = {expert_type: Agent(client, model="gpt-4o", **definition) for expert_type, definition in EXPERT_DEFINITIONS.items()}
+    synthesizer = Agent(
+        client,
+        model="gpt-4o",
+        name="TeamSynthesizer",
+        system_prompt="""
+            You are the Team Synthesizer. Your role is to:
+            1. Analyze the inputs from all expert team members
+            2. Integrate their perspectives into a cohesive solution
+            3. Resolve any contradictions or inconsistencies
+            4. Produce a comprehensive and actionable response
+            
+            Your synthesis should be clear, balanced, and reflect the combined expertise of the team.
+        """,
+        description="Synthesizes the team's insights into a cohesive response"
+    )
+    return experts, synthesizer
 
 # Define our recursive graph creation tool
-def create_expert_team(query, required_experts, team_task):
+async def create_expert_team(query, required_experts, team_task):
     """
     Creates a specialized team of experts based on the requirements and executes their work.
     
     Args:
         query: The original user query to be addressed
-        required_experts: Comma-separated list of expert types needed (e.g., "scientist,economist")
+        required_experts: List of expert types needed (e.g., ["scientist", "economist"])
         team_task: Description of what the team should accomplish
         
     Returns:
         The final response from the expert team graph
     """
-    from openai import AsyncOpenAI
-    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    
-    # Parse the comma-separated list of experts
-    expert_list = [expert.strip() for expert in required_experts.split(",")]
-    
-    # Expert agent definitions
-    expert_definitions = {
-        "scientist": {
-            "name": "Scientist",
-            "system_prompt": """
-                You are a Scientist Expert Agent. Your role is to analyze problems using empirical data, scientific methodology, and critical reasoning. When you receive a prompt:
-                1. Examine the problem from a scientific perspective.
-                2. Identify hypotheses and consider experimental evidence.
-                3. Explain complex phenomena in simple terms.
-                4. Suggest practical experiments or data-driven insights.
-                Your response should be analytical, objective, and based on current scientific knowledge.
-            """,
-            "description": "Scientific expert providing evidence-based analysis"
-        },
-        "economist": {
-            "name": "Economist",
-            "system_prompt": """
-                You are an Economist Expert Agent. Your role is to evaluate issues through the lens of economic theory and market dynamics. When you receive a prompt:
-                1. Analyze the economic implications of the problem.
-                2. Consider incentives, costs, and benefits.
-                3. Offer insights on policy, market trends, or resource allocation.
-                4. Present data or models to support your conclusions.
-                Your response should be quantitative where possible and focus on rational economic analysis.
-            """,
-            "description": "Economic expert analyzing financial and market implications"
-        },
-        "psychologist": {
-            "name": "Psychologist",
-            "system_prompt": """
-                You are a Psychology Expert Agent. Your role is to understand problems by exploring human behavior, cognitive processes, and emotional factors. When you receive a prompt:
-                1. Analyze the emotional or cognitive dimensions of the issue.
-                2. Consider motivations, biases, or mental health aspects.
-                3. Suggest strategies for behavior change or improved well-being.
-                4. Draw on established psychological theories.
-                Your response should be empathetic, evidence-based, and practical.
-            """,
-            "description": "Psychological expert addressing behavioral and cognitive aspects"
-        },
-        "engineer": {
-            "name": "Engineer",
-            "system_prompt": """
-                You are an Engineering Expert Agent. Your role is to solve problems by applying technical and design principles. When you receive a prompt:
-                1. Break down the problem into technical components.
-                2. Propose systems, designs, or practical solutions.
-                3. Evaluate feasibility and resource requirements.
-                4. Use clear technical language and diagrams if needed.
-                Your response should be logical, precise, and geared towards implementable solutions.
-            """,
-            "description": "Engineering expert providing technical solutions"
-        },
-        "legal_expert": {
-            "name": "Legal Expert",
-            "system_prompt": """
-                You are a Legal Expert Agent. Your role is to analyze issues from a legal and regulatory perspective. When you receive a prompt:
-                1. Identify relevant laws, regulations, or legal precedents.
-                2. Assess risks and legal implications.
-                3. Provide clear advice on compliance or risk mitigation.
-                4. Use plain language while ensuring legal accuracy.
-                Your response should be cautious, well-informed, and focused on protecting rights and interests.
-            """,
-            "description": "Legal expert analyzing regulatory and compliance aspects"
-        }
-    }
+    # Reuse the shared async client, so every team keeps the executive's connection pool
+    client = get_client(asynchronous=True)
     
     # Create the team organizer agent
     team_organizer = Agent(
@@ -112,40 +136,17 @@ def create_expert_team(query, required_experts, team_task):
         description="Coordinates the team of experts and guides them toward a solution"
     )
     
-    # Create expert agents based on the required_experts list
-    expert_agents = []
-    for expert_type in expert_list:
-        if expert_type in expert_definitions:
-            expert_def = expert_definitions[expert_type]
-            expert_agent = Agent(
-                client,
-                model="gpt-4o",
-                name=expert_def["name"],
-                system_prompt=expert_def["system_prompt"],
-                description=expert_def["description"]
-            )
-            expert_agents.append(expert_agent)
+    # Clone the required experts from their templates, so each team has its own conversation history. Unknown and 
+    # repeated expert types are skipped
+    expert_templates, synthesizer_template = get_team_templates()
+    expert_agents = [expert_templates[expert_type].clone() for expert_type in dict.fromkeys(required_experts) if expert_type in expert_templates]
     
-    # Create the team synthesizer agent
-    team_synthesizer = Agent(
-        client,
-        model="gpt-4o",
-        name="TeamSynthesizer",
-        system_prompt="""
-            You are the Team Synthesizer. Your role is to:
-            1. Analyze the inputs from all expert team members
-            2. Integrate their perspectives into a cohesive solution
-            3. Resolve any contradictions or inconsistencies
-            4. Produce a comprehensive and actionable response
-            
-            Your synthesis should be clear, balanced, and reflect the combined expertise of the team.
-        """,
-        description="Synthesizes the team's insights into a cohesive response",
-        shared_memory=expert_agents  # Allow synthesizer to see all expert responses
-    )
+    # Clone the synthesizer, letting it see every expert's response
+    team_synthesizer = synthesizer_template.clone()
+    team_synthesizer.shared_memory = expert_agents
     
-    # Build the expert team graph
-    team_graph = Graph()
+    # Build the expert team graph, fanning out to the experts so they all work at the same time
+    team_graph = Graph(fan_out=True)
     team_graph.add_node(team_organizer)
     team_graph.add_node(expert_agents)
     team_graph.add_node(team_synthesizer)
@@ -155,20 +156,16 @@ def create_expert_team(query, required_experts, team_task):
     team_graph.add_edge(expert_agents, team_synthesizer)
     team_graph.add_edge(team_synthesizer, END)
     
-    # Execute the team's analysis - the Graph.invoke method handles async internally
-    team_response = team_graph.invoke(f"Original query: {query}\nTeam task: {team_task}")
+    # Execute the team's analysis - this tool runs inside the executive's event loop, so await the graph directly
+    team_response = await team_graph.invoke(f"Original query: {query}\nTeam task: {team_task}")
     return team_response
 
 def __main__():
-    # Load environment variables from .env file
-    load_dotenv()
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    if not OPENAI_API_KEY:
-        raise ValueError("OpenAI API key is not set. Please check your .env file.")
+    # Check the API key is set; the .env file is loaded when impossibly is imported
+    require_env("OPENAI_API_KEY")
 
-    # Initialize the OpenAI client
-    from openai import AsyncOpenAI
-    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    # Use the shared async OpenAI client, which the expert teams reuse as well
+    client = get_client(asynchronous=True)
 
     # Create the graph creation tool
     create_expert_team_tool = Tool(
@@ -183,8 +180,9 @@ def __main__():
             },
             {
                 "name": "required_experts",
-                "type": str,
-                "description": "Comma-separated list of expert types needed (options: scientist, economist, psychologist, engineer, legal_expert)"
+                "type": list,
+                "items": str,
+                "description": "The expert types needed (options: scientist, economist, psychologist, engineer, legal_expert)"
             },
             {
                 "name": "team_task",
@@ -1,28 +1,20 @@
-import os
 from pathlib import Path
-from dotenv import load_dotenv
-from impossibly import Agent, Graph, START, END
+from impossibly import Agent, Graph, START, END, get_client, require_env
 
 # Define the path to the image file
 IMAGE_PATH = Path(__file__).parent / "image_input.jpeg"
 
 
 def __main__():
-    # Load environment variables from .env file
-    load_dotenv()
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    if not OPENAI_API_KEY:
-        raise ValueError(
-            "OpenAI API key is not set. Please check your .env file."
-        )
+    # Check the API key is set; the .env file is loaded when impossibly is imported
+    require_env("OPENAI_API_KEY")
 
     # Check if the image file exists
     if not IMAGE_PATH.exists():
         raise FileNotFoundError(f"Image file not found at {IMAGE_PATH}")
 
-    # Initialize the OpenAI client
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    # Use the shared OpenAI client so all agents reuse one connection pool
+    client = get_client()
 
     # Initialize Agents
     agent = Agent(
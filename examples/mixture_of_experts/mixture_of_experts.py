@@ -1,31 +1,83 @@
-import os
-from dotenv import load_dotenv
-from impossibly import Agent, Graph, START, END
+import argparse
+from impossibly import Agent, Graph, START, END, get_client, require_env
 
-def __main__():
-    # Load environment variables from .env file
-    load_dotenv()
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    if not OPENAI_API_KEY:
-        raise ValueError("OpenAI API key is not set. Please check your .env file.")
+# Experts answer with just their key insights and a conclusion, following a strict JSON schema. The summarizer reads 
+# every expert's answer, so keeping them to labelled, compact fields keeps its input small as the panel grows
+EXPERT_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "expert_answer",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "key_insights": {"type": "array", "items": {"type": "string"}},
+                "conclusion": {"type": "string"},
+            },
+            "required": ["key_insights", "conclusion"],
+            "additionalProperties": False,
+        },
+    },
+}
 
-    # Initialize the OpenAI client
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
+def make_expert_panels(client, experts, max_experts_per_call=4):
+    """
+    Groups experts into panel agents that each answer for several experts in a single request, trading slightly 
+    longer responses for fewer API calls.
+    
+    Args:
+        client: The OpenAI client used by the panels
+        experts (list[Agent]): The experts to group
+        max_experts_per_call (int): The maximum number of experts answered for in one request
+        
+    Returns:
+        list[Agent]: The panel agents
+    """
+    panels = []
+    for start in range(0, len(experts), max_experts_per_call):
+        group = experts[start:start + max_experts_per_call]
+        names = ", ".join(expert.name for expert in group)
+        sections = "\n\n".join(f"### {expert.name}\n{expert.system_prompt}" for expert in group)
+        panels.append(Agent(
+            client,
+            model="gpt-4o",
+            name=f"Panel{len(panels) + 1}",
+            system_prompt=(
+                f"You answer the prompt separately as each of the following experts: {names}. Keep each expert's answer "
+                f"independent of the others. Respond only with a JSON object whose keys are the expert names and whose "
+                f"values are each expert's complete answer.\n\n{sections}"
+            ),
+            description=f"A panel answering as {names}",
+            response_format={"type": "json_object"}
+        ))
+    return panels
+
+def __main__(batched=False, max_experts_per_call=4):
+    # Check the API key is set; the .env file is loaded when impossibly is imported
+    require_env("OPENAI_API_KEY")
+
+    # Use the shared async OpenAI client so the experts' concurrent requests share one connection pool
+    client = get_client(asynchronous=True)
+
+    # When batched, the gating network's routes are panels of experts rather than the experts themselves
+    if batched:
+        routing = "By default every panel answers in parallel; each panel answers for the experts named in its description. Only route to a single panel if the query clearly concerns just the fields of its experts."
+    else:
+        routing = "By default every expert answers in parallel; only route to a single specialized agent if the query clearly concerns just that agent's field."
 
     # Initialize Agents
     gating_network = Agent(
         client, 
         model="gpt-4o", 
         name="GatingNetwork", 
-        system_prompt="""
+        system_prompt=f"""
             You are the Gating Network of an intelligent agent system. Your task is twofold:
-            1. Analyze the user's input and decide which specialized agent (e.g., Philosopher, Founder) is best suited to address the query.
-            2. Rewrite the original user prompt into a detailed, context-rich instruction tailored to that agent. Include any missing context or clarifying details to ensure the selected agent fully understands the task. Make sure it knows to have a long and thoughtful conversation with the other agent to refine the final response.
+            1. Analyze the user's input. {routing}
+            2. Rewrite the original user prompt into a detailed, context-rich instruction for the experts. Include any missing context or clarifying details to ensure the experts fully understand the task.
 
-            Your response should be clear, succinct, and structured to seamlessly guide and foster a productive conversation between the two agents.
+            Your response should be clear, succinct, and structured so that each expert on the panel (scientist, economist, psychologist, historian, engineer, legal, medical and technology) can answer from its own perspective, and their answers can be summarized into one.
             """,
-        description="This agent takes the user's input and decides which agent to pass it to. It then rewrites the user's prompt to be detailed for that specific agent."
+        description="This agent takes the user's input and decides which experts to pass it to, by default the whole panel. It then rewrites the user's prompt to be detailed for those experts."
     )
     scientist = Agent(
         client, 
@@ -39,7 +91,8 @@ def __main__():
             4. Suggest practical experiments or data-driven insights.
             Your response should be analytical, objective, and based on current scientific knowledge.
             """,
-        description="This agent is an expert in philosophy and will imagine and expand upon problems in detailed philosophical theory."
+        description="This agent is an expert in philosophy and will imagine and expand upon problems in detailed philosophical theory.",
+        response_format=EXPERT_RESPONSE_FORMAT
     )
     economist = Agent(
         client, 
@@ -53,7 +106,8 @@ def __main__():
             4. Present data or models to support your conclusions.
             Your response should be quantitative where possible and focus on rational economic analysis.
             """,
-        description="This agent is an expert in philosophy and will imagine and expand upon problems in detailed philosophical theory."
+        description="This agent is an expert in philosophy and will imagine and expand upon problems in detailed philosophical theory.",
+        response_format=EXPERT_RESPONSE_FORMAT
     )
     psychologist = Agent(
         client, 
@@ -68,7 +122,8 @@ def __main__():
             Your response should be empathetic, evidence-based, and practical.
 
             """,
-        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem."
+        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem.",
+        response_format=EXPERT_RESPONSE_FORMAT
     )
     historian = Agent(
         client, 
@@ -82,7 +137,8 @@ def __main__():
             4. Ensure your response is well-supported by historical facts.
             Your response should be detailed, contextual, and help users understand the evolution of the problem.
             """,
-        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem."
+        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem.",
+        response_format=EXPERT_RESPONSE_FORMAT
     )
     engineer = Agent(
         client, 
@@ -97,7 +153,8 @@ def __main__():
             Your response should be logical, precise, and geared towards implementable solutions.
 
             """,
-        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem."
+        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem.",
+        response_format=EXPERT_RESPONSE_FORMAT
     )
     legal_expert = Agent(
         client, 
@@ -111,7 +168,8 @@ def __main__():
             4. Use plain language while ensuring legal accuracy.
             Your response should be cautious, well-informed, and focused on protecting rights and interests.
             """,
-        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem."
+        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem.",
+        response_format=EXPERT_RESPONSE_FORMAT
     )
     medical_expert = Agent(
         client, 
@@ -126,7 +184,8 @@ def __main__():
             Your response should be cautious, informative, and prioritize patient safety.
 
             """,
-        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem."
+        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem.",
+        response_format=EXPERT_RESPONSE_FORMAT
     )
     technology_expert = Agent(
         client, 
@@ -141,11 +200,13 @@ def __main__():
             Your response should be forward-thinking, practical, and focus on innovative solutions.
 
             """,
-        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem."
+        description="This agent is an extremely an critical expert startup founder that is purpose-driven will make clear and critique the issues in a problem.",
+        response_format=EXPERT_RESPONSE_FORMAT
     )
+    # Summarizing only condenses text the experts already wrote, so a small model is as good as a reasoning model here
     summarizer = Agent(
         client, 
-        model="o1", 
+        model="gpt-4o-mini", 
         name="Summarizer", 
         system_prompt="""
             You are a Summarizer Agent. Your task is to distill complex or lengthy responses into clear, concise summaries 
@@ -166,15 +227,22 @@ def __main__():
         shared_memory=[scientist, economist, psychologist, historian, engineer, legal_expert, medical_expert, technology_expert]
     )
 
-    # Initialize and build the graph
-    graph = Graph()
+    # When batched, several experts answer in each request, so 8 experts only take 2 requests with the default panel size
+    experts = [scientist, economist, psychologist, historian, engineer, legal_expert, medical_expert, technology_expert]
+    if batched:
+        experts = make_expert_panels(client, experts, max_experts_per_call)
+        summarizer.shared_memory = experts
+
+    # Initialize and build the graph, fanning out to every expert at once (up to 8 requests in flight) unless the 
+    # gating network routes to a single one
+    graph = Graph(fan_out=True, max_concurrency=8)
     graph.add_node(gating_network)
-    graph.add_node([scientist, economist, psychologist, historian, engineer, legal_expert, medical_expert, technology_expert])
+    graph.add_node(experts)
     graph.add_node(summarizer)
 
     graph.add_edge(START, gating_network)
-    graph.add_edge(gating_network, [scientist, economist, psychologist, historian, engineer, legal_expert, medical_expert, technology_expert])
-    graph.add_edge([scientist, economist, psychologist, historian, engineer, legal_expert, medical_expert, technology_expert], summarizer)
+    graph.add_edge(gating_network, experts)
+    graph.add_edge(experts, summarizer)
     graph.add_edge(summarizer, END)
 
     # Invoke the graph with an example prompt and show the thinking process
@@ -182,4 +250,8 @@ def __main__():
     print(response)
 
 if __name__ == "__main__":
-    __main__()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the mixture of experts example.")
+    parser.add_argument("--batched", action="store_true", help="Answer for several experts in each request")
+    parser.add_argument("--max-experts-per-call", type=int, default=4, help="The number of experts answered for in each batched request")
+    args = parser.parse_args()
+    __main__(args.batched, args.max_experts_per_call)
\ No newline at end of file
@@ -1,17 +1,37 @@
-import os
-from dotenv import load_dotenv
-from impossibly import Agent, Graph, START, END
+import argparse
+from impossibly import Agent, Graph, START, END, get_client, require_env
 
-def __main__():
-    # Load environment variables from .env file
-    load_dotenv()
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    if not OPENAI_API_KEY:
-        raise ValueError("OpenAI API key is not set. Please check your .env file.")
+def make_fused_agent(client):
+    """
+    Builds a single agent that performs all three stages of the chain in one request, saving the two round trips 
+    between hops. The intermediate stages are still written out, as the chain's later stages depend on them.
+    
+    Args:
+        client: The OpenAI client used by the agent
+        
+    Returns:
+        Agent: The fused agent
+    """
+    return Agent(
+        client, 
+        model="gpt-4o", 
+        name="FusedAgent", 
+        system_prompt="""
+            Perform the following three stages in order, labelling each one.
+            Stage 1: Rewrite my prompt to be long and detailed, explaining things I may have skimmed over or been brief about.
+            Stage 2: Think critically to solve the detailed problem from Stage 1, writing out your entire thought process step by step before giving your solution.
+            Stage 3: Reword the solution from Stage 2 to be brief, giving just the solution in one line.
+            End your response with the line "Solution:" followed by your Stage 3 output.
+            """,
+        description="This agent rewrites the input in detail, reasons through it step by step and outputs a brief solution, all in one response."
+    )
+
+def __main__(fused=False):
+    # Check the API key is set; the .env file is loaded when impossibly is imported
+    require_env("OPENAI_API_KEY")
 
-    # Initialize the OpenAI client
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    # Use the shared OpenAI client so all agents reuse one connection pool
+    client = get_client()
 
     # Initialize Agents
     agent1 = Agent(
@@ -50,18 +70,30 @@ def __main__():
 
     # Initialize and build the graph
     graph = Graph()
-    graph.add_node(agent1)
-    graph.add_node(agent2)
-    graph.add_node(agent3)
+    if fused:
+        # Run all three stages as one node, for comparison with the chain
+        fused_agent = make_fused_agent(client)
+        graph.add_node(fused_agent)
+        graph.add_edge(START, fused_agent)
+        graph.add_edge(fused_agent, END)
+    else:
+        graph.add_node(agent1)
+        graph.add_node(agent2)
+        graph.add_node(agent3)
 
-    graph.add_edge(START, agent1)
-    graph.add_edge(agent1, agent2)
-    graph.add_edge(agent2, agent3)
-    graph.add_edge(agent3, END)
+        graph.add_edge(START, agent1)
+        graph.add_edge(agent1, agent2)
+        graph.add_edge(agent2, agent3)
+        graph.add_edge(agent3, END)
 
     # Invoke the graph with an example prompt and show the thinking process
     response = graph.invoke("Tell me how I can live my best life.", show_thinking=True)
+    if fused:
+        # Keep only the final stage, which is what the chain's last agent returns
+        response = response.rsplit("Solution:", 1)[-1].strip()
     print(response)
 
 if __name__ == "__main__":
-    __main__()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the singly linked graph example.")
+    parser.add_argument("--fused", action="store_true", help="Run the three stages as a single agent in one request")
+    __main__(parser.parse_args().fused)
\ No newline at end of file
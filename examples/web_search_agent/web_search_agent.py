@@ -4,8 +4,50 @@ This agent can perform web searches and provide information based on the search
 """
 
 import os
-from dotenv import load_dotenv
-from impossibly import Agent, Graph, Tool, START, END
+from functools import lru_cache
+from impossibly import Agent, Graph, Tool, START, END, get_client, require_env
+
+# The chat model used by the agent, read once when the example loads (the .env file is loaded on import of impossibly)
+MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4-turbo-preview")
+
+# Queries with at least this many words, or with any of these keywords, get Tavily's slower "advanced" search
+ADVANCED_SEARCH_MIN_WORDS = 8
+ADVANCED_SEARCH_KEYWORDS = ("compare", "analyze", "analyse", "implications", "challenges", "pros and cons", "impact")
+
+# Search options that are the same for every query, built once rather than on every call
+SEARCH_OPTIONS = {
+    "include_answer": True,  # Include an AI-generated answer in the response
+    "include_raw_content": False,  # Don't include raw HTML content
+    "include_images": False,  # Don't include images
+    "include_image_descriptions": False,  # Don't include image descriptions
+}
+
+# Seconds a memoized search result is reused for, short enough that answers about recent events stay current
+SEARCH_CACHE_TTL = 600
+
+def choose_search_depth(query):
+    """
+    Picks Tavily's search depth for a query. Short factual lookups use "basic", which costs and takes about half as 
+    much as "advanced"; long or analytical queries keep "advanced" for more comprehensive results.
+    
+    Args:
+        query (str): The search query
+        
+    Returns:
+        str: "advanced" or "basic"
+    """
+    lowered = query.lower()
+    if len(query.split()) >= ADVANCED_SEARCH_MIN_WORDS or any(keyword in lowered for keyword in ADVANCED_SEARCH_KEYWORDS):
+        return "advanced"
+    return "basic"
+
+@lru_cache(maxsize=None)
+def get_tavily_client():
+    """
+    Returns a shared Tavily client, so the API key is read and the client built once rather than on every search.
+    """
+    from tavily import TavilyClient
+    return TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
 
 def perform_web_search(query, max_results=5):
     """
@@ -18,22 +60,12 @@ def perform_web_search(query, max_results=5):
     Returns:
         dict: The search results from Tavily
     """
-    from tavily import TavilyClient
-    
-    # Initialize Tavily client
-    tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-    
     # Perform the web search
-    search_results = tavily_client.search(
+    search_results = get_tavily_client().search(
         query=query,
         max_results=max_results,
-        search_depth="advanced",  # Use advanced search for more comprehensive results
-        include_answer=True,  # Include an AI-generated answer in the response
-        include_raw_content=False,  # Don't include raw HTML content
-        include_images=False,  # Don't include images
-        include_image_descriptions=False,  # Don't include image descriptions
-        include_domains=[],  # No specific domains to include
-        exclude_domains=[]  # No specific domains to exclude
+        search_depth=choose_search_depth(query),  # Only use the slower advanced search for complex queries
+        **SEARCH_OPTIONS
     )
     
     return search_results
@@ -49,40 +81,35 @@ def format_search_results(search_results, query):
     Returns:
         str: Formatted prompt for the agent
     """
-    # Format the search results into a prompt
-    formatted_results = "Here are the search results for your query:\n\n"
+    # Format the search results into a prompt, collecting the parts and joining them once at the end
+    parts = ["Here are the search results for your query:\n\n"]
     
     # Add the AI-generated answer if available
     if search_results.get("answer"):
-        formatted_results += f"AI-Generated Answer: {search_results['answer']}\n\n"
+        parts.append(f"AI-Generated Answer: {search_results['answer']}\n\n")
     
     # Add the search results
     for i, result in enumerate(search_results.get("results", []), 1):
-        formatted_results += f"Source {i}:\n"
-        formatted_results += f"Title: {result.get('title', 'N/A')}\n"
-        formatted_results += f"URL: {result.get('url', 'N/A')}\n"
-        formatted_results += f"Content: {result.get('content', 'N/A')}\n"
-        formatted_results += f"Relevance Score: {result.get('score', 'N/A')}\n\n"
+        parts.append(
+            f"Source {i}:\n"
+            f"Title: {result.get('title', 'N/A')}\n"
+            f"URL: {result.get('url', 'N/A')}\n"
+            f"Content: {result.get('content', 'N/A')}\n"
+            f"Relevance Score: {result.get('score', 'N/A')}\n\n"
+        )
 
     # Add the user's original query
-    formatted_results += f"\nBased on these search results, please answer: {query}"
+    parts.append(f"\nBased on these search results, please answer: {query}")
     
-    return formatted_results
+    return "".join(parts)
 
 def __main__():
-    # Load environment variables from .env file
-    load_dotenv()
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    if not OPENAI_API_KEY:
-        raise ValueError("OpenAI API key is not set. Please check your .env file.")
-    
-    TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-    if not TAVILY_API_KEY:
-        raise ValueError("Tavily API key is not set. Please check your .env file.")
+    # Check the API keys are set; the .env file is loaded when impossibly is imported
+    require_env("OPENAI_API_KEY")
+    require_env("TAVILY_API_KEY")
 
-    # Initialize the OpenAI client
-    from openai import AsyncOpenAI
-    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    # Use the shared async OpenAI client, backed by a pooled keep-alive (and, with h2 installed, HTTP/2) connection
+    client = get_client(asynchronous=True)
 
     # Define our web search tool
     web_search_tool = Tool(
@@ -101,7 +128,9 @@ def __main__():
                 "description": "Maximum number of results to return",
                 "default": 5
             }
-        ]
+        ],
+        cacheable=True,  # Repeated searches within the TTL reuse the results instead of calling Tavily again
+        ttl=SEARCH_CACHE_TTL
     )
     
     # Define our format results tool
@@ -120,13 +149,14 @@ def __main__():
                 "type": str,
                 "description": "The original search query"
             }
-        ]
+        ],
+        cacheable=True  # Formatting only depends on the results and query, so repeated calls are memoized
     )
     
     # Initialize Agent with tools
     agent = Agent(
         client, 
-        model=os.getenv("MODEL_NAME", "gpt-4-turbo-preview"), 
+        model=MODEL_NAME, 
         name="WebSearchAgent", 
         system_prompt="""
             You are a web search assistant that helps users find information from the internet.
@@ -148,15 +178,14 @@ def __main__():
     graph.add_edge(START, agent)
     graph.add_edge(agent, END)
 
-    # Test prompts
-    response = graph.invoke("What are the latest developments in quantum computing?", show_thinking=True)
-    print(f"Response: {response}")
-    
-    response = graph.invoke("Who is the current CEO of OpenAI?", show_thinking=True)
-    print(f"Response: {response}")
-    
-    response = graph.invoke("What are the main features of Python 3.12?", show_thinking=True)
-    print(f"Response: {response}")
+    # Test prompts, run at the same time since they are independent of each other
+    prompts = [
+        "What are the latest developments in quantum computing?",
+        "Who is the current CEO of OpenAI?",
+        "What are the main features of Python 3.12?",
+    ]
+    for response in graph.batch(prompts):
+        print(f"Response: {response}")
 
 if __name__ == "__main__":
     __main__() 
\ No newline at end of file
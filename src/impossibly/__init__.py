@@ -11,19 +11,27 @@ Key components can be imported directly from impossibly:
 """
 
 # Core components
-from .agent import Agent, OpenAIAgent, AnthropicAgent
+from .agent import Agent, OpenAIAgent, AnthropicAgent, clear_image_cache, set_image_cache_size
 from .graph import Graph
 
 # Utility components
 from .utils.memory import Memory
 from .utils.tools import Tool, format_tools_for_api
+from .utils.cache import ResponseCache, SemanticCache
+from .utils.clients import get_client
+from .utils.env import load_env, require_env
 from .utils.start_end import START, END
 
+# Load the .env file once, so scripts and examples don't each need to
+load_env()
+
 # For backward compatibility
 __all__ = [
-    'Agent', 'OpenAIAgent', 'AnthropicAgent',
+    'Agent', 'OpenAIAgent', 'AnthropicAgent', 'clear_image_cache', 'set_image_cache_size',
     'Graph',
     'Memory',
     'Tool', 'format_tools_for_api',
+    'ResponseCache', 'SemanticCache',
+    'get_client', 'require_env',
     'START', 'END'
 ]
\ No newline at end of file
@@ -3,18 +3,214 @@ Defines individual agent types to be called within the graph structure.
 
 Author: Jackson Grove
 '''
-import os, shutil, textwrap, base64, asyncio, inspect
-from typing import Union, List
+import os, sys, shutil, textwrap, base64, asyncio, copy, json, hashlib, mmap, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Union, List, AsyncIterator
+from urllib.parse import urlparse
 from openai import AsyncOpenAI, OpenAI
 from openai import File
 from anthropic import AsyncAnthropic, Anthropic
 from impossibly.utils.start_end import END
 from impossibly.utils.memory import Memory
 from impossibly.utils.tools import Tool, format_tools_for_api
+from impossibly.utils.cache import ResponseCache, SemanticCache, make_key
+from impossibly.utils.batch import run_batch
 
 #TODO: Add shared memory to agent (list of agents to read memory from)
 #TODO: Add tool use
 
+# ANSI colours used when showing the thinking of an agent
+YELLOW = '\033[93m'
+GREEN = '\033[92m'
+RESET = '\033[0m'
+
+# MIME types of the image formats accepted by the OpenAI vision API, by file extension
+_IMAGE_MIME_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.gif': 'image/gif', '.webp': 'image/webp'}
+
+# Image files given as URLs with these schemes are referenced by URL rather than read and inlined
+_REMOTE_PREFIXES = ('http://', 'https://')
+
+# Upload purpose of every file type agents accept, by file extension
+_FILE_PURPOSES = {
+    **dict.fromkeys((".c", ".cs", ".cpp", ".doc", ".docx", ".html", ".java", ".json", ".md", ".pdf", ".php", ".pptx", ".py", ".rb", ".tex", ".txt", ".css", ".js", ".sh", ".ts"), "assistants"),
+    **dict.fromkeys(_IMAGE_MIME_TYPES, "vision"),
+}
+_SUPPORTED_EXTENSIONS = frozenset(_FILE_PURPOSES)
+# Listed in unsupported file errors
+_ACCEPTED_TYPES = ", ".join(sorted(_SUPPORTED_EXTENSIONS))
+
+# The maximum number of files an agent uploads at once
+_MAX_CONCURRENT_UPLOADS = 8
+
+# Message roles accepted by the OpenAI chat completions API
+_VALID_AUTHORS = frozenset({'system', 'assistant', 'user', 'function', 'tool', 'developer'})
+
+# Base64 encodings of images, kept so an image sent repeatedly is only read and encoded once. Bounded by the total size 
+# of the encodings rather than their number, since images can be arbitrarily large; see set_image_cache_size
+DEFAULT_IMAGE_CACHE_SIZE = 64 * 1024 * 1024
+_encoded_files = OrderedDict()
+_encoded_files_size = 0
+_encoded_files_max_size = DEFAULT_IMAGE_CACHE_SIZE
+# Images are encoded in worker threads, so access to the cache is serialized
+_encoded_files_lock = threading.Lock()
+
+
+def _make_banner(name: str, terminal_width: int) -> str:
+    '''
+    Builds the header printed above an agent's thinking: the agent's name centred in a line of dashes.
+
+    Args:
+        name (str): The name of the agent.
+        terminal_width (int): The width of the terminal in columns.
+
+    Returns:
+        str: The coloured banner line.
+    '''
+    header = f" {GREEN}{name}{RESET} "
+    visible_header = f" {header} "
+    dashes = (terminal_width - len(visible_header)) // 2
+    return f"{YELLOW}{'-' * dashes}{RESET}{visible_header}{YELLOW}{'-' * dashes}{RESET}"
+
+
+@lru_cache(maxsize=8)
+def _text_wrapper(width: int) -> textwrap.TextWrapper:
+    '''
+    Returns a TextWrapper for a line width, created once per width rather than on every wrapped line.
+    '''
+    return textwrap.TextWrapper(width=width)
+
+
+def _format_text(text: str, terminal_width: int) -> str:
+    '''
+    Wraps text to fit the terminal and indents it, preserving explicit newlines.
+
+    Args:
+        text (str): The text to format.
+        terminal_width (int): The width of the terminal in columns.
+
+    Returns:
+        str: The wrapped, indented text.
+    '''
+    # Wrap lines with adjusted width to leave room for the indentation
+    wrap = _text_wrapper(terminal_width - 4).wrap
+    return "\n".join(["    " + wrapped_line for line in text.split("\n") for wrapped_line in wrap(line)])
+
+
+def _encode_file(path: str, mtime_ns: int, size: int) -> str:
+    '''
+    Reads a file and encodes it in Base64. Cached per (path, mtime, size), so an image passed to several agents, or 
+    to repeated graph runs, is only read and encoded once while it is unchanged. The file is memory-mapped rather than 
+    read into a bytes copy, so only the encoded result is held in memory.
+    '''
+    global _encoded_files_size
+    key = (path, mtime_ns, size)
+    with _encoded_files_lock:
+        encoded = _encoded_files.get(key)
+        if encoded is not None:
+            _encoded_files.move_to_end(key)
+            return encoded
+
+    # Empty files cannot be memory-mapped
+    if size == 0:
+        return ""
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        encoded = base64.b64encode(mapped).decode("ascii")
+
+    with _encoded_files_lock:
+        # Encodings larger than the whole cache are returned without being kept
+        if key not in _encoded_files and len(encoded) <= _encoded_files_max_size:
+            _encoded_files[key] = encoded
+            _encoded_files_size += len(encoded)
+            _evict_encoded_files()
+    return encoded
+
+
+def _evict_encoded_files() -> None:
+    '''
+    Drops the least recently used encodings until the cache fits its size limit. Called with the lock held.
+    '''
+    global _encoded_files_size
+    while _encoded_files_size > _encoded_files_max_size:
+        _, evicted = _encoded_files.popitem(last=False)
+        _encoded_files_size -= len(evicted)
+
+
+def set_image_cache_size(max_bytes: int) -> None:
+    '''
+    Sets how much memory the process-wide cache of encoded images may use, evicting the least recently used images 
+    if it is over the new limit. Set it to 0 to disable caching.
+
+    Args:
+        max_bytes (int): The maximum total size of the cached Base64 encodings, in bytes. The default is 
+                         DEFAULT_IMAGE_CACHE_SIZE (64 MiB).
+    '''
+    global _encoded_files_max_size
+    with _encoded_files_lock:
+        _encoded_files_max_size = max_bytes
+        _evict_encoded_files()
+
+
+def clear_image_cache() -> None:
+    '''
+    Removes every encoded image from the process-wide cache, freeing the memory it holds.
+    '''
+    global _encoded_files_size
+    with _encoded_files_lock:
+        _encoded_files.clear()
+        _encoded_files_size = 0
+
+
+def _routing_options(edges: List['Agent']) -> str:
+    '''
+    Returns the routing options appended to a prompt when an agent can route to several nodes.
+
+    Args:
+        edges (list[Agent]): The nodes the agent can route to, possibly including END.
+
+    Returns:
+        str: The routing options, listing each node with its description.
+    '''
+    routes = tuple(("END", "Route to end the conversation") if edge is END else (edge.name, edge.description) for edge in edges)
+    return _format_routing_options(routes)
+
+
+async def _iterate_in_thread(iterable) -> AsyncIterator:
+    '''
+    Iterates a synchronous stream from a worker thread, one item at a time, so each blocking network read leaves the 
+    event loop free and concurrent agents (such as fanned-out branches) still stream side by side.
+
+    Args:
+        iterable: The synchronous stream, e.g. the response of a sync client's create call with stream=True.
+
+    Yields:
+        The stream's items, in order.
+    '''
+    iterator = iter(iterable)
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+@lru_cache(maxsize=128)
+def _format_routing_options(routes: tuple) -> str:
+    '''
+    Formats routing options for a tuple of (name, description) pairs. Cached, since a node offers the same routes on 
+    every turn.
+    '''
+    options = "".join(f"- {name}: {description}\n" for name, description in routes)
+    return (
+        "\n\n--- Optional Routing ---\nYou can choose to route to one of the following agents:\n"
+        + options
+        + "\nTo route to a specific agent, include their name in the following format at the end of your message: \\\\AgentName\\\\\n"
+        + "If you don't specify a routing, I'll choose one automatically. Only route to an agent if you think they can help with the current task."
+    )
+
+
 class Agent:
     '''
     A unified agent that interfaces with a specific language model client.
@@ -29,35 +225,53 @@ class Agent:
                 which underlying agent (OpenAIAgent or AnthropicAgent) will be instantiated.
         model (str, optional): The identifier of the language model to be used. Defaults to "gpt-4o".
         name (str, optional): The name assigned to this agent. Defaults to "agent".
-        system_prompt (str, optional): The system prompt that configures the agent's initial behavior.
+        system_prompt (str, optional): The system prompt that configures the agent's initial behavior. Common 
+                                       indentation and surrounding whitespace are removed, so prompts written as 
+                                       indented triple-quoted strings are sent compactly.
                                        Defaults to "You are a helpful assistant.".
         description (str, optional): An additional description for the agent. Defaults to an empty string.
-        shared_memory (list, optional): A list of agents to read memory from. Defaults to an empty list.
-        tools (list[Tool], optional): A list of Tool instances that the agent can use. Defaults to an empty list.
+        shared_memory (list, optional): A list of agents to read memory from. Defaults to None (no shared memory).
+        tools (list[Tool], optional): A list of Tool instances that the agent can use. Defaults to None (no tools).
+        cache (ResponseCache, optional): A cache answering repeated identical requests without calling the API. 
+                                         Only enable for deterministic prompts. A SemanticCache also answers 
+                                         near-duplicate text prompts (OpenAI agents only). Defaults to None (no caching).
+        history_limit (int, optional): The number of messages, after the system prompt, at which older messages are 
+                                       condensed into a summary (OpenAI agents only). Defaults to None (unbounded).
+        summary_model (str, optional): The model used to write history summaries. Defaults to "gpt-4o-mini".
+        response_format (dict, optional): The response_format sent with every request, such as a JSON schema the 
+                                          responses must follow (OpenAI agents only). Defaults to None (free text).
 
     Attributes:
         client: The underlying agent instance (either OpenAIAgent or AnthropicAgent).
         model (str): The identifier of the language model.
         name (str): The name of the agent.
         system_prompt (str): The system prompt configuring the agent's behavior.
+        system_prompt_hash (str): A short digest of the system prompt. The prompt is the byte-identical prefix of every 
+                                  request, which lets the provider cache it; compare hashes to catch prompts that drift.
         description (str): An additional description for the agent.
         shared_memory (list of Agents): A list of agents to read memory from.
         tools (list[Tool]): A list of tools available to the agent.
+        cache (ResponseCache): The response cache used by the agent, if any.
+        response_format (dict): The format responses must follow, if any.
 
     Raises:
         ValueError: If the provided client is not an instance of either OpenAI or Anthropic.
     '''
 
-    def __init__(self, client, model: str = "gpt-4o", name: str = "agent", system_prompt: str = "You are a helpful assistant.", description: str = "", files: List[str] = [], shared_memory: List['Agent'] = None, tools: List[Tool] = []) -> None:
-        if isinstance(client, (AsyncOpenAI, OpenAI)):
-            self.client = OpenAIAgent(client, system_prompt, model, name, description, routing_instructions="", files=files, tools=tools)
-        elif isinstance(client, (AsyncAnthropic, Anthropic)):
-            self.client = AnthropicAgent(client, system_prompt, model, name, description, tools) # Excluding 'files' since Anthropic doesn't support RAG
-        else:
+    def __init__(self, client, model: str = "gpt-4o", name: str = "agent", system_prompt: str = "You are a helpful assistant.", description: str = "", files: List[str] = None, shared_memory: List['Agent'] = None, tools: List[Tool] = None, cache: ResponseCache = None, history_limit: int = None, summary_model: str = "gpt-4o-mini", response_format: dict = None) -> None:
+        # Normalize the system prompt once, so the prefix sent with every request is compact and byte-identical
+        system_prompt = textwrap.dedent(system_prompt).strip()
+        # Give every agent its own tool list, rather than one shared default
+        tools = tools if tools is not None else []
+
+        provider = _resolve_provider(client)
+        if provider is None:
             raise ValueError("Client must be an instance of AsyncOpenAI, OpenAI, AsyncAnthropic, or Anthropic")
+        self.client = provider(client, system_prompt=system_prompt, model=model, name=name, description=description, files=files, tools=tools, cache=cache, history_limit=history_limit, summary_model=summary_model, response_format=response_format)
         self.model = self.client.model
         self.name = self.client.name
         self.system_prompt = self.client.system_prompt
+        self.system_prompt_hash = hashlib.blake2b(self.system_prompt.encode("utf-8"), digest_size=8).hexdigest()
         self.messages = self.client.messages
         self.description = self.client.description
         self.shared_memory = shared_memory
@@ -70,8 +284,26 @@ class Agent:
             self.files = []
             
         self.tools = tools
+        self.cache = cache
+        self.history_limit = history_limit
+        self.summary_model = summary_model
+        self.response_format = response_format
 
-    def invoke(self, author: str, prompt: str, files: List[str] = [], edges: List['Agent'] = None, show_thinking: bool = False) -> str:
+    def clone(self) -> 'Agent':
+        '''
+        Creates a copy of the agent with its own conversation history, sharing the underlying API client, tools, files 
+        and cache. This allows the same agent to take part in several independent conversations at once.
+
+        Returns:
+            Agent: The copy of the agent.
+        '''
+        twin = copy.copy(self)
+        twin.client = copy.copy(self.client)
+        twin.client.messages = list(self.client.messages)
+        twin.messages = twin.client.messages
+        return twin
+
+    def invoke(self, author: str, prompt: str, files: List[str] = None, edges: List['Agent'] = None, show_thinking: bool = False, stream: bool = False) -> str:
         '''
         Public method that transparently handles both sync and async execution.
         
@@ -84,9 +316,10 @@ class Agent:
         Args:
             author (str): The author of the message ('user', 'system', 'assistant', etc.).
             prompt (str): The prompt to send to the agent.
-            files (list[str], optional): A list of file paths to include. Defaults to [].
+            files (list[str], optional): A list of file paths to include. Defaults to None (no files).
             edges (list[Agent], optional): A list of agents that this agent can route to. Defaults to None.
             show_thinking (bool, optional): Whether to show the agent's thinking process. Defaults to False.
+            stream (bool, optional): Whether to print the response token by token as it is generated. Defaults to False.
             
         Returns:
             str: The agent's response.
@@ -97,116 +330,251 @@ class Agent:
             if loop.is_running():
                 # We're being called from an async context
                 # Return the coroutine for the caller to await
-                return self._invoke_async(author, prompt, files, edges, show_thinking)
+                return self._invoke_async(author, prompt, files, edges, show_thinking, stream)
             else:
                 # No running event loop, create one
-                return asyncio.run(self._invoke_async(author, prompt, files, edges, show_thinking))
+                return asyncio.run(self._invoke_async(author, prompt, files, edges, show_thinking, stream))
         except RuntimeError:
             # No event loop exists, create one
-            return asyncio.run(self._invoke_async(author, prompt, files, edges, show_thinking))
+            return asyncio.run(self._invoke_async(author, prompt, files, edges, show_thinking, stream))
 
-    async def _invoke_async(self, author: str, prompt: str, files: List[str] = [], edges: List['Agent'] = None, show_thinking: bool = False) -> str:
+    async def _invoke_async(self, author: str, prompt: str, files: List[str] = None, edges: List['Agent'] = None, show_thinking: bool = False, stream: bool = False) -> str:
         '''
         Internal async implementation of invoke.
         
         Args:
             author (str): The author of the message ('user', 'system', 'assistant', etc.).
             prompt (str): The prompt to send to the agent.
-            files (list[str], optional): A list of file paths to include. Defaults to [].
+            files (list[str], optional): A list of file paths to include. Defaults to None (no files).
             edges (list[Agent], optional): A list of agents that this agent can route to. Defaults to None.
             show_thinking (bool, optional): Whether to show the agent's thinking process. Defaults to False.
+            stream (bool, optional): Whether to print the response token by token as it is generated. Defaults to False.
             
         Returns:
             str: The agent's response.
         '''
+        if stream:
+            return await self.client.invoke(author, prompt, files, edges, show_thinking, stream=True)
         return await self.client.invoke(author, prompt, files, edges, show_thinking)
 
+    def stream(self, author: str, prompt: str, files: List[str] = None, edges: List['Agent'] = None, show_thinking: bool = False) -> AsyncIterator[str]:
+        '''
+        Prompts the agent, returning an async generator that yields the response in pieces as it is generated. Must be 
+        consumed with 'async for'. The full response is added to the agent's history once the generator is exhausted.
+        
+        Args:
+            author (str): The author of the message ('user', 'system', 'assistant', etc.).
+            prompt (str): The prompt to send to the agent.
+            files (list[str], optional): A list of file paths to include. Defaults to None (no files).
+            edges (list[Agent], optional): A list of agents that this agent can route to. Defaults to None.
+            show_thinking (bool, optional): Whether to show the prompt sent to the agent. Defaults to False.
+            
+        Returns:
+            AsyncIterator[str]: The pieces of the agent's response.
+        '''
+        return self.client.stream(author, prompt, files, edges, show_thinking)
+
+    def invoke_batch(self, prompts: List[str], author: str = "user", poll_interval: float = 30.0) -> List[str]:
+        '''
+        Public method that transparently handles both sync and async execution.
+
+        Answers each prompt independently through the OpenAI Batch API, as a single batch job. Batch jobs halve the 
+        token cost but may take up to 24 hours, so this suits offline and evaluation workloads. Every prompt follows 
+        the agent's current history, which is left unchanged. OpenAI agents only; tools are not offered to the model.
+
+        Args:
+            prompts (list[str]): The prompts to answer.
+            author (str, optional): The author of the prompts. Defaults to "user".
+            poll_interval (float, optional): Seconds between batch status checks. Defaults to 30.0.
+
+        Returns:
+            list[str]: The agent's response to each prompt, in the order of the prompts.
+        '''
+        try:
+            # Check if we're in an event loop
+            loop = asyncio.get_event_loop()
+            if loop.is_running():
+                # We're being called from an async context
+                # Return the coroutine for the caller to await
+                return self._invoke_batch_async(prompts, author, poll_interval)
+            else:
+                # No running event loop, create one
+                return asyncio.run(self._invoke_batch_async(prompts, author, poll_interval))
+        except RuntimeError:
+            # No event loop exists, create one
+            return asyncio.run(self._invoke_batch_async(prompts, author, poll_interval))
+
+    async def _invoke_batch_async(self, prompts: List[str], author: str = "user", poll_interval: float = 30.0) -> List[str]:
+        '''
+        Internal async implementation of invoke_batch.
+        '''
+        if not isinstance(self.client, OpenAIAgent):
+            raise ValueError("invoke_batch only supports OpenAI agents.")
+        return await self.client.invoke_batch(prompts, author, poll_interval)
+
 
 class OpenAIAgent:
-    def __init__(self, client: Union[AsyncOpenAI, OpenAI], system_prompt: str, model: str = "gpt-4o", name: str = "agent", description: str = "A general purpose agent", routing_instructions: str = "", files: List[str] = [], tools: List[Tool] = []) -> None:
+    # Banner shown when logging thinking, built on first use
+    _banner = None
+    _terminal_width = None
+
+    def __init__(self, client: Union[AsyncOpenAI, OpenAI], system_prompt: str, model: str = "gpt-4o", name: str = "agent", description: str = "A general purpose agent", routing_instructions: str = "", files: List[str] = None, tools: List[Tool] = None, cache: ResponseCache = None, history_limit: int = None, summary_model: str = "gpt-4o-mini", response_format: dict = None) -> None:
         self.client = client
         self.is_async = isinstance(client, AsyncOpenAI)
         self.model = model
-        self.name = name
+        # Interned, since names are compared and hashed whenever memory is filtered or a route is resolved
+        self.name = sys.intern(name)
         self.system_prompt = system_prompt
         self.description = description
         self.routing_instructions = routing_instructions
+        # The system prompt is pinned as the first message and never edited, keeping a stable prefix that the 
+        # API can cache across turns. Everything that varies per turn is appended after it.
         self.messages = [
             {"role": "system", "content": system_prompt}
         ]
         
         # Initialize RAG files differently depending on sync/async client
-        if self.is_async:
-            self.files = asyncio.run(self.init_rag_files_async(files)) if files else []
-        else:
-            self.files = self.init_rag_files_sync(files) if files else []
+        self.files = []
+        self._pending_files = None
+        if files and self.is_async:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                self.files = asyncio.run(self.init_rag_files_async(files))
+            else:
+                # asyncio.run cannot be nested, so inside a running event loop upload in the background instead, 
+                # letting construction return at once; the first request waits for the uploads to finish
+                self._pending_files = asyncio.ensure_future(self._upload_in_background(files))
+        elif files:
+            self.files = self.init_rag_files_sync(files)
             
-        self.tools = tools
+        self.tools = tools if tools is not None else []
+        self._tools_snapshot = None
+        self._refresh_tools()
+        self.cache = cache
+        self.history_limit = history_limit
+        self.summary_model = summary_model
+        self.response_format = response_format
 
     async def init_rag_files_async(self, files: List[str]) -> List['File']:
         '''
-        Asynchronously initializes and uploads files for Retrieval-Augmented Generation (RAG) purposes.
+        Asynchronously initializes and uploads files for Retrieval-Augmented Generation (RAG) purposes. Files are 
+        uploaded concurrently, at most _MAX_CONCURRENT_UPLOADS at a time, so N files cost about one round trip 
+        rather than N.
         '''
-        # Mapping of supported file extensions to their corresponding purpose
-        supported_files = [".c", ".cs", ".cpp", ".doc", ".docx", ".html", ".java", ".json", ".md", ".pdf", ".php", ".pptx", ".py", ".rb", ".tex", ".txt", ".css", ".js", ".sh", ".ts", ".png", ".jpg", ".jpeg", ".gif", ".webp"]
-        file_objects = []
-        for path in files:
-            if not path:
-                continue
-            ext = os.path.splitext(path)[1].lower()
-            try:
-                # Assert that the file extension is supported.
-                assert ext in supported_files, (
-                    f"Unsupported file type '{ext}'. Accepted types: {', '.join(supported_files)}"
-                )
-                # Create the file object using the appropriate purpose
-                file_obj = await self.client.files.create(
-                    file=open(path, "rb"),
-                    purpose="assistants"
-                )
-                file_objects.append(file_obj)
-            except AssertionError as ae:
-                print(ae)
-            except Exception as ex:
-                print(f"Error processing {path}: {ex}")
-                
-        return file_objects
+        semaphore = asyncio.Semaphore(_MAX_CONCURRENT_UPLOADS)
+
+        async def upload(path: str) -> Union['File', None]:
+            async with semaphore:
+                return await self._upload_file_async(path, "assistants")
+
+        file_objects = await asyncio.gather(*(upload(path) for path in files if path))
+        return [file_obj for file_obj in file_objects if file_obj is not None]
     
+    async def _upload_in_background(self, files: List[str]) -> None:
+        '''
+        Uploads files in the background, adding them to the agent's files once they are all uploaded.
+        '''
+        # Extend in place, since the Agent wrapper and any clones share this list
+        self.files.extend(await self.init_rag_files_async(files))
+
+    async def _await_files(self) -> None:
+        '''
+        Waits for files still uploading in the background. Clones made during the upload share its future, and the 
+        upload adds the files itself, so they are added exactly once however many clones wait on it. The future is 
+        only cleared once it has finished, so concurrent calls all wait for the files, and all see a failed upload.
+        '''
+        if self._pending_files is not None:
+            await self._pending_files
+            self._pending_files = None
+
     def init_rag_files_sync(self, files: List[str]) -> List['File']:
         '''
-        Synchronously initializes and uploads files for Retrieval-Augmented Generation (RAG) purposes.
+        Synchronously initializes and uploads files for Retrieval-Augmented Generation (RAG) purposes. Files are 
+        uploaded concurrently from a thread pool.
         '''
-        # Mapping of supported file extensions to their corresponding purpose
-        supported_files = [".c", ".cs", ".cpp", ".doc", ".docx", ".html", ".java", ".json", ".md", ".pdf", ".php", ".pptx", ".py", ".rb", ".tex", ".txt", ".css", ".js", ".sh", ".ts", ".png", ".jpg", ".jpeg", ".gif", ".webp"]
-        file_objects = []
-        for path in files:
-            if not path:
-                continue
-            ext = os.path.splitext(path)[1].lower()
-            try:
-                # Assert that the file extension is supported.
-                assert ext in supported_files, (
-                    f"Unsupported file type '{ext}'. Accepted types: {', '.join(supported_files)}"
-                )
-                # Create the file object using the appropriate purpose
-                file_obj = self.client.files.create(
-                    file=open(path, "rb"),
-                    purpose="assistants"
-                )
-                file_objects.append(file_obj)
-            except AssertionError as ae:
-                print(ae)
-            except Exception as ex:
-                print(f"Error processing {path}: {ex}")
-                
-        return file_objects
+        return self._upload_files(files, "assistants")
+
+    def _refresh_tools(self) -> None:
+        '''
+        Rebuilds the tool index and the formatted tool list when self.tools has changed since they were last built, so 
+        tools added after construction are advertised to the model and can be called. Each Tool formats its schema 
+        once; the list is only gathered again when the tools change, rather than on every request.
+        '''
+        snapshot = tuple(self.tools)
+        if snapshot == self._tools_snapshot:
+            return
+        self._tools_snapshot = snapshot
+        # Index tools by name for dispatching tool calls, keeping the first tool registered under each name
+        self._tools_by_name = {tool.name: tool for tool in reversed(snapshot)}
+        self._formatted_tools = format_tools_for_api(self.tools, "openai") if self.tools else None
+
+    def _upload_files(self, files: List[str], purpose: str = None) -> List['File']:
+        '''
+        Uploads files with a synchronous client, running up to _MAX_CONCURRENT_UPLOADS uploads at once in worker 
+        threads. Unsupported or failed files are reported and skipped.
+
+        Args:
+            files (list[str]): The paths of the files to upload.
+            purpose (str, optional): The upload purpose. Defaults to None (determined by each file's extension).
+
+        Returns:
+            list[File]: The uploaded files, in the order given.
+        '''
+        files = [path for path in files if path]
+        if len(files) <= 1:
+            file_objects = [self._upload_file(path, purpose) for path in files]
+        else:
+            with ThreadPoolExecutor(max_workers=min(_MAX_CONCURRENT_UPLOADS, len(files))) as executor:
+                file_objects = list(executor.map(lambda path: self._upload_file(path, purpose), files))
+        return [file_obj for file_obj in file_objects if file_obj is not None]
+
+    def _upload_file(self, path: str, purpose: str = None) -> Union['File', None]:
+        '''
+        Uploads one file with a synchronous client, returning None and printing the reason if it is unsupported or 
+        the upload fails.
+        '''
+        ext = os.path.splitext(path)[1].lower()
+        try:
+            # Assert that the file extension is supported.
+            assert ext in _SUPPORTED_EXTENSIONS, (
+                f"Unsupported file type '{ext}'. Accepted types: {_ACCEPTED_TYPES}"
+            )
+            # Create the file object using the appropriate purpose
+            with open(path, "rb") as file:
+                return self.client.files.create(file=file, purpose=purpose or _FILE_PURPOSES[ext])
+        except AssertionError as ae:
+            print(ae)
+        except Exception as ex:
+            print(f"Error processing {path}: {ex}")
+        return None
+
+    async def _upload_file_async(self, path: str, purpose: str = None) -> Union['File', None]:
+        '''
+        Uploads one file with an asynchronous client, returning None and printing the reason if it is unsupported or 
+        the upload fails.
+        '''
+        ext = os.path.splitext(path)[1].lower()
+        try:
+            # Assert that the file extension is supported.
+            assert ext in _SUPPORTED_EXTENSIONS, (
+                f"Unsupported file type '{ext}'. Accepted types: {_ACCEPTED_TYPES}"
+            )
+            # Create the file object using the appropriate purpose
+            with open(path, "rb") as file:
+                return await self.client.files.create(file=file, purpose=purpose or _FILE_PURPOSES[ext])
+        except AssertionError as ae:
+            print(ae)
+        except Exception as ex:
+            print(f"Error processing {path}: {ex}")
+        return None
 
     def init_input_files(self, files: List[str]) -> List['File']:
         '''
         Initializes and uploads input files for various purposes based on their type.
 
         This method processes a list of file paths, validates their extensions against a predefined mapping of supported file types to purposes (e.g., "assistants" or "vision"), and uploads them to 
-        the OpenAI API. Uploaded files are returned as OpenAI File objects.
+        the OpenAI API concurrently. Uploaded files are returned as OpenAI File objects.
 
         Args:
             files (list[str]): A list of file paths to be uploaded, with their purpose determined by their extension.
@@ -225,61 +593,7 @@ class OpenAIAgent:
             - Unsupported files are skipped, and an error message is logged.
             - Ensure the provided file paths are valid and accessible.
         '''
-        # Mapping of supported file extensions to their corresponding purpose
-        supported_files = {
-            ".c": "assistants",
-            ".cs": "assistants",
-            ".cpp": "assistants",
-            ".doc": "assistants",
-            ".docx": "assistants",
-            ".html": "assistants",
-            ".java": "assistants",
-            ".json": "assistants",
-            ".md": "assistants",
-            ".pdf": "assistants",
-            ".php": "assistants",
-            ".pptx": "assistants",
-            ".py": "assistants",
-            ".rb": "assistants",
-            ".tex": "assistants",
-            ".txt": "assistants",
-            ".css": "assistants",
-            ".js": "assistants",
-            ".sh": "assistants",
-            ".ts": "assistants",
-            ".png": "vision",
-            ".jpg": "vision",
-            ".jpeg": "vision",
-            ".gif": "vision",
-            ".webp": "vision",
-        }
-        # Prepare a string to display all accepted file types if needed
-        accepted_types = ", ".join(sorted(supported_files.keys()))
-        file_objects = []
-        
-        for path in files:
-            if not path:
-                continue
-            ext = os.path.splitext(path)[1].lower()
-            try:
-                # Assert that the file extension is supported.
-                assert ext in supported_files, (
-                    f"Unsupported file type '{ext}'. Accepted types: {accepted_types}"
-                )
-                # Determine the purpose based on the file extension
-                purpose = supported_files[ext]
-                # Create the file object using the appropriate purpose
-                file_obj = self.client.files.create(
-                    file=open(path, "rb"),
-                    purpose=purpose
-                )
-                file_objects.append(file_obj)
-            except AssertionError as ae:
-                print(ae)
-            except Exception as ex:
-                print(f"Error processing {path}: {ex}")
-                
-        return file_objects
+        return self._upload_files(files)
 
     def _log_thinking(self, chat_prompt: str) -> None:
         '''
@@ -288,28 +602,17 @@ class OpenAIAgent:
         Args:
             :chat_prompt (string): The prompt sent to the Agent.
         '''
-        terminal_width = shutil.get_terminal_size((80, 20)).columns
-        yellow = '\033[93m'
-        green = '\033[92m'
-        reset = '\033[0m'
-        header = f" {green}{self.name}{reset} "
-        visible_header = f" {header} "
-        dashes = (terminal_width - len(visible_header)) // 2
+        # Sample the terminal width and build the banner once per agent, on first use
+        if self._banner is None:
+            self._terminal_width = shutil.get_terminal_size((80, 20)).columns
+            self._banner = _make_banner(self.name, self._terminal_width)
 
         # Display agent name as header
-        print(f"{yellow}{'-' * dashes}{reset}{visible_header}{yellow}{'-' * dashes}{reset}")
-        
-        # Helper function to enforce formatted prompts
-        def format_text(text):
-            formatted_lines = []
-            for line in text.split("\n"):  # Preserve explicit newlines
-                wrapped_lines = textwrap.wrap(line, width=terminal_width - 4)  # Wrap lines with adjusted width
-                formatted_lines.extend(["    " + wrapped_line for wrapped_line in wrapped_lines])  # Add indentation
-            return "\n".join(formatted_lines)
+        print(self._banner)
 
         # Display formatted prompts
-        print(f"{yellow}System Prompt:{reset} {self.system_prompt}\n")
-        print(f"{yellow}Chat Prompt:{reset}\n" + format_text(chat_prompt) + "\n")
+        print(f"{YELLOW}System Prompt:{RESET} {self.system_prompt}\n")
+        print(f"{YELLOW}Chat Prompt:{RESET}\n" + _format_text(chat_prompt, self._terminal_width) + "\n")
 
     def _encode_image(self, image_path: str) -> str:
         '''
@@ -322,57 +625,58 @@ class OpenAIAgent:
             str: Base64 encoded string of the image
         '''
         try:
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode("utf-8")
+            # Key on modification time and size so edits to the file are picked up
+            stat = os.stat(image_path)
+            return _encode_file(image_path, stat.st_mtime_ns, stat.st_size)
         except Exception as e:
             raise ValueError(f"Failed to encode image at {image_path}: {str(e)}")
 
+    async def _preload_images(self, files: List[str]) -> None:
+        '''
+        Encodes the images among the files in worker threads, all at once, so reading them from disk neither blocks the 
+        event loop nor happens one file at a time. Encodings are cached, so _build_message then reuses them. Failures 
+        are left for _encode_image to report.
 
-    async def invoke(self, author: str, chat_prompt: str = "", files: List[str] = [], edges: List['Agent'] = None, show_thinking: bool = False) -> str:
+        Args:
+            files (list[str]): The file paths attached to a prompt.
         '''
-        Prompts the model, returning a text response. System instructions, routing options and chat history are aggregated into the prompt in the following format:
-            """
-            ## System Instructions:
-                {system_prompt}
+        def preload(path: str) -> None:
+            stat = os.stat(path)
+            _encode_file(path, stat.st_mtime_ns, stat.st_size)
 
-            ## Chat Prompt:
-                {chat_prompt}
+        images = [path for path in files if not path.startswith(_REMOTE_PREFIXES) and os.path.splitext(path)[1].lower() in _IMAGE_MIME_TYPES]
+        if images:
+            await asyncio.gather(*(asyncio.to_thread(preload, path) for path in images), return_exceptions=True)
 
-            ## Optional Routing:
-                You can route to the following agents: {edges}
-                To route to a specific agent, include their name in the following format: \\AgentName\\
-                Otherwise, I'll route to a random agent.
-            """
+    def _build_message(self, author: str, chat_prompt: str, files: List[str] = None, edges: List['Agent'] = None) -> tuple:
+        '''
+        Builds the message sent to the model for one turn: the chat prompt, followed by routing options when there are 
+        several routes, with any image files attached as base64 content.
 
         Args:
-            chat_prompt (str): Content to prompt the chat model with
-            edges (list[Agent]): Available agent routing options
-            show_thinking (bool): Enables log printing of prompt and response from model
+            author (str): The role of the message sender.
+            chat_prompt (str): Content to prompt the chat model with.
+            files (list[str]): File paths or http(s) URLs to attach; only images are included.
+            edges (list[Agent]): Available agent routing options.
 
         Returns:
-            str: The model's response to the prompt
+            tuple: The message dict and the text prompt it contains.
+
+        Raises:
+            ValueError: If the author is not a valid message role.
         '''
+        if author not in _VALID_AUTHORS:
+            raise ValueError(f"Invalid author {author!r}")
+
         # Build the message prompt and history
         prompt = ""
 
         # Format the prompt with the chat prompt and routing instructions
         prompt += chat_prompt
 
-        # Add routing information and cues if there are multiple potential routes the agent can take
+        # Add optional routing information and cues if there are multiple potential routes the agent can take
         if edges and len(edges) > 1:
-            # Make the routing information optional
-            prompt += "\n\n--- Optional Routing ---\nYou can choose to route to one of the following agents:\n"
-            
-            # List all available agents with their descriptions
-            for edge in edges:
-                if edge != END:
-                    prompt += f"- {edge.name}: {edge.description}\n"
-                else:
-                    prompt += f"- END: Route to end the conversation\n"
-            
-            # Add routing instructions
-            prompt += "\nTo route to a specific agent, include their name in the following format at the end of your message: \\\\AgentName\\\\\n"
-            prompt += "If you don't specify a routing, I'll choose one automatically. Only route to an agent if you think they can help with the current task."
+            prompt += _routing_options(edges)
 
         # add the message to our messages array
         msg = {"role": author, "content": prompt}
@@ -381,48 +685,97 @@ class OpenAIAgent:
         if files:
             content = [{"type": "text", "text": prompt}]
             for file_path in files:
+                # Images hosted online are passed by URL, so the model fetches them and no bytes are sent inline
+                if file_path.startswith(_REMOTE_PREFIXES):
+                    if os.path.splitext(urlparse(file_path).path)[1].lower() in _IMAGE_MIME_TYPES:
+                        content.append({"type": "image_url", "image_url": {"url": file_path}})
+                    continue
                 # Only process image files
-                if file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
+                mime_type = _IMAGE_MIME_TYPES.get(os.path.splitext(file_path)[1].lower())
+                if mime_type:
                     # Read image and encode it in base64
                     base64_image = self._encode_image(file_path)
                     content.append({
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
+                            "url": f"data:{mime_type};base64,{base64_image}"
                         }
                     })
             msg["content"] = content
 
+        return msg, prompt
+
+    async def invoke(self, author: str, chat_prompt: str = "", files: List[str] = None, edges: List['Agent'] = None, show_thinking: bool = False, stream: bool = False) -> str:
+        '''
+        Prompts the model, returning a text response. System instructions, routing options and chat history are aggregated into the prompt in the following format:
+            """
+            ## System Instructions:
+                {system_prompt}
+
+            ## Chat Prompt:
+                {chat_prompt}
+
+            ## Optional Routing:
+                You can route to the following agents: {edges}
+                To route to a specific agent, include their name in the following format: \\AgentName\\
+                Otherwise, I'll route to a random agent.
+            """
+
+        Args:
+            chat_prompt (str): Content to prompt the chat model with
+            edges (list[Agent]): Available agent routing options
+            show_thinking (bool): Enables log printing of prompt and response from model
+            stream (bool): Prints the response to the terminal token by token as it is generated
+
+        Returns:
+            str: The model's response to the prompt
+        '''
+        if stream:
+            chunks = []
+            async for chunk in self.stream(author, chat_prompt, files, edges, show_thinking):
+                print(chunk, end="", flush=True)
+                chunks.append(chunk)
+            print()
+            return "".join(chunks)
+
+        await self._await_files()
+        if files:
+            await self._preload_images(files)
+
+        # Build the user message, including routing options and image content
+        msg, prompt = self._build_message(author, chat_prompt, files, edges)
+
         # Add message to history
         self.messages.append(msg)
 
-        # Format message list to be passed to the model
-        messages = self.messages.copy()
+        # Pass the history itself rather than a copy, since each request is serialized before the history changes again
+        messages = self.messages
 
         # Format the tools for the API
-        tools = format_tools_for_api(self.tools, "openai") if self.tools else None
+        self._refresh_tools()
+        tools = self._formatted_tools
 
         # Print out the prompt for debugging purposes
         if show_thinking:
             self._log_thinking(prompt)
 
-        # Call the OpenAI API based on client type (sync or async)
-        if self.is_async:
-            # Asynchronous call
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=tools,
-                tool_choice="auto" if tools else None
-            )
-        else:
-            # Synchronous call
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=tools,
-                tool_choice="auto" if tools else None
-            )
+        # Answer identical requests from the cache without calling the API
+        cached_text, cache_entry = await self._check_cache(messages, tools, chat_prompt, files)
+        if cached_text is not None:
+            self.messages.append({"role": "assistant", "content": cached_text})
+            if show_thinking:
+                self._log_thinking(cached_text)
+            await self._compact_history()
+            return cached_text
+
+        # Call the OpenAI API
+        response = await self._create_completion(
+            model=self.model,
+            messages=messages,
+            tools=tools,
+            tool_choice="auto" if tools else None,
+            **self._format_options()
+        )
 
         # Extract the response text
         response_message = response.choices[0].message
@@ -430,45 +783,7 @@ class OpenAIAgent:
         # Process tool calls if present
         if response_message.tool_calls:
             # Process each tool call
-            tool_call_results = []
-            for tool_call in response_message.tool_calls:
-                # Find the matching tool
-                tool_name = tool_call.function.name
-                matching_tools = [t for t in self.tools if t.name == tool_name]
-                
-                if not matching_tools:
-                    tool_call_results.append(f"Error: Tool '{tool_name}' not found.")
-                    continue
-                
-                tool = matching_tools[0]
-                
-                # Parse the arguments
-                import json
-                args = json.loads(tool_call.function.arguments)
-                
-                # Execute the tool
-                try:
-                    if self.is_async:
-                        # For async execution, we need to await the coroutine
-                        try:
-                            # The execute method might return a coroutine if the tool is async
-                            result_or_coroutine = tool.execute(**args)
-                            if inspect.iscoroutine(result_or_coroutine):
-                                # If it's a coroutine, await it
-                                result = await result_or_coroutine
-                            else:
-                                # If it's not a coroutine, just use it as is
-                                result = result_or_coroutine
-                        except Exception as e:
-                            tool_call_results.append(f"Error executing {tool_name}: {str(e)}")
-                            continue
-                    else:
-                        # For sync execution, just call the method directly
-                        result = tool.execute(**args)
-                        
-                    tool_call_results.append(f"Result from {tool_name}: {result}")
-                except Exception as e:
-                    tool_call_results.append(f"Error executing {tool_name}: {str(e)}")
+            tool_call_results = await self._execute_tool_calls([(tool_call.function.name, tool_call.function.arguments) for tool_call in response_message.tool_calls])
             
             # Add the tool call result to the messages
             self.messages.append({
@@ -487,18 +802,11 @@ class OpenAIAgent:
                 self.messages.append(message)
             
             # Get a new response that uses the tool call results
-            if self.is_async:
-                # Asynchronous call 
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=self.messages
-                )
-            else:
-                # Synchronous call
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=self.messages
-                )
+            response = await self._create_completion(
+                model=self.model,
+                messages=self.messages,
+                **self._format_options()
+            )
             
             # Update the response message
             response_message = response.choices[0].message
@@ -507,23 +815,294 @@ class OpenAIAgent:
         response_text = response_message.content
         self.messages.append({"role": "assistant", "content": response_text})
 
+        self._store_cache(cache_entry, response_text)
+
         # Print out the response for debugging purposes
         if show_thinking:
             self._log_thinking(response_text)
 
+        await self._compact_history()
         return response_text
 
+    async def invoke_batch(self, prompts: List[str], author: str = "user", poll_interval: float = 30.0) -> List[str]:
+        '''
+        Answers each prompt independently, following the current history, through a single OpenAI Batch API job. The 
+        history is left unchanged.
+
+        Args:
+            prompts (list[str]): The prompts to answer.
+            author (str, optional): The author of the prompts. Defaults to "user".
+            poll_interval (float, optional): Seconds between batch status checks. Defaults to 30.0.
+
+        Returns:
+            list[str]: The response to each prompt, in the order of the prompts.
+        '''
+        if not prompts:
+            return []
+        await self._await_files()
+
+        requests = {}
+        for i, prompt in enumerate(prompts):
+            msg, _ = self._build_message(author, prompt)
+            requests[f"prompt-{i}"] = {"model": self.model, "messages": [*self.messages, msg], **self._format_options()}
+
+        results = await run_batch(self.client, requests, poll_interval)
+        return [results[custom_id] for custom_id in requests]
+
+    async def stream(self, author: str, chat_prompt: str = "", files: List[str] = None, edges: List['Agent'] = None, show_thinking: bool = False) -> AsyncIterator[str]:
+        '''
+        Prompts the model like invoke, but yields the response as text deltas while it is being generated, so callers 
+        can render long responses incrementally. Tool calls are executed between streamed requests, and the complete 
+        response is recorded in the message history once the stream ends.
+
+        Args:
+            author (str): The role of the message sender
+            chat_prompt (str): Content to prompt the chat model with
+            files (list[str]): List of image file paths or URLs to include in the prompt
+            edges (list[Agent]): Available agent routing options
+            show_thinking (bool): Enables log printing of the prompt sent to the model
+
+        Yields:
+            str: The next piece of the model's response
+        '''
+        await self._await_files()
+        if files:
+            await self._preload_images(files)
+        msg, prompt = self._build_message(author, chat_prompt, files, edges)
+        self.messages.append(msg)
+        messages = self.messages
+        self._refresh_tools()
+        tools = self._formatted_tools
+
+        if show_thinking:
+            self._log_thinking(prompt)
+
+        # Answer identical requests from the cache without calling the API
+        cached_text, cache_entry = await self._check_cache(messages, tools, chat_prompt, files)
+        if cached_text is not None:
+            self.messages.append({"role": "assistant", "content": cached_text})
+            yield cached_text
+            await self._compact_history()
+            return
+
+        chunks = []
+        tool_calls = []
+        async for chunk in self._stream_completion(messages, tools, tool_calls):
+            chunks.append(chunk)
+            yield chunk
+
+        # Execute any requested tools, then stream the response that uses their results
+        if tool_calls:
+            self.messages.append({"role": "assistant", "content": "".join(chunks) or None, "tool_calls": tool_calls})
+            results = await self._execute_tool_calls([(call["function"]["name"], call["function"]["arguments"]) for call in tool_calls])
+            for call, result in zip(tool_calls, results):
+                self.messages.append({"role": "tool", "tool_call_id": call["id"], "content": result})
+
+            chunks = []
+            async for chunk in self._stream_completion(self.messages, None, []):
+                chunks.append(chunk)
+                yield chunk
+
+        response_text = "".join(chunks)
+        self.messages.append({"role": "assistant", "content": response_text})
+
+        self._store_cache(cache_entry, response_text)
+
+        await self._compact_history()
+
+    async def _check_cache(self, messages: List[dict], tools: List[dict], chat_prompt: str, files: List[str]) -> tuple:
+        '''
+        Looks up a response to the request in the agent's cache.
+
+        Args:
+            messages (list[dict]): The messages about to be sent, ending with the new prompt.
+            tools (list[dict]): The formatted tools offered to the model, or None.
+            chat_prompt (str): The text of the new prompt, without routing options.
+            files (list[str]): The files attached to the new prompt.
+
+        Returns:
+            tuple: The cached response or None, and the entry to pass to _store_cache once the response is known.
+        '''
+        if self.cache is None:
+            return None, None
+
+        cache_key = make_key(self.model, messages, tools, self.response_format)
+        cached_text = self.cache.get(cache_key)
+        if cached_text is not None or not isinstance(self.cache, SemanticCache) or files:
+            return cached_text, (cache_key, None, None)
+
+        # Near-duplicates must match in everything but the wording of the prompt: history, tools, author and routing options
+        last = messages[-1]
+        context = make_key(self.model, messages[:-1], tools, self.response_format, last["role"], last["content"][len(chat_prompt):])
+        embedding = await self.cache.embed(chat_prompt)
+        return self.cache.search(context, embedding), (cache_key, context, embedding)
+
+    def _store_cache(self, cache_entry: tuple, response_text: str) -> None:
+        '''
+        Stores a response under the cache entry returned by _check_cache.
+        '''
+        if cache_entry is None or response_text is None:
+            return
+        cache_key, context, embedding = cache_entry
+        self.cache.set(cache_key, response_text)
+        if embedding is not None:
+            self.cache.add(context, embedding, response_text)
+
+    def _format_options(self) -> dict:
+        '''
+        Returns the response_format argument for a chat completion, or nothing when responses are free text.
+        '''
+        return {"response_format": self.response_format} if self.response_format else {}
+
+    async def _create_completion(self, **kwargs):
+        '''
+        Creates a chat completion. Requests made with a synchronous client run in a worker thread, so they do not block 
+        the event loop and concurrent agents (such as fanned-out branches) still overlap their network waits.
+
+        Args:
+            **kwargs: The arguments passed to chat.completions.create.
+
+        Returns:
+            ChatCompletion: The API response.
+        '''
+        if self.is_async:
+            return await self.client.chat.completions.create(**kwargs)
+        return await asyncio.to_thread(self.client.chat.completions.create, **kwargs)
+
+    async def _compact_history(self) -> None:
+        '''
+        Bounds the conversation sent with every request. Once the history after the system prompt exceeds 
+        history_limit messages, all but the most recent half are condensed into a single summary message by 
+        summary_model, so the cost of each call stays constant rather than growing with the conversation.
+        '''
+        if not self.history_limit or len(self.messages) - 1 <= self.history_limit:
+            return
+
+        # Keep the most recent turns verbatim, without separating tool results from the call that requested them
+        cut = len(self.messages) - max(self.history_limit // 2, 1)
+        while cut > 1 and self.messages[cut]["role"] == "tool":
+            cut -= 1
+        if cut <= 1:
+            return
+
+        transcript = []
+        for message in self.messages[1:cut]:
+            content = message.get("content")
+            if isinstance(content, list):
+                content = " ".join(part["text"] for part in content if part.get("type") == "text")
+            if content:
+                transcript.append(f"{message['role']}: {content}")
+
+        response = await self._create_completion(
+            model=self.summary_model,
+            messages=[
+                {"role": "system", "content": "Summarize the conversation below in a few sentences. Keep every fact, decision and open question needed to continue it."},
+                {"role": "user", "content": "\n".join(transcript)}
+            ]
+        )
+
+        # Replace the older messages in place, so the list shared with the Agent wrapper stays the same object
+        self.messages[1:cut] = [{"role": "system", "content": f"Summary of the earlier conversation: {response.choices[0].message.content}"}]
+
+    async def _stream_completion(self, messages: List[dict], tools: List[dict], tool_calls: List[dict]) -> AsyncIterator[str]:
+        '''
+        Streams a chat completion, yielding content deltas. Tool call fragments are assembled into complete tool call 
+        dicts and appended to tool_calls.
+
+        Args:
+            messages (list[dict]): The messages to send.
+            tools (list[dict]): The formatted tools offered to the model, or None.
+            tool_calls (list[dict]): Receives the tool calls requested by the model.
+
+        Yields:
+            str: The next piece of the model's response.
+        '''
+        kwargs = {"model": self.model, "messages": messages, "stream": True, **self._format_options()}
+        if tools:
+            kwargs.update(tools=tools, tool_choice="auto")
+
+        def read(chunk) -> str:
+            if not chunk.choices:
+                return ""
+            delta = chunk.choices[0].delta
+            # Tool calls arrive in fragments keyed by their index
+            for fragment in delta.tool_calls or []:
+                while len(tool_calls) <= fragment.index:
+                    tool_calls.append({"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+                call = tool_calls[fragment.index]
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function:
+                    call["function"]["name"] += fragment.function.name or ""
+                    call["function"]["arguments"] += fragment.function.arguments or ""
+            return delta.content or ""
+
+        response = await self._create_completion(**kwargs)
+        if not self.is_async:
+            response = _iterate_in_thread(response)
+        async for chunk in response:
+            text = read(chunk)
+            if text:
+                yield text
+
+    async def _execute_tool_calls(self, calls: List[tuple]) -> List[str]:
+        '''
+        Executes the tools requested by the model. The calls in one response are independent of each other, so they 
+        run concurrently: async tools on the event loop, and sync tools in worker threads.
+
+        Args:
+            calls (list[tuple]): The (tool name, JSON arguments) of each call.
+
+        Returns:
+            list[str]: The result, or error, of each call, in order.
+        '''
+        self._refresh_tools()
+        tools_by_name = self._tools_by_name
+
+        async def execute(tool_name: str, arguments: str) -> str:
+            # Find the matching tool
+            tool = tools_by_name.get(tool_name)
+            if tool is None:
+                return f"Error: Tool '{tool_name}' not found."
+            
+            # Execute the tool with the parsed arguments
+            try:
+                kwargs = json.loads(arguments)
+                if tool.is_async:
+                    # The execute method returns a coroutine when called from a running event loop
+                    result = await tool.execute(**kwargs)
+                else:
+                    result = await asyncio.to_thread(tool.execute, **kwargs)
+                return f"Result from {tool_name}: {result}"
+            except Exception as e:
+                return f"Error executing {tool_name}: {str(e)}"
+
+        return list(await asyncio.gather(*(execute(tool_name, arguments) for tool_name, arguments in calls)))
+
 
 class AnthropicAgent:
-    def __init__(self, client: Union[AsyncAnthropic, Anthropic], system_prompt: str, model: str = "claude-3-opus-20240229", name: str = "agent", description: str = "A general purpose agent", tools: List[Tool] = []) -> None:
+    # Banner shown when logging thinking, built on first use
+    _banner = None
+    _terminal_width = None
+
+    def __init__(self, client: Union[AsyncAnthropic, Anthropic], system_prompt: str, model: str = "claude-3-opus-20240229", name: str = "agent", description: str = "A general purpose agent", tools: List[Tool] = None, cache: ResponseCache = None, max_tokens: int = 4096) -> None:
         self.client = client
         self.is_async = isinstance(client, AsyncAnthropic)
         self.model = model
-        self.name = name
+        # Interned, since names are compared and hashed whenever memory is filtered or a route is resolved
+        self.name = sys.intern(name)
         self.system_prompt = system_prompt
         self.description = description
         self.messages = [{"role": "system", "content": system_prompt}]
-        self.tools = tools
+        self.tools = tools if tools is not None else []
+        self.cache = cache
+        self.max_tokens = max_tokens
+        # The Messages API takes the system prompt as a separate parameter. It is marked as a cache breakpoint so the 
+        # provider reuses its processed prefix across requests instead of re-reading it every turn
+        self._system = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+        # Prompt cache usage reported by the API, in input tokens
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
         
     def _log_thinking(self, chat_prompt: str) -> None:
         '''
@@ -532,30 +1111,19 @@ class AnthropicAgent:
         Args:
             :chat_prompt (string): The prompt sent to the Agent.
         '''
-        terminal_width = shutil.get_terminal_size((80, 20)).columns
-        yellow = '\033[93m'
-        green = '\033[92m'
-        reset = '\033[0m'
-        header = f" {green}{self.name}{reset} "
-        visible_header = f" {header} "
-        dashes = (terminal_width - len(visible_header)) // 2
+        # Sample the terminal width and build the banner once per agent, on first use
+        if self._banner is None:
+            self._terminal_width = shutil.get_terminal_size((80, 20)).columns
+            self._banner = _make_banner(self.name, self._terminal_width)
 
         # Display agent name as header
-        print(f"{yellow}{'-' * dashes}{reset}{visible_header}{yellow}{'-' * dashes}{reset}")
-        
-        # Helper function to enforce formatted prompts
-        def format_text(text):
-            formatted_lines = []
-            for line in text.split("\n"):  # Preserve explicit newlines
-                wrapped_lines = textwrap.wrap(line, width=terminal_width - 4)  # Wrap lines with adjusted width
-                formatted_lines.extend(["    " + wrapped_line for wrapped_line in wrapped_lines])  # Add indentation
-            return "\n".join(formatted_lines)
+        print(self._banner)
 
         # Display formatted prompts
-        print(f"{yellow}System Prompt:{reset} {self.system_prompt}\n")
-        print(f"{yellow}Chat Prompt:{reset}\n" + format_text(chat_prompt) + "\n")
+        print(f"{YELLOW}System Prompt:{RESET} {self.system_prompt}\n")
+        print(f"{YELLOW}Chat Prompt:{RESET}\n" + _format_text(chat_prompt, self._terminal_width) + "\n")
 
-    async def invoke(self, author: str, prompt: str = "", files: List[str] = [], edges: List['Agent'] = None, show_thinking: bool = False) -> str:
+    async def invoke(self, author: str, prompt: str = "", files: List[str] = None, edges: List['Agent'] = None, show_thinking: bool = False, stream: bool = False) -> str:
         '''
         Prompts the model, returning a text response. System instructions, routing options and chat history are aggregated into the prompt.
 
@@ -565,10 +1133,143 @@ class AnthropicAgent:
             files (list[str]): List of file paths to include in the prompt
             edges (list[Agent]): Available agent routing options
             show_thinking (bool): Enables log printing of prompt and response from model
+            stream (bool): Prints the response to the terminal token by token as it is generated
 
         Returns:
             str: The model's response to the prompt
         '''
+        if stream:
+            chunks = []
+            async for chunk in self.stream(author, prompt, files, edges, show_thinking):
+                print(chunk, end="", flush=True)
+                chunks.append(chunk)
+            print()
+            return "".join(chunks)
+
+        formatted_messages = self._prepare_messages(author, prompt, files, edges, show_thinking)
+
+        # Answer identical requests from the cache without calling the API
+        cache_key = self._cache_key(formatted_messages)
+        if cache_key is not None:
+            cached_text = self.cache.get(cache_key)
+            if cached_text is not None:
+                self.messages.append({"role": "assistant", "content": cached_text})
+                if show_thinking:
+                    self._log_thinking(cached_text)
+                return cached_text
+
+        # Make the API call
+        response = await self._create_message(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            system=self._system,
+            messages=formatted_messages,
+        )
+        self._record_cache_usage(getattr(response, "usage", None))
+
+        # Extract the response content
+        response_text = response.content[0].text
+        
+        # Add the response to the message history
+        self.messages.append({"role": "assistant", "content": response_text})
+        if cache_key is not None:
+            self.cache.set(cache_key, response_text)
+
+        # Print out the response for debugging purposes
+        if show_thinking:
+            self._log_thinking(response_text)
+
+        return response_text
+
+    async def stream(self, author: str, prompt: str = "", files: List[str] = None, edges: List['Agent'] = None, show_thinking: bool = False) -> AsyncIterator[str]:
+        '''
+        Prompts the model like invoke, but yields the response as text deltas while it is being generated. The complete 
+        response is recorded in the message history once the stream ends.
+
+        Args:
+            author (str): The role of the message sender ('user', 'assistant')
+            prompt (str): Content to prompt the chat model with
+            files (list[str]): List of file paths to include in the prompt
+            edges (list[Agent]): Available agent routing options
+            show_thinking (bool): Enables log printing of the prompt sent to the model
+
+        Yields:
+            str: The next piece of the model's response
+        '''
+        formatted_messages = self._prepare_messages(author, prompt, files, edges, show_thinking)
+
+        # Answer identical requests from the cache without calling the API
+        cache_key = self._cache_key(formatted_messages)
+        if cache_key is not None:
+            cached_text = self.cache.get(cache_key)
+            if cached_text is not None:
+                self.messages.append({"role": "assistant", "content": cached_text})
+                yield cached_text
+                return
+
+        def read(event) -> str:
+            if event.type == "content_block_delta" and getattr(event.delta, "type", None) == "text_delta":
+                return event.delta.text
+            if event.type == "message_start":
+                self._record_cache_usage(getattr(event.message, "usage", None))
+            return ""
+
+        chunks = []
+        response = await self._create_message(model=self.model, max_tokens=self.max_tokens, system=self._system, messages=formatted_messages, stream=True)
+        if not self.is_async:
+            response = _iterate_in_thread(response)
+        async for event in response:
+            text = read(event)
+            if text:
+                chunks.append(text)
+                yield text
+
+        response_text = "".join(chunks)
+        self.messages.append({"role": "assistant", "content": response_text})
+        if cache_key is not None:
+            self.cache.set(cache_key, response_text)
+
+    def _cache_key(self, formatted_messages: List[dict]) -> Union[str, None]:
+        '''
+        Builds the key for a request in the agent's cache, or returns None when the agent has no cache. The system 
+        prompt is sent separately from the messages, so it is part of the key too.
+        '''
+        if self.cache is None:
+            return None
+        return make_key(self.model, self.system_prompt, self.max_tokens, formatted_messages)
+
+    async def _create_message(self, **kwargs):
+        '''
+        Creates a message. Requests made with a synchronous client run in a worker thread, so they do not block the 
+        event loop and concurrent agents (such as fanned-out branches) still overlap their network waits.
+
+        Args:
+            **kwargs: The arguments passed to messages.create.
+
+        Returns:
+            Message: The API response.
+        '''
+        if self.is_async:
+            return await self.client.messages.create(**kwargs)
+        return await asyncio.to_thread(self.client.messages.create, **kwargs)
+
+    def _record_cache_usage(self, usage) -> None:
+        '''
+        Adds the prompt cache reads and writes reported in a response's usage to the agent's totals.
+        '''
+        read = getattr(usage, "cache_read_input_tokens", None)
+        written = getattr(usage, "cache_creation_input_tokens", None)
+        if isinstance(read, int):
+            self.cache_read_tokens += read
+        if isinstance(written, int):
+            self.cache_write_tokens += written
+
+    def _prepare_messages(self, author: str, prompt: str, files: List[str], edges: List['Agent'], show_thinking: bool) -> List[dict]:
+        '''
+        Adds the prompt to the message history and returns the messages to send, with routing options attached to the 
+        last message when there are several routes. The system prompt is sent separately, and the last message is 
+        marked as a cache breakpoint, so the next turn reads the whole conversation so far from the provider's cache.
+        '''
         # Create a message with the prompt
         msg = {"role": author, "content": prompt}
         
@@ -583,22 +1284,13 @@ class AnthropicAgent:
         # Add message to history
         self.messages.append(msg)
 
-        # Format the messages list for the Anthropic API
-        formatted_messages = []
-        for msg in self.messages:
-            formatted_messages.append(msg)
+        # Format the messages list for the Anthropic API, which takes the system prompt separately
+        formatted_messages = [msg for msg in self.messages if msg["role"] != "system"]
 
         # Add routing information as needed
         if edges and len(edges) > 1:
-            routing_info = "\n\n--- Optional Routing ---\nYou can choose to route to one of the following agents:\n"
-            for edge in edges:
-                if edge != END:
-                    routing_info += f"- {edge.name}: {edge.description}\n"
-                else:
-                    routing_info += f"- END: Route to end the conversation\n"
-            routing_info += "\nTo route to a specific agent, include their name in the following format at the end of your message: \\\\AgentName\\\\\n"
-            routing_info += "If you don't specify a routing, I'll choose one automatically. Only route to an agent if you think they can help with the current task."
-            
+            routing_info = _routing_options(edges)
+
             # Append routing info to the last message
             last_message = formatted_messages[-1]
             if isinstance(last_message["content"], str):
@@ -612,28 +1304,37 @@ class AnthropicAgent:
         if self.tools:
             print("Warning: Tool support for Anthropic is not yet fully implemented")
 
-        # Make the API call based on client type (sync or async)
-        if self.is_async:
-            # Asynchronous call
-            response = await self.client.messages.create(
-                model=self.model,
-                messages=formatted_messages,
-            )
-        else:
-            # Synchronous call
-            response = self.client.messages.create(
-                model=self.model,
-                messages=formatted_messages,
-            )
+        # Mark the end of the conversation as a cache breakpoint, on a copy so the history itself keeps plain text
+        last = formatted_messages[-1]
+        content = last["content"]
+        blocks = [{"type": "text", "text": content}] if isinstance(content, str) else [dict(block) for block in content]
+        blocks[-1]["cache_control"] = {"type": "ephemeral"}
+        formatted_messages[-1] = {**last, "content": blocks}
 
-        # Extract the response content
-        response_text = response.content[0].text
-        
-        # Add the response to the message history
-        self.messages.append({"role": "assistant", "content": response_text})
+        return formatted_messages
 
-        # Print out the response for debugging purposes
-        if show_thinking:
-            self._log_thinking(response_text)
 
-        return response_text
\ No newline at end of file
+def _anthropic_provider(client, files, history_limit, summary_model, response_format, **options) -> AnthropicAgent:
+    # Excluding 'files' since Anthropic doesn't support RAG, along with the OpenAI-only settings
+    return AnthropicAgent(client, **options)
+
+
+# The agent implementation for each supported client class. Adding a provider only requires registering its clients here
+_PROVIDERS = {
+    OpenAI: OpenAIAgent,
+    AsyncOpenAI: OpenAIAgent,
+    Anthropic: _anthropic_provider,
+    AsyncAnthropic: _anthropic_provider,
+}
+
+
+def _resolve_provider(client):
+    '''
+    Finds the agent implementation for a client, or None if the client is not supported.
+    '''
+    # Exact client classes are the common case and resolve with a single lookup
+    provider = _PROVIDERS.get(type(client))
+    if provider is None:
+        # Fall back to isinstance checks for subclasses of the supported clients
+        provider = next((p for client_type, p in _PROVIDERS.items() if isinstance(client, client_type)), None)
+    return provider
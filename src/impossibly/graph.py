@@ -8,11 +8,79 @@ Author: Jackson Grove
 '''
 import re
 import asyncio
+import copy
+import hashlib
 import os
+import types
 from typing import Union, List, Tuple
 from impossibly.agent import *
 from impossibly.utils.start_end import START, END
 from impossibly.utils.memory import Memory
+from impossibly.utils.batch import run_batch
+from impossibly.utils.cache import ResponseCache, SemanticCache, make_key
+
+# File commands agents embed in their responses, compiled once since every response is scanned for them
+_FILE_PATTERN = re.compile(r'<<FILE>>(.*?)<</FILE>>', re.DOTALL)
+
+# Routing commands are normally delimited by double backslashes, with single backslashes accepted as a fallback
+_ROUTE_DELIMITERS = ('\\\\', '\\')
+
+
+def _split_routes(output: str, delimiter: str, names: dict) -> tuple[list[str], str]:
+    '''
+    Extracts the routing commands wrapped in a delimiter from a response, scanning it once with str.find rather than 
+    matching and substituting with a regex. Only segments naming a route are commands; anything else wrapped in the 
+    delimiter (Windows paths, LaTeX) is left in the output as written.
+
+    Args:
+        output (str): The agent's response.
+        delimiter (str): The string wrapping each routing command.
+        names (dict): The route names that count as commands, e.g. a node's route index.
+
+    Returns:
+        tuple: The routing commands in the order they appear, and the output with them removed. The output is 
+        returned unchanged when it holds no complete command.
+    '''
+    commands = []
+    kept = []
+    width = len(delimiter)
+    pos = 0
+    start = output.find(delimiter)
+    while start != -1:
+        end = output.find(delimiter, start + width)
+        if end == -1:
+            break
+        command = output[start + width:end]
+        if command not in names:
+            # Not a route, so the closing delimiter may still open a command
+            start = end
+            continue
+        commands.append(command)
+        kept.append(output[pos:start])
+        pos = end + width
+        start = output.find(delimiter, pos)
+    if not commands:
+        return commands, output
+    kept.append(output[pos:])
+    return commands, ''.join(kept)
+
+
+def _implementation(function) -> tuple:
+    '''
+    Identifies a tool's function by where it is defined and its compiled code, so replacing a tool's implementation 
+    changes the cache keys of runs that use it.
+    '''
+    code = getattr(function, "__code__", None)
+    digest = None
+    if isinstance(code, types.CodeType):
+        digest = hashlib.blake2b(code.co_code + repr(code.co_consts).encode("utf-8"), digest_size=8).hexdigest()
+    return getattr(function, "__module__", None), getattr(function, "__qualname__", repr(function)), digest
+
+
+def _dead_end(node) -> ValueError:
+    '''Builds the error raised when a run reaches a node it cannot leave.'''
+    return ValueError(f"{getattr(node, 'name', node)} has no outgoing edges. Connect it to another node or to END.")
+
 
 class Graph:
     '''
@@ -25,6 +93,16 @@ class Graph:
         edges (dict): A mapping where keys are nodes (Agent instances or special tokens) and 
                       values are lists of adjacent nodes representing outgoing connections.
         nodes: A view of the keys of the edges dictionary.
+        fan_out (bool): When True, a node with several successors that does not name a route hands its output to 
+                        every successor concurrently, provided the branches share a single join node. A node that 
+                        names several routes hands its output to just those successors concurrently.
+        memory_window (int or None): The maximum number of shared-memory messages injected into a prompt. 
+                                     Defaults to None (all messages).
+        max_concurrency (int or None): The maximum number of branches of a fan-out invoked at once, to stay within 
+                                       API rate limits. Defaults to None (all branches at once).
+        cache (ResponseCache or None): A cache answering a repeated run, or a node's repeated prompts, without 
+                                       invoking the agents. A SemanticCache also answers prompts a node is given in 
+                                       other words. Defaults to None (no caching).
 
     Methods:
         add_node(agent: Union[Agent, List[Agent]]) -> None:
@@ -34,25 +112,51 @@ class Graph:
             Adds directed edges between nodes, routing the output of node1 to the input of node2.
             Self-edges (a node connected to itself) are not allowed.
         
+        compile() -> Graph:
+            Validates the graph and precomputes each node's successors and fan-out joins. Runs automatically on 
+            the first invoke after the graph changes.
+
         invoke(user_prompt: str = "", show_thinking: bool = False) -> str:
             Executes the graph workflow, passing the user prompt through the agents until the END node 
             is reached. The method manages shared memory, routes outputs based on agent responses, 
             and returns the final output.
         
+        batch(prompts: list[str], max_concurrency: int = 10) -> list[str]:
+            Runs the graph once per prompt, running up to max_concurrency prompts at once.
+
+        invoke_batch(prompts: list[str], poll_interval: float = 30.0) -> list[str]:
+            Runs the graph once per prompt through the OpenAI Batch API, at half the token cost of invoke.
+
+        copy() -> Graph:
+            Returns a copy of the graph whose agents have independent conversation histories.
+
         _get_route(node: Agent, output: str):
             Extracts a routing command from an agent's output to determine the next node to invoke. 
             If no valid command is found, a default route is selected.
 
+        _fan_out(node: Agent, prompt: str, ...):
+            Invokes every successor of a node concurrently and merges their outputs for the join node.
+
     Raises:
         ValueError: If an invalid node is referenced (i.e., not added to the graph) during edge addition.
     '''
-    def __init__(self) -> None:
+    def __init__(self, fan_out: bool = False, memory_window: int = None, max_concurrency: int = None, cache: ResponseCache = None) -> None:
         # Initalizing hash map for edges
         self.edges = {
             START: [], 
             END: []
         }
         self.nodes = self.edges.keys()
+        self.fan_out = fan_out
+        self.memory_window = memory_window
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        # Topology derived by compile(), reset whenever nodes or edges change
+        self._successors = None
+        self._joins = None
+        self._route_indexes = None
+        self._memory_pairs = None
+        self._topology_key = None
     
 
     def add_node(self, agent: Union[Agent, List[Agent]]) -> None:
@@ -65,6 +169,7 @@ class Graph:
         Raises:
             ValueError: If any item in the provided list is not an Agent.
         '''
+        self._reset_compiled()
         if isinstance(agent, list):
             for a in agent:
                 if not isinstance(a, Agent):
@@ -93,17 +198,155 @@ class Graph:
         if not isinstance(node2, list):
             node2 = [node2]
 
-        # For each combination, add the edge
+        # Check each node once up front, so a bad node leaves the graph unchanged
         for n1 in node1:
             if n1 not in self.edges:
                 raise ValueError(f"{n1} is not a valid node in the graph. Please add it first.")
-            for n2 in node2:
-                if n2 not in self.edges and n2 != END:
-                    raise ValueError(f"{n2} is not a valid node in the graph. Please add it first.")
-                self.edges[n1].append(n2)
+        for n2 in node2:
+            if n2 not in self.edges and n2 is not END:
+                raise ValueError(f"{n2} is not a valid node in the graph. Please add it first.")
+
+        # For each combination, add the edge
+        self._reset_compiled()
+        for n1 in node1:
+            self.edges[n1].extend(node2)
 
 
-    def invoke(self, user_prompt: str = "", files: list[str] = [], show_thinking: bool = False) -> str:
+    def compile(self) -> 'Graph':
+        '''
+        Validates the graph and precomputes what invoke needs from its topology, so it is worked out once rather than 
+        on every step: each node's successors, the node where each fan-out's branches converge, and the route index 
+        of every node that can route. Runs are still walked dynamically, since agents choose routes from their 
+        output and graphs may loop.
+
+        invoke compiles the graph automatically the first time it runs after nodes or edges change; call this directly 
+        to catch mistakes when the graph is built.
+
+        Returns:
+            Graph: The graph itself, for chaining.
+
+        Raises:
+            ValueError: If START has no outgoing edges. Other nodes without outgoing edges are allowed, since a route 
+                        to them may never be taken; a run raises this only when it reaches one.
+        '''
+        if not self.edges[START]:
+            raise _dead_end(START)
+
+        # Collect the nodes reachable from START, in the order they are discovered
+        reachable = [START]
+        seen = {START}
+        for node in reachable:
+            if node is END:
+                continue
+            for successor in self.edges[node]:
+                if successor not in seen:
+                    seen.add(successor)
+                    reachable.append(successor)
+
+        # Freeze each node's successors so every step of a run reads them with a single lookup
+        self._successors = {node: tuple(self.edges[node]) for node in reachable}
+        self._joins = {node: self._find_join(node) for node in reachable if len(self.edges[node]) > 1}
+        self._route_indexes = {node: self._index_routes(node) for node in reachable if len(self.edges[node]) > 1}
+        self._memory_pairs = self._find_memory_pairs(reachable)
+        self._topology_key = self._make_topology_key(reachable)
+        return self
+
+
+    def _find_memory_pairs(self, reachable: list) -> frozenset:
+        '''
+        Finds the (author, recipient) name pairs that some node reads back through its shared memory. A node is only 
+        shown messages whose author and recipient are both in its shared_memory list, so hand-offs between any other 
+        pair are never read and need not be recorded.
+
+        Args:
+            reachable (list): The nodes reachable from START.
+
+        Returns:
+            frozenset[tuple[str, str]]: The author and recipient names of every hand-off worth recording.
+        '''
+        pairs = set()
+        for node in reachable:
+            if node is START or node is END or not node.shared_memory:
+                continue
+            names = [agent.name for agent in node.shared_memory]
+            pairs.update((author, recipient) for author in names for recipient in names)
+        return frozenset(pairs)
+
+
+    async def _remember(self, memory: Memory, author: Agent, recipient: Agent, content: str) -> None:
+        '''
+        Records a hand-off in the run's memory, unless no node's shared memory would ever read it back.
+
+        Args:
+            memory (Memory): The global memory of the current graph invocation.
+            author (Agent): The node that produced the content.
+            recipient (Agent): The node receiving it.
+            content (str): The content handed off.
+        '''
+        if self._memory_pairs is None:
+            self.compile()
+        if (author.name, recipient.name) in self._memory_pairs:
+            await memory.add(author, recipient, content)
+
+
+    def _make_topology_key(self, reachable: list) -> str:
+        '''
+        Builds a key identifying the shape of the graph: the graph's settings and where each reachable node's edges 
+        lead. Whole runs are cached under it together with the state of every node (see _run_key), so changing the 
+        graph never returns a stale answer.
+
+        Args:
+            reachable (list): The nodes reachable from START, in discovery order.
+
+        Returns:
+            str: The topology key.
+        '''
+        index = {node: i for i, node in enumerate(reachable)}
+        nodes = [(str(node) if node is START or node is END else node.name, [index[n] for n in self.edges[node]]) for node in reachable]
+        return make_key("graph", self.fan_out, self.memory_window, nodes)
+
+
+    def _run_key(self, user_prompt: str, files: list[str]) -> str:
+        '''
+        Builds the key a whole run is cached under: the exact prompt and files, the graph's topology, and everything 
+        about each reachable agent that shapes its responses. That includes its configuration, the schemas and 
+        implementations of its tools, its RAG files, whom it reads shared memory from and its conversation history, 
+        so a second turn on a stateful graph, or an agent changed after compiling, is never answered with an earlier 
+        run's output. Agent state is read when the run starts, since all of it can change after compile().
+
+        Args:
+            user_prompt (str): The prompt the graph is invoked with.
+            files (list[str]): The files supplied to the graph.
+
+        Returns:
+            str: The run key.
+        '''
+        agents = []
+        for node in self._successors:
+            if node is START or node is END:
+                continue
+            agents.append((
+                node.name, node.model, node.system_prompt_hash, node.description, node.response_format,
+                [(tool.format_for_api("openai"), _implementation(tool.function)) for tool in node.tools],
+                [getattr(f, "id", f) for f in node.files],
+                [agent.name for agent in node.shared_memory or []],
+                node.messages,
+            ))
+        return make_key(self._topology_key, user_prompt, files, agents)
+
+
+    def _reset_compiled(self) -> None:
+        '''
+        Discards the topology derived by compile(), after the graph changes.
+        '''
+        self._successors = None
+        self._joins = None
+        self._route_indexes = None
+        self._memory_pairs = None
+        self._topology_key = None
+
+
+    def invoke(self, user_prompt: str = "", files: list[str] = None, show_thinking: bool = False, stream: bool = False) -> str:
         """
         Public method that transparently handles both sync and async execution.
         
@@ -112,6 +355,9 @@ class Graph:
         If called from async code, it returns a coroutine that can be awaited.
         
         This provides a unified API that works for both sync and async callers.
+
+        With stream=True, nodes whose only successor is END print their response token by token as it is generated, 
+        so the final answer starts appearing before it is complete. The full response is still returned.
         """
         try:
             # Check if we're in an event loop
@@ -119,77 +365,486 @@ class Graph:
             if loop.is_running():
                 # We're being called from an async context
                 # Return the coroutine for the caller to await
-                return self._invoke_async(user_prompt, files, show_thinking)
+                return self._invoke_async(user_prompt, files, show_thinking, stream)
             else:
                 # No running event loop, create one
-                return asyncio.run(self._invoke_async(user_prompt, files, show_thinking))
+                return asyncio.run(self._invoke_async(user_prompt, files, show_thinking, stream))
         except RuntimeError:
             # No event loop exists, create one
-            return asyncio.run(self._invoke_async(user_prompt, files, show_thinking))
+            return asyncio.run(self._invoke_async(user_prompt, files, show_thinking, stream))
 
 
-    async def _invoke_async(self, user_prompt: str = "", files: list[str] = [], show_thinking: bool = False) -> str:
+    async def _invoke_async(self, user_prompt: str = "", files: list[str] = None, show_thinking: bool = False, stream: bool = False) -> str:
         """Internal async implementation of the invoke method."""
+        files = files if files is not None else []
         # Output the user prompt if there are no agents defined
         if len(self.nodes) == 2: # (When only START and END nodes are defined)
             return user_prompt
+
+        if self._successors is None:
+            self.compile()
+
+        # Answer a prompt the whole graph has already run on, in the same state, from the cache, skipping every node. 
+        # Only hits are counted here; a miss falls through to the per-node lookups
+        key = None
+        if self.cache is not None:
+            key = self._run_key(user_prompt, files)
+            if key in self.cache:
+                output = self.cache.get(key)
+                if stream:
+                    print(output)
+                return output
+
+        output = await self._run(user_prompt, files, show_thinking, stream)
+        if key is not None and output is not None:
+            self.cache.set(key, output)
+        return output
+
+
+    async def _run(self, user_prompt: str, files: list[str], show_thinking: bool = False, stream: bool = False) -> str:
+        """Walks a compiled graph from START to END, returning the final output."""
+        successors_of = self._successors
         
-        # Create a global memory for the graph
+        # Create a global memory for the graph, and track how much of it each agent has already received
         global_memory = Memory()
+        memory_cursors = {}
 
         # Execute each node in the graph until END is reached
-        curr_node = self.edges[START][0]
+        curr_node = successors_of[START][0]
         prompt = user_prompt
         original_prompt = user_prompt  # Store original task for self-loops
         author = 'user'
         selected_files = files
-        while curr_node != END:
+        while curr_node is not END:
+            # Stop before invoking a node the run could not leave
+            successors = successors_of[curr_node]
+            if not successors:
+                raise _dead_end(curr_node)
+
             # Check if agent listens to other Agents (has shared memory)
+            cursor = None
             if curr_node.shared_memory:
-                prompt += f'\n\nPrevious messages: \n{await global_memory.get_formatted(curr_node.shared_memory, curr_node.shared_memory)}'
+                prompt, cursor = await self._with_memory(curr_node, prompt, global_memory, memory_cursors)
 
-            # Invoke the current node
-            output = await curr_node.invoke(author, prompt, selected_files, self.edges[curr_node], show_thinking)
+            # Invoke the current node, streaming the response of a terminal node straight to the terminal
+            output = await self._invoke_node(curr_node, author, prompt, selected_files, show_thinking, stream and successors == (END,), memory_cursors, cursor)
             
             # Route to intended node in the case of multiple branching edges
             i = 0
-            if len(self.edges[curr_node]) > 1:
-                route_idx, output = self._get_route(curr_node, output)
-                i = route_idx
+            if len(successors) > 1:
+                routes, output = self._find_routes(curr_node, output)
+
+                # Without a single explicit route, hand the output to every named branch (or every branch, when none 
+                # is named) at once when they converge on one node
+                join = self._get_join(curr_node) if len(routes) != 1 and self.fan_out else None
+                if join is not None:
+                    branches = tuple(successors[r] for r in routes) or successors
+                    selected_files, output = self._get_files(files, output)
+                    output, selected_files = await self._fan_out(curr_node, output, files, selected_files, global_memory, memory_cursors, show_thinking, branches)
+                    if join is END:
+                        return output
+                    prompt = output
+                    author = 'user'
+                    curr_node = join
+                    continue
+
+                i = routes[0] if routes else 0
             
             # Route files intended to be passed
             selected_files, output = self._get_files(files, output)
 
             # Look ahead for the END node, return & display the final output once END is reached
-            if self.edges[curr_node][i] == END:
+            next_node = successors[i]
+            if next_node is END:
                 return output
 
             # Update global memory
-            await global_memory.add(curr_node, self.edges[curr_node][i], output)
+            await self._remember(global_memory, curr_node, next_node, output)
 
             # Continue executing through the graph until END is reached
-            next_node = self.edges[curr_node][i]
-            
-            # Handle self-loops: reset conversation to maintain tool-calling behavior
-            if next_node == curr_node:
-                # Self-loop: Reset message history and use fresh context
-                if hasattr(curr_node, 'client') and hasattr(curr_node.client, 'messages') and curr_node.client.messages:
-                    # Keep only the system message (first message)
-                    system_msg = curr_node.client.messages[0]
-                    curr_node.client.messages = [system_msg]
-                
-                # Create fresh prompt with task context and progress
-                cleaned_output = output.replace(f'\\\\{curr_node.name}\\\\', '').strip()
-                prompt = f"{original_prompt}\n\nProgress so far: {cleaned_output}\n\nContinue with your task."
-                author = 'user'
-            else:
-                # Different agent: pass the full output
-                prompt = output
-                author = 'user'
-            
+            prompt = self._next_prompt(curr_node, next_node, output, original_prompt, memory_cursors)
+            author = 'user'
             curr_node = next_node
         
         return None
+
+
+    def _next_prompt(self, curr_node: Agent, next_node: Agent, output: str, original_prompt: str, memory_cursors: dict) -> str:
+        '''
+        Builds the prompt for the next node from the current node's output.
+
+        Args:
+            curr_node (Agent): The node that produced the output.
+            next_node (Agent): The node that will receive the prompt.
+            output (str): The output of the current node.
+            original_prompt (str): The user prompt the graph was invoked with.
+            memory_cursors (dict): How much of the memory has been sent to each node.
+
+        Returns:
+            str: The prompt for the next node.
+        '''
+        # Different agent: pass the full output
+        if next_node is not curr_node:
+            return output
+
+        # Handle self-loops: reset conversation to maintain tool-calling behavior
+        if hasattr(curr_node, 'client') and hasattr(curr_node.client, 'messages') and curr_node.client.messages:
+            # Keep only the system message (first message). Truncate in place so the pinned system prompt 
+            # stays a byte-identical cacheable prefix and Agent.messages keeps pointing at the live history
+            del curr_node.client.messages[1:]
+            memory_cursors.pop(curr_node, None)
+
+        # Create fresh prompt with task context and progress
+        cleaned_output = output.replace(f'\\\\{curr_node.name}\\\\', '').strip()
+        return f"{original_prompt}\n\nProgress so far: {cleaned_output}\n\nContinue with your task."
+
+
+    def batch(self, prompts: list[str], files: list[str] = None, show_thinking: bool = False, max_concurrency: int = 10) -> list[str]:
+        '''
+        Public method that transparently handles both sync and async execution.
+
+        Runs the graph once per prompt, with up to max_concurrency runs in flight at once, so their round trips 
+        overlap and M prompts take roughly as long as the slowest one. Each run uses its own copy of the agents, so 
+        runs never share conversation history.
+
+        Args:
+            prompts (list[str]): The user prompts, one per graph run.
+            files (list[str], optional): Files given to every run. Defaults to None (no files).
+            show_thinking (bool, optional): Whether to log the prompts and responses of every run. Defaults to False.
+            max_concurrency (int, optional): The maximum number of runs in flight at once. Defaults to 10.
+
+        Returns:
+            list[str]: The final output of each run, in the order of the prompts.
+        '''
+        try:
+            # Check if we're in an event loop
+            loop = asyncio.get_event_loop()
+            if loop.is_running():
+                # We're being called from an async context
+                # Return the coroutine for the caller to await
+                return self._batch_async(prompts, files, show_thinking, max_concurrency)
+            else:
+                # No running event loop, create one
+                return asyncio.run(self._batch_async(prompts, files, show_thinking, max_concurrency))
+        except RuntimeError:
+            # No event loop exists, create one
+            return asyncio.run(self._batch_async(prompts, files, show_thinking, max_concurrency))
+
+    async def _batch_async(self, prompts: list[str], files: list[str] = None, show_thinking: bool = False, max_concurrency: int = 10) -> list[str]:
+        """Internal async implementation of the batch method."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(prompt: str) -> str:
+            async with semaphore:
+                return await self.copy()._invoke_async(prompt, files, show_thinking)
+
+        return list(await asyncio.gather(*(run(prompt) for prompt in prompts)))
+
+
+    def invoke_batch(self, prompts: list[str], poll_interval: float = 30.0) -> list[str]:
+        '''
+        Public method that transparently handles both sync and async execution.
+
+        Runs the graph once per prompt, submitting the model calls through the OpenAI Batch API rather than as 
+        individual requests. All runs advance in lockstep, so each step of the graph is a single batch job covering 
+        every run. Batch jobs halve the token cost but may take up to 24 hours, so this suits offline and evaluation 
+        workloads. Each run uses its own copy of the agents, so runs never share conversation history.
+
+        Batch mode supports OpenAI agents only. Tools are not offered to the model and files are not passed between 
+        agents, since both need a follow-up request within the same turn.
+
+        Args:
+            prompts (list[str]): The user prompts, one per graph run.
+            poll_interval (float, optional): Seconds between batch status checks. Defaults to 30.0.
+
+        Returns:
+            list[str]: The final output of each run, in the order of the prompts.
+        '''
+        try:
+            # Check if we're in an event loop
+            loop = asyncio.get_event_loop()
+            if loop.is_running():
+                # We're being called from an async context
+                # Return the coroutine for the caller to await
+                return self._invoke_batch_async(prompts, poll_interval)
+            else:
+                # No running event loop, create one
+                return asyncio.run(self._invoke_batch_async(prompts, poll_interval))
+        except RuntimeError:
+            # No event loop exists, create one
+            return asyncio.run(self._invoke_batch_async(prompts, poll_interval))
+
+
+    async def _invoke_batch_async(self, prompts: list[str], poll_interval: float = 30.0) -> list[str]:
+        """Internal async implementation of the invoke_batch method."""
+        # Output the user prompts if there are no agents defined
+        if len(self.nodes) == 2:
+            return list(prompts)
+
+        for node in self.nodes:
+            if isinstance(node, Agent) and not isinstance(node.client, OpenAIAgent):
+                raise ValueError("invoke_batch only supports graphs made of OpenAI agents.")
+
+        # Each run walks its own copy of the graph
+        runs = []
+        for prompt in prompts:
+            graph = self.copy()
+            runs.append({"graph": graph, "node": graph.edges[START][0], "prompt": prompt, "original_prompt": prompt, "memory": Memory(), "memory_cursors": {}})
+
+        outputs = [None] * len(runs)
+        pending = list(range(len(runs)))
+        step = 0
+        while pending:
+            # Collect this step's request from every pending run, grouped by client and model as batches require
+            clients = {}
+            groups = {}
+            for r in pending:
+                run = runs[r]
+                graph, node = run["graph"], run["node"]
+                if not graph.edges[node]:
+                    raise _dead_end(node)
+                prompt = run["prompt"]
+                if node.shared_memory:
+                    prompt, run["memory_cursors"][node] = await graph._with_memory(node, prompt, run["memory"], run["memory_cursors"])
+                msg, _ = node.client._build_message('user', prompt, [], graph.edges[node])
+                node.client.messages.append(msg)
+
+                group = (id(node.client.client), node.model)
+                clients[group] = node.client.client
+                groups.setdefault(group, {})[f"run-{r}-step-{step}"] = {"model": node.model, "messages": list(node.client.messages), **node.client._format_options()}
+
+            responses = {}
+            for results in await asyncio.gather(*(run_batch(clients[group], requests, poll_interval) for group, requests in groups.items())):
+                responses.update(results)
+
+            # Advance every run by one node
+            still_pending = []
+            for r in pending:
+                run = runs[r]
+                graph, node = run["graph"], run["node"]
+                output = responses[f"run-{r}-step-{step}"]
+                node.client.messages.append({"role": "assistant", "content": output})
+
+                successors = graph.edges[node]
+                i = 0
+                if len(successors) > 1:
+                    i, output = graph._get_route(node, output)
+                next_node = successors[i]
+                if next_node is END:
+                    outputs[r] = output
+                    continue
+
+                await graph._remember(run["memory"], node, next_node, output)
+                run["prompt"] = graph._next_prompt(node, next_node, output, run["original_prompt"], run["memory_cursors"])
+                run["node"] = next_node
+                still_pending.append(r)
+
+            pending = still_pending
+            step += 1
+
+        return outputs
+
+
+    def copy(self) -> 'Graph':
+        '''
+        Returns a copy of the graph with the same topology and settings, in which every agent is replaced by a clone 
+        with its own conversation history. Copies can be invoked concurrently without their conversations mixing.
+
+        Returns:
+            Graph: The copy of the graph.
+        '''
+        clones = {node: node.clone() for node in self.edges if isinstance(node, Agent)}
+        twin = copy.copy(self)
+        twin.edges = {clones.get(node, node): [clones.get(n, n) for n in successors] for node, successors in self.edges.items()}
+        twin.nodes = twin.edges.keys()
+        # The compiled topology refers to the original agents, so the copy derives its own
+        twin._reset_compiled()
+        return twin
+
+
+    async def _invoke_node(self, node: Agent, author: str, prompt: str, files: list[str], show_thinking: bool = False, stream: bool = False, memory_cursors: dict = None, cursor: int = None) -> str:
+        '''
+        Invokes a node, answering from the graph's cache when the node has already been given the same prompt, or 
+        with a SemanticCache, a prompt similar enough to one it was given before. Cached answers skip the agent entirely, so they are not added to its conversation history; only cache graphs 
+        whose agents answer each prompt independently of earlier turns.
+
+        Args:
+            node (Agent): The node to invoke.
+            author (str): The role of the message sender.
+            prompt (str): The prompt for the node.
+            files (list[str]): The files passed to the node.
+            show_thinking (bool): Enables log printing of the prompt and response.
+            stream (bool): Prints the response token by token as it is generated.
+            memory_cursors (dict, optional): How much of the memory has been sent to each node, updated in place.
+            cursor (int, optional): The position in memory the prompt's shared messages reach, from _with_memory. The 
+                                    node's cursor only moves there once the prompt is actually in its history, so a 
+                                    cached answer leaves those messages to be sent on its next real turn.
+
+        Returns:
+            str: The node's output.
+        '''
+        successors = self.edges[node]
+        key = None
+        context = None
+        embedding = None
+        if self.cache is not None:
+            # Everything that shapes the request: the agent's configuration and history, its routing options and the 
+            # prompt itself
+            edges = [(getattr(n, 'name', str(n)), getattr(n, 'description', '')) for n in successors]
+            tools = [(tool.format_for_api("openai"), _implementation(tool.function)) for tool in node.tools]
+            setup = (node.model, node.system_prompt_hash, tools, node.response_format, [getattr(f, "id", f) for f in node.files], node.messages, edges, author)
+            key = make_key(*setup, prompt, files)
+            cached = self.cache.get(key)
+
+            # Near-duplicates must match in everything but the wording of the prompt, and only text prompts are compared
+            if cached is None and isinstance(self.cache, SemanticCache) and not files:
+                context = make_key(*setup)
+                embedding = await self.cache.embed(prompt)
+                cached = self.cache.search(context, embedding)
+
+            if cached is not None:
+                if stream:
+                    print(cached)
+                return cached
+
+        if stream:
+            output = await node.invoke(author, prompt, files, successors, show_thinking, stream=True)
+        else:
+            output = await node.invoke(author, prompt, files, successors, show_thinking)
+        if cursor is not None:
+            memory_cursors[node] = cursor
+
+        if key is not None:
+            self.cache.set(key, output)
+        if embedding is not None:
+            self.cache.add(context, embedding, output)
+        return output
+
+
+    async def _with_memory(self, node: Agent, prompt: str, memory: Memory, memory_cursors: dict) -> tuple[str, int]:
+        '''
+        Appends the shared memory a node listens to onto its prompt. The node's own history already holds the 
+        messages it was sent on earlier turns, so only messages added since then are appended. Its conversation 
+        therefore grows append-only, keeping earlier turns a stable prefix that the provider can serve from its 
+        prompt cache, and each turn pays only for new messages rather than the whole memory again.
+
+        Args:
+            node (Agent): The node about to be invoked.
+            prompt (str): The prompt for the node.
+            memory (Memory): The global memory of the current graph invocation.
+            memory_cursors (dict): How much of the memory has been sent to each node. Not updated here, since the 
+                                   prompt may yet be answered from the cache without reaching the node's history.
+
+        Returns:
+            tuple: The prompt, with any new messages appended, and the cursor to record for the node once the prompt 
+            has been added to its history.
+        '''
+        start = memory_cursors.get(node, 0)
+        pack, _ = await memory.get_pack(node.shared_memory, node.shared_memory, self.memory_window, start)
+        cursor = len(memory)
+        if not pack:
+            return prompt, cursor
+        label = 'Previous messages' if start == 0 else 'New messages'
+        return prompt + f'\n\n{label}: \n{pack}', cursor
+
+
+    async def _fan_out(self, node: Agent, prompt: str, file_options: list[str], files: list[str], memory: Memory, memory_cursors: dict, show_thinking: bool = False, branches: tuple = None) -> tuple[str, list[str]]:
+        '''
+        Invokes the successors of a node concurrently with the same prompt, so that an N-way branch costs roughly 
+        one round trip instead of N, with at most max_concurrency branches in flight. Each branch output is recorded 
+        in memory for the join node and the outputs are merged, labelled by agent name, into a single prompt.
+
+        Args:
+            node (Agent): The node whose successors are invoked.
+            prompt (str): The output of the node, passed to every branch.
+            file_options (list[str]): The files supplied to the graph, which branches may pass on.
+            files (list[str]): The files selected by the node for its successors.
+            memory (Memory): The global memory of the current graph invocation.
+            memory_cursors (dict): How much of the memory has been sent to each node.
+            show_thinking (bool): Enables log printing of prompts and responses from the branches.
+            branches (tuple[Agent], optional): The successors to invoke. Defaults to None (every successor).
+
+        Returns:
+            tuple: A tuple containing:
+                - str: The labelled outputs of all branches.
+                - list[str]: The files selected by any of the branches.
+        '''
+        if branches is None:
+            branches = self.edges[node]
+        join = self._get_join(node)
+
+        # Record the hand-off before any branch runs so shared memory reads see it
+        for branch in branches:
+            await self._remember(memory, node, branch, prompt)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+
+        async def invoke(branch: Agent, branch_prompt: str, cursor: int) -> str:
+            if semaphore is None:
+                return await self._invoke_node(branch, 'user', branch_prompt, files, show_thinking, memory_cursors=memory_cursors, cursor=cursor)
+            async with semaphore:
+                return await self._invoke_node(branch, 'user', branch_prompt, files, show_thinking, memory_cursors=memory_cursors, cursor=cursor)
+
+        invocations = []
+        for branch in branches:
+            branch_prompt, cursor = prompt, None
+            if branch.shared_memory:
+                branch_prompt, cursor = await self._with_memory(branch, prompt, memory, memory_cursors)
+            invocations.append(invoke(branch, branch_prompt, cursor))
+        outputs = await asyncio.gather(*invocations)
+
+        merged = []
+        selected_files = []
+        for branch, output in zip(branches, outputs):
+            # Branches converge on the join node, so any routing command they emit is dropped
+            if len(self.edges[branch]) > 1:
+                _, output = self._find_routes(branch, output)
+            branch_files, output = self._get_files(file_options, output)
+            selected_files.extend(f for f in branch_files if f not in selected_files)
+            await self._remember(memory, branch, join, output)
+            merged.append(f"{branch.name}: {output.strip()}")
+
+        return "\n\n".join(merged), selected_files
+
+
+    def _get_join(self, node: Agent) -> Union[Agent, None]:
+        '''
+        Looks up the node where the branches leaving a node converge, as found by compile().
+
+        Args:
+            node (Agent): The node whose successors are treated as parallel branches.
+
+        Returns:
+            Agent or None: The join node (possibly END), or None if the branches do not converge on a single node.
+        '''
+        if self._joins is None:
+            self.compile()
+        return self._joins.get(node)
+
+
+    def _find_join(self, node: Agent) -> Union[Agent, None]:
+        '''
+        Finds the node where the branches leaving a node converge. A join exists when none of the branches is END 
+        or the node itself, and exactly one node outside the branches is a successor of every branch.
+
+        Args:
+            node (Agent): The node whose successors are treated as parallel branches.
+
+        Returns:
+            Agent or None: The join node (possibly END), or None if the branches do not converge on a single node.
+        '''
+        branches = self.edges[node]
+        if END in branches or node in branches:
+            return None
+
+        common = None
+        for branch in branches:
+            targets = {n for n in self.edges[branch] if n not in branches}
+            common = targets if common is None else common & targets
+        if common and len(common) == 1:
+            return next(iter(common))
+        return None
+
     
     def _get_route(self, node: Agent, output: str) -> tuple[int, str]:
         '''
@@ -208,29 +863,84 @@ class Graph:
                 - int: The index of the chosen route in the node's edge list.
                 - str: The output string with the routing command removed.
         '''
-        options = self.edges[node]
-        # Regex to find agent names - handle both single and double backslashes
-        # Try double backslashes first, then single backslashes
-        match = re.search(r'(?<=\\\\)(.*?)(?=\\\\)', output, re.DOTALL)
-        if not match:
-            match = re.search(r'(?<=\\)(.*?)(?=\\)', output, re.DOTALL)
-        
-        if match:
-            # Remove the routing command from the output (handle both patterns)
-            command = match.group(1)
-            output = re.sub(r'\\\\?' + re.escape(command) + r'\\\\?', '', output, count=1)
-            
-            # Get index of the desired agent in the node's edge list
-            # Check if the match is the END command
-            if command == 'END':
-                return options.index(END), output
-            else:
-                for i, option in enumerate(options):
-                    if option.name == command:
-                        return i, output
-            
+        route_idx, output = self._find_route(node, output)
         # No route found, choose default route
-        return 0, output
+        return route_idx or 0, output
+
+
+    def _find_route(self, node: Agent, output: str) -> tuple[Union[int, None], str]:
+        '''
+        Same as _get_route, but returns None as the index when the output does not name a valid route so that 
+        callers can tell an explicit choice apart from the default.
+
+        Args:
+            node (Agent): The node from which the routing command is being extracted.
+            output (str): The agent's response that contains the routing command.
+
+        Returns:
+            tuple: The index of the chosen route (or None) and the output with the routing command removed.
+        '''
+        routes, output = self._find_routes(node, output)
+        return (routes[0] if routes else None), output
+
+
+    def _find_routes(self, node: Agent, output: str) -> tuple[list[int], str]:
+        '''
+        Extracts every routing command from a node's response, so that a single turn can hand off to several 
+        successors at once (e.g. '\\Researcher\\ \\Critic\\'). Routing commands are removed from the output, while 
+        delimited text that names no route (e.g. a Windows path) is kept.
+
+        Args:
+            node (Agent): The node from which the routing commands are being extracted.
+            output (str): The agent's response that contains the routing commands.
+
+        Returns:
+            tuple: The indices of the named routes in the node's edge list, in the order they were named and without 
+            duplicates, and the output with the routing commands removed.
+        '''
+        # Most responses name no route, so skip the delimiter scans when there is no delimiter at all
+        if '\\' not in output:
+            return [], output
+
+        if self._route_indexes is None:
+            self.compile()
+        index = self._route_indexes.get(node)
+        if index is None:
+            index = self._index_routes(node)
+
+        # Find agent names, removing the routing commands from the output. Try double backslashes first, then single
+        for delimiter in _ROUTE_DELIMITERS:
+            commands, stripped = _split_routes(output, delimiter, index)
+            if commands:
+                break
+        else:
+            return [], output
+        output = stripped
+
+        # Get the index of each desired agent in the node's edge list
+        routes = []
+        for command in commands:
+            i = index[command]
+            if i not in routes:
+                routes.append(i)
+        return routes, output
+
+
+    def _index_routes(self, node: Agent) -> dict:
+        '''
+        Maps the name of each of a node's successors to its index in the node's edge list, so routing commands are 
+        resolved with a lookup. END is named 'END', and the first successor wins when names repeat.
+
+        Args:
+            node (Agent): The node whose successors are indexed.
+
+        Returns:
+            dict[str, int]: The index of each successor, by name.
+        '''
+        index = {}
+        for i, option in enumerate(self.edges[node]):
+            index.setdefault(option.name, i)
+        return index
 
 
     def _get_files(self, file_options: list[str], output: str) -> tuple[list[str], str]:
@@ -251,11 +961,15 @@ class Graph:
                 in the output.
                 - The output string with all file command blocks removed.
         '''
+        # Most responses pass no files, so skip the regex scans when there is no file command at all
+        if '<<FILE>>' not in output:
+            return [], output
+
         # Precompute a mapping from option (trimmed) to its file path for O(1) lookups
         option_to_file = {option.strip(): option for option in file_options}
 
         # Find all file command matches (allowing multiple matches)
-        matches = re.findall(r'<<FILE>>(.*?)<</FILE>>', output, re.DOTALL)
+        matches = _FILE_PATTERN.findall(output)
         valid_chosen_files = []
 
         for match in matches:
@@ -272,6 +986,6 @@ class Graph:
                 print(f"File option '{option}' not found in file_options.")
         
         # Clean the output of all file command blocks.
-        output = re.sub(r'<<FILE>>.*?<</FILE>>', '', output, flags=re.DOTALL)
+        output = _FILE_PATTERN.sub('', output)
         
         return valid_chosen_files, output
\ No newline at end of file
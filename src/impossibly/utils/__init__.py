@@ -9,10 +9,15 @@ These utilities provide support functionality for the core Impossibly components
 # Core utilities
 from .memory import Memory
 from .tools import Tool, format_tools_for_api
+from .cache import ResponseCache, SemanticCache
+from .clients import get_client
+from .env import require_env
 from .start_end import START, END
 
 __all__ = [
     'Memory',
     'Tool', 'format_tools_for_api',
+    'ResponseCache', 'SemanticCache',
+    'get_client', 'require_env',
     'START', 'END'
 ]
\ No newline at end of file
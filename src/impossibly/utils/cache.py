@@ -0,0 +1,287 @@
+'''
+Caches for model responses, allowing identical requests to be answered without another API round trip.
+
+Author: Jackson Grove
+'''
+import json
+import math
+import os
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Union
+from openai import AsyncOpenAI, OpenAI
+
+
+# Distinguishes a stored None from a missing entry
+_MISSING = object()
+
+
+def _to_jsonable(obj: Any) -> Any:
+    '''
+    Fallback serializer for objects json cannot encode natively, such as SDK models stored in message history.
+    '''
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+
+def make_key(*parts: Any) -> str:
+    '''
+    Builds a stable, content-addressed cache key from any JSON-serializable parts (model name, messages, tools, ...).
+
+    Args:
+        *parts: The values that together determine a response.
+
+    Returns:
+        str: A hex digest identifying the parts.
+    '''
+    payload = json.dumps(parts, sort_keys=True, default=_to_jsonable, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    '''
+    A bounded, in-memory LRU cache of model responses, optionally backed by a SQLite file so that entries survive 
+    across runs.
+
+    Entries are evicted least-recently-used first once maxsize is reached, and optionally expire after ttl seconds. 
+    With a path, every entry is also written to disk, and lookups that miss in memory fall back to the file. Values 
+    stored on disk must be JSON-serializable.
+
+    Args:
+        maxsize (int, optional): The maximum number of entries to keep in memory. Defaults to 1024.
+        ttl (float, optional): Seconds after which an entry expires. Defaults to None (never expires).
+        path (str, optional): The SQLite file backing the cache, created if needed. Defaults to None (memory only).
+
+    Attributes:
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that were not.
+    '''
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, path: Optional[str] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._db = self._open(path) if path else None
+        # Sync tools run in worker threads, so access to the shared connection is serialized
+        self._db_lock = threading.Lock()
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        '''
+        Opens the SQLite file backing the cache, creating it and its table if needed.
+        '''
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # Write-ahead logging lets reads proceed during writes, and relaxed syncing suits a cache that can be rebuilt
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        return db
+
+    def _load(self, key: str) -> Any:
+        '''
+        Reads an entry from disk into memory, returning _MISSING if it is absent or expired.
+        '''
+        with self._db_lock:
+            row = self._db.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return _MISSING
+            value, expires_at = row
+            # Disk entries outlive the process, so they expire by wall-clock time
+            remaining = None if expires_at is None else expires_at - time.time()
+            if remaining is not None and remaining <= 0:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return _MISSING
+
+        value = json.loads(value)
+        self._remember(key, value, None if remaining is None else time.monotonic() + remaining)
+        return value
+
+    def _remember(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        '''
+        Stores an entry in memory, evicting the least recently used entry if the cache is full.
+        '''
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        '''
+        Looks up a key, marking it as recently used.
+
+        Args:
+            key (str): The cache key, usually built with make_key.
+            default (Any, optional): The value returned on a miss. Defaults to None.
+
+        Returns:
+            Any: The cached value, or default if the key is missing or expired.
+        '''
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        if self._db is not None:
+            value = self._load(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+        self.misses += 1
+        return default
+
+    def set(self, key: str, value: Any) -> None:
+        '''
+        Stores a value, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (str): The cache key, usually built with make_key.
+            value (Any): The value to store.
+        '''
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._remember(key, value, expires_at)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, default=_to_jsonable), time.time() + self.ttl if self.ttl is not None else None)
+                )
+
+    def clear(self) -> None:
+        '''
+        Removes all entries, including those on disk, and resets the hit and miss counters.
+        '''
+        self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+            return True
+        return self._db is not None and self._load(key) is not _MISSING
+
+
+class SemanticCache(ResponseCache):
+    '''
+    A response cache that also answers near-duplicate prompts. Besides exact matches, responses are stored with an 
+    embedding of the prompt that produced them, and a later prompt is answered from the cache when its embedding is 
+    within threshold cosine similarity of a stored one and everything else about the request (history, tools, routing 
+    options) matches exactly.
+
+    Only suited to agents whose answers should not depend on the exact wording of a prompt.
+
+    Args:
+        client (OpenAI or AsyncOpenAI): The client used to embed prompts.
+        model (str, optional): The embedding model. Defaults to "text-embedding-3-small".
+        threshold (float, optional): The minimum cosine similarity for a near-duplicate. Defaults to 0.95.
+        maxsize (int, optional): The maximum number of entries of each kind to keep. Defaults to 1024.
+        ttl (float, optional): Seconds after which an entry expires. Defaults to None (never expires).
+
+    Attributes:
+        hits (int): The number of exact lookups answered from the cache.
+        misses (int): The number of exact lookups that were not.
+        semantic_hits (int): The number of near-duplicate prompts answered from the cache.
+    '''
+    def __init__(self, client: Union[AsyncOpenAI, OpenAI], model: str = "text-embedding-3-small", threshold: float = 0.95, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        super().__init__(maxsize, ttl)
+        self.client = client
+        self.model = model
+        self.threshold = threshold
+        self.semantic_hits = 0
+        # Embeddings grouped by request context, so a lookup only compares prompts that share everything else
+        self._embeddings = OrderedDict()
+        self._size = 0
+
+    async def embed(self, text: str) -> List[float]:
+        '''
+        Embeds a prompt as a unit vector.
+
+        Args:
+            text (str): The prompt to embed.
+
+        Returns:
+            list[float]: The normalized embedding.
+        '''
+        if isinstance(self.client, AsyncOpenAI):
+            response = await self.client.embeddings.create(model=self.model, input=text)
+        else:
+            response = await asyncio.to_thread(self.client.embeddings.create, model=self.model, input=text)
+        vector = response.data[0].embedding
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def search(self, context: str, embedding: List[float]) -> Any:
+        '''
+        Finds the response to the most similar prompt made in the same context.
+
+        Args:
+            context (str): A key identifying everything about the request except the prompt, usually built with make_key.
+            embedding (list[float]): The prompt's embedding, from embed.
+
+        Returns:
+            Any: The cached response, or None if no stored prompt is similar enough.
+        '''
+        entries = self._embeddings.get(context)
+        if not entries:
+            return None
+
+        now = time.monotonic()
+        best, best_score = None, self.threshold
+        for vector, value, expires_at in entries:
+            if expires_at is not None and expires_at <= now:
+                continue
+            # Both vectors are normalized, so the dot product is the cosine similarity
+            score = sum(a * b for a, b in zip(vector, embedding))
+            if score >= best_score:
+                best, best_score = value, score
+
+        if best is not None:
+            self._embeddings.move_to_end(context)
+            self.semantic_hits += 1
+        return best
+
+    def add(self, context: str, embedding: List[float], value: Any) -> None:
+        '''
+        Stores a response with the embedding of its prompt, evicting the least recently used context if the cache is full.
+
+        Args:
+            context (str): A key identifying everything about the request except the prompt, usually built with make_key.
+            embedding (list[float]): The prompt's embedding, from embed.
+            value (Any): The response to store.
+        '''
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._embeddings.setdefault(context, []).append((embedding, value, expires_at))
+        self._embeddings.move_to_end(context)
+        self._size += 1
+        while self._size > self.maxsize:
+            _, evicted = self._embeddings.popitem(last=False)
+            self._size -= len(evicted)
+
+    def clear(self) -> None:
+        '''
+        Removes all entries and resets the hit and miss counters.
+        '''
+        super().clear()
+        self._embeddings.clear()
+        self._size = 0
+        self.semantic_hits = 0
@@ -0,0 +1,105 @@
+'''
+Shared API clients, so that every Agent in a process reuses one connection pool instead of paying a fresh TCP/TLS
+handshake per client.
+
+Author: Jackson Grove
+'''
+import asyncio
+import importlib.util
+from functools import lru_cache
+from typing import Union
+
+from anthropic import Anthropic, AsyncAnthropic
+from openai import AsyncOpenAI, OpenAI
+
+# Connection pool limits shared by every client created here. Fanned out graphs send a burst of requests at once and 
+# then go quiet while the next node runs, so keep every connection alive long enough for the next burst to reuse it
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 100
+KEEPALIVE_EXPIRY_SECONDS = 120.0
+
+# Model calls can run for minutes, so mirror the SDK's own default timeout rather than httpx's 5 seconds
+TIMEOUT_SECONDS = 600.0
+CONNECT_TIMEOUT_SECONDS = 5.0
+
+# The (sync, async) client classes of each supported provider
+_CLIENT_CLASSES = {
+    "openai": (OpenAI, AsyncOpenAI),
+    "anthropic": (Anthropic, AsyncAnthropic),
+}
+
+# HTTP/2 multiplexes parallel requests over one connection, but requires the optional 'h2' package
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _per_loop_transport(http2: bool, limits):
+    '''
+    Returns an async transport that keeps a separate connection pool for each event loop. Async connections are bound 
+    to the loop that opened them, and every sync Graph.invoke or Agent.invoke runs in a fresh loop of its own, so one 
+    pool shared across loops would fail with "Event loop is closed" on the second call. Requests within a loop still 
+    share one pool.
+    '''
+    import httpx  # Imported lazily since only the shared clients need it directly
+
+    class PerLoopTransport(httpx.AsyncBaseTransport):
+        def __init__(self) -> None:
+            self._transports = {}
+
+        def _transport(self) -> httpx.AsyncHTTPTransport:
+            loop = asyncio.get_running_loop()
+            transport = self._transports.get(loop)
+            if transport is None:
+                # Pools of finished loops can no longer be used or closed, so drop them rather than keep them alive
+                for stale in [other for other in self._transports if other.is_closed()]:
+                    del self._transports[stale]
+                transport = self._transports[loop] = httpx.AsyncHTTPTransport(http2=http2, limits=limits)
+            return transport
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            return await self._transport().handle_async_request(request)
+
+        async def aclose(self) -> None:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+            if transport is not None:
+                await transport.aclose()
+
+    return PerLoopTransport()
+
+
+@lru_cache(maxsize=None)
+def _http_client(asynchronous: bool = False):
+    '''
+    Returns the process-wide pooled keep-alive HTTP client shared by every client created here, whatever the provider. 
+    The async client keeps one pool per event loop (see _per_loop_transport).
+    '''
+    import httpx  # Imported lazily since only the shared clients need it directly
+
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS, keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS)
+    timeout = httpx.Timeout(TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS)
+    if asynchronous:
+        return httpx.AsyncClient(transport=_per_loop_transport(HTTP2_AVAILABLE, limits), timeout=timeout)
+    return httpx.Client(http2=HTTP2_AVAILABLE, limits=limits, timeout=timeout)
+
+
+@lru_cache(maxsize=None)
+def get_client(asynchronous: bool = False, provider: str = "openai") -> Union[OpenAI, AsyncOpenAI, Anthropic, AsyncAnthropic]:
+    '''
+    Returns a lazily created, process-wide OpenAI or Anthropic client. All clients share one pooled keep-alive HTTP 
+    client (one per sync/async mode), so agents on either provider reuse warm connections instead of each opening 
+    their own. Async clients keep a separate pool per event loop, so they can be reused across repeated sync calls. HTTP/2 is enabled when the 'h2' package is installed. The API key is read from the OPENAI_API_KEY or 
+    ANTHROPIC_API_KEY environment variable.
+
+    Args:
+        asynchronous (bool, optional): Whether to return an async client. Defaults to False.
+        provider (str, optional): "openai" or "anthropic". Defaults to "openai".
+
+    Returns:
+        OpenAI, AsyncOpenAI, Anthropic or AsyncAnthropic: The shared client. Repeated calls return the same instance.
+
+    Raises:
+        ValueError: If the provider is not supported.
+    '''
+    if provider not in _CLIENT_CLASSES:
+        raise ValueError(f"Unsupported provider '{provider}'. Choose from: {', '.join(_CLIENT_CLASSES)}")
+    client_class = _CLIENT_CLASSES[provider][asynchronous]
+    return client_class(http_client=_http_client(asynchronous))
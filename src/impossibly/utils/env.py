@@ -0,0 +1,87 @@
+'''
+Helpers for reading configuration from the environment. The package loads a .env file from the working directory once, 
+when it is imported, so scripts only need to read the values they require.
+
+Author: Jackson Grove
+'''
+import os
+from typing import Optional
+
+ENV_FILENAME = ".env"
+
+
+def find_env_file(start: Optional[str] = None) -> Optional[str]:
+    '''
+    Finds the nearest .env file, searching upwards from a directory.
+
+    Args:
+        start (str, optional): The directory to search from. Defaults to the working directory.
+
+    Returns:
+        str: The path of the .env file, or None if there is none.
+    '''
+    directory = os.path.abspath(start or os.getcwd())
+    while True:
+        path = os.path.join(directory, ENV_FILENAME)
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def load_env(path: Optional[str] = None) -> None:
+    '''
+    Loads KEY=VALUE lines from a .env file into the environment. Variables already set in the environment take 
+    precedence. Blank lines and comments are skipped, an optional 'export ' prefix is allowed, and values may be 
+    wrapped in single or double quotes. Trailing comments are dropped, after the closing quote of quoted values.
+
+    Args:
+        path (str, optional): The file to load. Defaults to the nearest .env file, searching upwards from the working 
+            directory rather than from this file, which lives inside the installed package.
+    '''
+    path = path or find_env_file()
+    if path is None:
+        return
+    try:
+        with open(path, encoding="utf-8") as env_file:
+            lines = env_file.read().splitlines()
+    except FileNotFoundError:
+        return
+
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        if line.startswith("export "):
+            line = line[len("export "):]
+        key, value = line.split("=", 1)
+        key, value = key.strip(), value.strip()
+        end = value.find(value[0], 1) if value[:1] in ("'", '"') else -1
+        if end != -1:
+            # Take a quoted value up to its closing quote, ignoring any comment after it
+            value = value[1:end]
+        elif " #" in value:
+            # Drop trailing comments from unquoted values
+            value = value.split(" #", 1)[0].rstrip()
+        os.environ.setdefault(key, value)
+
+
+def require_env(name: str) -> str:
+    '''
+    Reads a required environment variable.
+
+    Args:
+        name (str): The name of the variable.
+
+    Returns:
+        str: The variable's value.
+
+    Raises:
+        ValueError: If the variable is not set or is empty.
+    '''
+    value = os.getenv(name)
+    if not value:
+        raise ValueError(f"{name} is not set. Please check your .env file.")
+    return value
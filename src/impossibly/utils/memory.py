@@ -4,9 +4,8 @@ A data structure to track global memory of all Agents within a Graph. Stores eac
 
 from __future__ import annotations
 import asyncio
-from typing import TYPE_CHECKING, List
-
-from impossibly.utils.start_end import END
+import hashlib
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 if TYPE_CHECKING:
     from impossibly import Agent  # Import only for type checking
@@ -40,8 +39,6 @@ class Memory:
     
     async def _add_async(self, author: 'Agent', recipient: 'Agent', content: str):
         """Internal async implementation of add."""
-        if recipient is END:
-            recipient.name = 'END'
         new = {
             'author': author.name,
             'recipient': recipient.name,
@@ -101,7 +98,56 @@ class Memory:
         '''
         Internal async implementation to format messages between specified authors and recipients.
         '''
-        return '\n'.join([f"{m['author']} -> {m['recipient']}: {m['content']}" for m in self.memory if m['author'] in [a.name for a in author] and m['recipient'] in [a.name for a in recipient]])
+        return self._format(self._select(author, recipient))
+
+    def _select(self, author: List['Agent'], recipient: List['Agent'], start: int = 0) -> List[dict]:
+        '''
+        Returns the messages between the specified authors and recipients, in insertion order, from position start on.
+        '''
+        # Build the name sets once, so each message is checked with two constant-time lookups
+        author_names = frozenset(a.name for a in author)
+        recipient_names = frozenset(a.name for a in recipient)
+        messages = self.memory[start:] if start else self.memory
+        return [m for m in messages if m['author'] in author_names and m['recipient'] in recipient_names]
+
+    @staticmethod
+    def _format(messages: List[dict]) -> str:
+        return '\n'.join([f"{m['author']} -> {m['recipient']}: {m['content']}" for m in messages])
+
+    def get_pack(self, author: List['Agent'], recipient: List['Agent'], top_k: Optional[int] = None, start: int = 0):
+        """
+        Public method that transparently handles both sync and async execution.
+        
+        This method detects if it's being called from an async context and acts accordingly.
+        If called from sync code, it runs the async implementation using asyncio.run().
+        If called from async code, it returns a coroutine that can be awaited.
+        """
+        try:
+            # Check if we're in an event loop
+            loop = asyncio.get_event_loop()
+            if loop.is_running():
+                # We're being called from an async context
+                # Return the coroutine for the caller to await
+                return self._get_pack_async(author, recipient, top_k, start)
+            else:
+                # No running event loop, create one
+                return asyncio.run(self._get_pack_async(author, recipient, top_k, start))
+        except RuntimeError:
+            # No event loop exists, create one
+            return asyncio.run(self._get_pack_async(author, recipient, top_k, start))
+
+    async def _get_pack_async(self, author: List['Agent'], recipient: List['Agent'], top_k: Optional[int] = None, start: int = 0) -> Tuple[str, str]:
+        '''
+        Internal async implementation building a deterministic memory pack: the formatted messages between the 
+        specified authors and recipients in insertion order, optionally capped to the most recent top_k, along 
+        with a version hash of the text. Identical memory always yields byte-identical text and the same version. 
+        With start, only messages added at or after that position (e.g. a previous len(memory)) are included.
+        '''
+        messages = self._select(author, recipient, start)
+        if top_k is not None:
+            messages = messages[-top_k:] if top_k > 0 else []
+        text = self._format(messages)
+        return text, hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
 
     def get_all(self):
         """
@@ -155,6 +201,9 @@ class Memory:
         """Internal async implementation of clear."""
         self.memory = []
 
+    def __len__(self):
+        return len(self.memory)
+
     def __str__(self):
         return str(self.memory)
 
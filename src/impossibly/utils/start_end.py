@@ -16,6 +16,9 @@ class END_node:
     Node to signify the end of the graph (final output).
     Implemented as a singleton.
     '''
+    # Named like an agent, so hand-offs to END can be recorded in memory and routed to with '\\END\\'
+    name = "END"
+
     def __str__(self) -> str:
         return "END"
     
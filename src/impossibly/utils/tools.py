@@ -7,6 +7,8 @@ for use with various language model APIs (OpenAI, Anthropic, etc.).
 
 import asyncio
 
+from impossibly.utils.cache import ResponseCache, make_key
+
 # Type mapping from Python types to OpenAI API types
 TYPE_MAPPING = {
     str: "string",
@@ -17,13 +19,16 @@ TYPE_MAPPING = {
     dict: "object",
 }
 
+# Distinguishes a memoized None from a cache miss
+_MISSING = object()
+
 class Tool:
     """
     Represents a tool that can be used by an agent.
     
     This class handles the definition and formatting of tools for various API providers.
     """
-    def __init__(self, name, description, function, parameters=None):
+    def __init__(self, name, description, function, parameters=None, cacheable=False, ttl=None):
         """
         Initialize a tool with its metadata and function.
         
@@ -31,12 +36,18 @@ class Tool:
             name: The name of the tool
             description: A description of what the tool does
             function: The function to execute when the tool is called
-            parameters: List of parameter definitions (dicts with name, type, description)
+            parameters: List of parameter definitions (dicts with name, type, description, and for list 
+                        parameters an optional 'items' type for their elements)
+            cacheable: Whether to memoize results by their arguments. Only enable for tools whose result depends 
+                       on nothing but their arguments. Defaults to False
+            ttl: Seconds after which a memoized result expires, for cacheable tools whose results go stale. 
+                 Defaults to None (never expires)
         """
         self.name = name
         self.description = description
         self.function = function
         self.parameters = []
+        self.cache = ResponseCache(ttl=ttl) if cacheable else None
         
         # Check if the function is a coroutine function
         self.is_async = asyncio.iscoroutinefunction(function)
@@ -51,13 +62,23 @@ class Tool:
                         valid_types = ", ".join(t.__name__ for t in TYPE_MAPPING)
                         raise ValueError(f"Unsupported type: {param_type}. Use one of: {valid_types}")
                     
-                    self.parameters.append({
+                    processed = {
                         "name": param["name"],
                         "type": param_type,
                         "api_type": TYPE_MAPPING[param_type],
                         "description": param["description"],
                         "required": param.get("required", True)
-                    })
+                    }
+
+                    # Describe the elements of list parameters
+                    item_type = param.get("items")
+                    if item_type is not None:
+                        if item_type not in TYPE_MAPPING:
+                            valid_types = ", ".join(t.__name__ for t in TYPE_MAPPING)
+                            raise ValueError(f"Unsupported item type: {item_type}. Use one of: {valid_types}")
+                        processed["items"] = TYPE_MAPPING[item_type]
+
+                    self.parameters.append(processed)
                 else:
                     # Already processed param, just add it
                     self.parameters.append(param)
@@ -85,6 +106,8 @@ class Tool:
                 "type": param["api_type"],
                 "description": param["description"]
             }
+            if "items" in param:
+                formatted_tool["function"]["parameters"]["properties"][param["name"]]["items"] = {"type": param["items"]}
             if param.get("required", True):
                 formatted_tool["function"]["parameters"]["required"].append(param["name"])
 
@@ -137,14 +160,29 @@ class Tool:
         else:
             # Function is synchronous, just call it directly
             try:
-                result = self.function(**kwargs)
+                if self.cache is None:
+                    return self.function(**kwargs)
+                # Memoized results are keyed by their arguments
+                key = make_key(kwargs)
+                result = self.cache.get(key, _MISSING)
+                if result is _MISSING:
+                    result = self.function(**kwargs)
+                    self.cache.set(key, result)
                 return result
             except Exception as e:
                 raise
     
     async def _execute_async(self, **kwargs):
         """Internal async implementation of execute for async functions."""
-        return await self.function(**kwargs)
+        if self.cache is None:
+            return await self.function(**kwargs)
+        # Memoized results are keyed by their arguments
+        key = make_key(kwargs)
+        result = self.cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = await self.function(**kwargs)
+            self.cache.set(key, result)
+        return result
 
 
 def format_tools_for_api(tools, api="openai"):
@@ -7,11 +7,12 @@ This tests the following features:
 3. Agent memory and history
 4. Multiple model types working together
 """
+import asyncio
 import pytest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 # Import the necessary components
-from impossibly import Agent, Graph, START, END
+from impossibly import Agent, Graph, Memory, START, END
 
 
 @pytest.mark.agent_memory
@@ -191,4 +192,186 @@ class TestAgentInteraction:
                 
             # We verify that the side_effect list contained two elements
             # indicating that our mock has the expected setup for two steps of reasoning
-            assert len(responses) == 2 
\ No newline at end of file
+            assert len(responses) == 2 
+    @pytest.mark.cross_agent
+    def test_memory_pack_versioning(self, mock_anthropic_client):
+        """Test that shared memory packs are deterministic, versioned and bounded."""
+        writer = Agent(mock_anthropic_client, name="Writer")
+        reader = Agent(mock_anthropic_client, name="Reader", shared_memory=[writer])
+
+        memory = Memory()
+        memory.add(writer, reader, "first")
+        memory.add(writer, reader, "second\nline")
+
+        text, version = memory.get_pack([writer, reader], [writer, reader])
+        assert text == "Writer -> Reader: first\nWriter -> Reader: second\nline"
+        assert memory.get_pack([writer, reader], [writer, reader]) == (text, version)
+
+        # Capping to the most recent message changes the pack and its version
+        recent, recent_version = memory.get_pack([writer, reader], [writer, reader], top_k=1)
+        assert recent == "Writer -> Reader: second\nline"
+        assert recent_version != version
+
+    @pytest.mark.cross_agent
+    def test_shared_memory_is_sent_incrementally(self, mock_anthropic_client):
+        """Test that a node listening to shared memory is only sent messages it has not received yet."""
+        writer = Agent(mock_anthropic_client, name="Writer")
+        editor = Agent(mock_anthropic_client, name="Editor")
+        reader = Agent(mock_anthropic_client, name="Reader", shared_memory=[writer, editor])
+        graph = Graph()
+        memory = Memory()
+        cursors = {}
+
+        memory.add(writer, editor, "first")
+        first, cursor = asyncio.run(graph._with_memory(reader, "Go", memory, cursors))
+        assert first == "Go\n\nPrevious messages: \nWriter -> Editor: first"
+
+        # Until the prompt is delivered, the same messages are offered again
+        assert asyncio.run(graph._with_memory(reader, "Go", memory, cursors))[0] == first
+        cursors[reader] = cursor
+
+        # Nothing new, so the prompt is left untouched
+        assert asyncio.run(graph._with_memory(reader, "Go", memory, cursors))[0] == "Go"
+
+        memory.add(writer, editor, "second")
+        assert asyncio.run(graph._with_memory(reader, "Go", memory, cursors))[0] == "Go\n\nNew messages: \nWriter -> Editor: second"
+
+    @pytest.mark.agent_memory
+    def test_unread_hand_offs_are_not_recorded(self, mock_anthropic_client):
+        """Test that a graph only records hand-offs that some node reads back through shared memory."""
+        writer = Agent(mock_anthropic_client, name="Writer")
+        editor = Agent(mock_anthropic_client, name="Editor")
+        reader = Agent(mock_anthropic_client, name="Reader", shared_memory=[writer, editor])
+        graph = Graph()
+        graph.add_node([writer, editor, reader])
+        graph.add_edge(START, writer)
+        graph.add_edge(writer, editor)
+        graph.add_edge(editor, reader)
+        graph.add_edge(reader, END)
+        memory = Memory()
+
+        asyncio.run(graph._remember(memory, writer, editor, "draft"))
+        asyncio.run(graph._remember(memory, editor, reader, "edit"))
+        asyncio.run(graph._remember(memory, reader, END, "done"))
+        assert memory.memory == [{"author": "Writer", "recipient": "Editor", "content": "draft"}]
+        assert END.name == "END"
+
+    @pytest.mark.streaming
+    def test_streamed_response(self, mock_openai_client, capsys):
+        """Test that responses can be streamed piece by piece and are recorded in full."""
+        def make_chunk(text):
+            chunk = MagicMock()
+            chunk.choices[0].delta.content = text
+            chunk.choices[0].delta.tool_calls = None
+            return chunk
+
+        mock_openai_client.chat.completions.create.side_effect = lambda **kwargs: iter([make_chunk("Hel"), make_chunk("lo"), make_chunk(None)])
+        agent = Agent(mock_openai_client, name="Streamer")
+
+        async def collect():
+            return [piece async for piece in agent.stream("user", "Say hello")]
+
+        assert asyncio.run(collect()) == ["Hel", "lo"]
+        assert agent.messages[-1] == {"role": "assistant", "content": "Hello"}
+        assert mock_openai_client.chat.completions.create.call_args.kwargs["stream"] is True
+
+        # invoke prints the pieces as they arrive and returns the whole response
+        assert agent.invoke("user", "Again", stream=True) == "Hello"
+        assert "Hello" in capsys.readouterr().out
+
+    @pytest.mark.agent_memory
+    def test_history_is_summarized(self, mock_openai_client):
+        """Test that older turns are condensed into a summary once the history limit is exceeded."""
+        create = mock_openai_client.chat.completions.create
+        create.return_value.choices[0].message.tool_calls = None
+        agent = Agent(mock_openai_client, name="Chatter", system_prompt="Be terse.", history_limit=4)
+
+        agent.invoke("user", "One")
+        agent.invoke("user", "Two")
+        assert create.call_count == 2  # At the limit, nothing is summarized yet
+
+        agent.invoke("user", "Three")
+        assert create.call_count == 4
+        assert create.call_args.kwargs["model"] == "gpt-4o-mini"
+        assert "user: One" in create.call_args.kwargs["messages"][1]["content"]
+
+        # The system prompt and the latest turn are kept, with the summary in between
+        assert len(agent.messages) == 4
+        assert agent.messages[0]["content"] == "Be terse."
+        assert agent.messages[1] == {"role": "system", "content": "Summary of the earlier conversation: This is a mock response from GPT"}
+        assert agent.messages[-1] == {"role": "assistant", "content": "This is a mock response from GPT"}
+
+    @pytest.mark.agent_memory
+    def test_anthropic_invoke_records_history(self, mock_anthropic_client):
+        """Test that an Anthropic agent answers through the client and records the exchange."""
+        agent = Agent(mock_anthropic_client, model="claude-3-5-haiku-latest", name="Claude")
+
+        assert agent.invoke("user", "Hello") == "This is a mock response from Claude"
+        assert mock_anthropic_client.messages.create.call_count == 1
+        assert agent.messages[-1] == {"role": "assistant", "content": "This is a mock response from Claude"}
+
+    @pytest.mark.agent_memory
+    def test_anthropic_prompt_is_cached(self, mock_anthropic_client):
+        """Test that the system prompt and conversation are marked for prompt caching, and cache usage is recorded."""
+        create = mock_anthropic_client.messages.create
+        create.return_value.usage = MagicMock(cache_read_input_tokens=0, cache_creation_input_tokens=1200)
+        agent = Agent(mock_anthropic_client, model="claude-3-5-haiku-latest", name="Claude", system_prompt="Be terse.")
+
+        agent.invoke("user", "Hello")
+        kwargs = create.call_args.kwargs
+        assert kwargs["system"] == [{"type": "text", "text": "Be terse.", "cache_control": {"type": "ephemeral"}}]
+        assert kwargs["max_tokens"] > 0
+        assert all(message["role"] != "system" for message in kwargs["messages"])
+        assert kwargs["messages"][-1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+
+        create.return_value.usage = MagicMock(cache_read_input_tokens=1200, cache_creation_input_tokens=40)
+        agent.invoke("user", "Again")
+        assert (agent.client.cache_read_tokens, agent.client.cache_write_tokens) == (1200, 1240)
+        # The breakpoint only exists in the request, so the recorded history keeps plain text
+        assert agent.messages[1] == {"role": "user", "content": "Hello"}
+
+    @pytest.mark.agent_memory
+    def test_invalid_author_is_rejected(self, mock_openai_client):
+        """Test that a message from an unknown role is rejected before reaching the API."""
+        agent = Agent(mock_openai_client, name="Strict")
+
+        with pytest.raises(ValueError, match="Invalid author 'robot'"):
+            agent.invoke("robot", "Hello")
+        assert mock_openai_client.chat.completions.create.call_count == 0
+        assert len(agent.messages) == 1
+
+    @pytest.mark.agent_memory
+    def test_default_tools_are_not_shared(self, mock_openai_client):
+        """Test that agents created without tools each get their own tool list."""
+        first = Agent(mock_openai_client, name="First")
+        second = Agent(mock_openai_client, name="Second")
+
+        first.tools.append("registered later")
+        assert second.tools == []
+
+    @pytest.mark.agent_memory
+    def test_system_prompt_is_normalized(self, mock_openai_client):
+        """Test that indented system prompts are dedented and hashed, so equal prompts share a prefix."""
+        indented = Agent(mock_openai_client, name="Indented", system_prompt="""
+            You are terse.
+              Answer in one line.
+        """)
+        flat = Agent(mock_openai_client, name="Flat", system_prompt="You are terse.\n  Answer in one line.")
+
+        assert indented.messages[0]["content"] == "You are terse.\n  Answer in one line."
+        assert indented.system_prompt_hash == flat.system_prompt_hash
+
+    @pytest.mark.agent_memory
+    def test_response_format_is_sent(self, mock_openai_client):
+        """Test that a response format is sent with every request, and only when one is set."""
+        create = mock_openai_client.chat.completions.create
+        create.return_value.choices[0].message.tool_calls = None
+        schema = {"type": "json_schema", "json_schema": {"name": "answer", "strict": True, "schema": {"type": "object"}}}
+
+        structured = Agent(mock_openai_client, name="Structured", response_format=schema)
+        structured.invoke("user", "Hello")
+        assert create.call_args.kwargs["response_format"] == schema
+
+        free = Agent(mock_openai_client, name="Free")
+        free.invoke("user", "Hello")
+        assert "response_format" not in create.call_args.kwargs
@@ -0,0 +1,230 @@
+"""
+Feature tests for response caching.
+
+This tests the following features:
+1. LRU eviction and expiry in ResponseCache, and persisting entries to disk
+2. OpenAI and Anthropic agents answering repeated requests from a shared cache
+3. Near-duplicate prompts answered from a SemanticCache
+4. Graphs answering repeated runs, and a node's repeated or reworded prompts, from a cache
+"""
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+
+from impossibly import Agent, Graph, Memory, Tool, START, END, ResponseCache, SemanticCache
+from impossibly.utils.cache import make_key
+
+
+@pytest.mark.cache
+class TestResponseCache:
+    """Tests for the response cache and its use by agents."""
+
+    @pytest.mark.cache
+    def test_lru_eviction_and_ttl(self):
+        """Test that the least recently used entry is evicted and expired entries are dropped."""
+        cache = ResponseCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1  # "a" is now the most recently used
+        cache.set("c", 3)
+
+        assert "b" not in cache
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert (cache.hits, cache.misses) == (3, 0)
+
+        expiring = ResponseCache(ttl=0)
+        expiring.set("a", 1)
+        assert expiring.get("a") is None
+        assert expiring.misses == 1
+
+    @pytest.mark.cache
+    def test_disk_tier_survives_restarts(self, tmp_path):
+        """Test that entries written with a path are read back by a new cache, until they expire."""
+        path = str(tmp_path / "cache" / "responses.sqlite")
+        ResponseCache(path=path).set("a", {"answer": 8})
+        ResponseCache(ttl=0, path=path).set("b", "stale")
+
+        restarted = ResponseCache(path=path)
+        assert "a" in restarted
+        assert restarted.get("a") == {"answer": 8}
+        assert restarted.get("b") is None
+        assert (restarted.hits, restarted.misses) == (1, 1)
+
+        restarted.clear()
+        assert ResponseCache(path=path).get("a") is None
+
+    @pytest.mark.cache
+    def test_key_is_order_independent_for_dicts(self):
+        """Test that keys only depend on content."""
+        assert make_key("gpt-4o", [{"role": "user", "content": "hi"}]) == make_key("gpt-4o", [{"content": "hi", "role": "user"}])
+        assert make_key("gpt-4o", "hi") != make_key("gpt-4o-mini", "hi")
+
+    @pytest.mark.cache
+    def test_agents_share_cached_responses(self, mock_openai_client):
+        """Test that an identical conversation is answered without another API call."""
+        create = mock_openai_client.chat.completions.create
+        create.return_value.choices[0].message.tool_calls = None
+        cache = ResponseCache()
+
+        first = Agent(mock_openai_client, name="First", system_prompt="Be terse.", cache=cache)
+        second = Agent(mock_openai_client, name="Second", system_prompt="Be terse.", cache=cache)
+
+        assert first.invoke("user", "Hello") == "This is a mock response from GPT"
+        assert second.invoke("user", "Hello") == "This is a mock response from GPT"
+
+        assert create.call_count == 1
+        assert cache.hits == 1
+        # The cached reply is still recorded in the conversation history
+        assert second.messages[-1] == {"role": "assistant", "content": "This is a mock response from GPT"}
+
+    @pytest.mark.cache
+    def test_anthropic_agents_share_cached_responses(self, mock_anthropic_client):
+        """Test that Anthropic agents answer an identical conversation from the cache, keyed on the system prompt."""
+        create = mock_anthropic_client.messages.create
+        cache = ResponseCache()
+
+        first = Agent(mock_anthropic_client, model="claude-3-5-haiku-latest", name="First", system_prompt="Be terse.", cache=cache)
+        second = Agent(mock_anthropic_client, model="claude-3-5-haiku-latest", name="Second", system_prompt="Be terse.", cache=cache)
+        other = Agent(mock_anthropic_client, model="claude-3-5-haiku-latest", name="Other", system_prompt="Be verbose.", cache=cache)
+
+        first.invoke("user", "Hello")
+        assert second.invoke("user", "Hello") == "This is a mock response from Claude"
+        assert create.call_count == 1
+        assert second.messages[-1] == {"role": "assistant", "content": "This is a mock response from Claude"}
+
+        other.invoke("user", "Hello")
+        assert create.call_count == 2
+
+    @pytest.mark.cache
+    def test_semantic_cache_answers_near_duplicates(self, mock_openai_client):
+        """Test that a reworded prompt is answered from the cache, but only in the same context."""
+        create = mock_openai_client.chat.completions.create
+        create.return_value.choices[0].message.tool_calls = None
+
+        # Embed prompts about the weather close together, and anything else far away
+        vectors = {"What's the weather?": [1.0, 0.0], "How is the weather?": [0.99, 0.05], "Tell me a joke": [0.0, 1.0]}
+        embedder = MagicMock()
+        embedder.embeddings.create.side_effect = lambda model, input: MagicMock(data=[MagicMock(embedding=vectors[input])])
+        cache = SemanticCache(embedder, threshold=0.95)
+
+        first = Agent(mock_openai_client, name="First", system_prompt="Be terse.", cache=cache)
+        second = Agent(mock_openai_client, name="Second", system_prompt="Be terse.", cache=cache)
+        other = Agent(mock_openai_client, name="Other", system_prompt="Be verbose.", cache=cache)
+
+        first.invoke("user", "What's the weather?")
+        second.invoke("user", "How is the weather?")
+        assert create.call_count == 1
+        assert cache.semantic_hits == 1
+
+        # Dissimilar prompts, and similar prompts with a different history, still call the API
+        second.invoke("user", "Tell me a joke")
+        other.invoke("user", "How is the weather?")
+        assert create.call_count == 3
+        assert embedder.embeddings.create.call_args.kwargs["model"] == "text-embedding-3-small"
+
+    @pytest.mark.cache
+    def test_graph_answers_repeated_prompts(self, mock_openai_client):
+        """Test that a graph skips a node it has already given the same prompt."""
+        cache = ResponseCache()
+        agent = Agent(mock_openai_client, name="Adder", system_prompt="Add the numbers.")
+        graph = Graph(cache=cache)
+        graph.add_node(agent)
+        graph.add_edge(START, agent)
+        graph.add_edge(agent, END)
+
+        with patch.object(agent.client, "invoke", return_value="8") as mock_invoke:
+            assert graph.invoke("What is 5 plus 3?") == "8"
+            assert graph.invoke("What is 5 plus 3?") == "8"
+            assert mock_invoke.call_count == 1
+
+            graph.invoke("What is 2 plus 2?")
+            assert mock_invoke.call_count == 2
+
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    @pytest.mark.cache
+    def test_graph_answers_repeated_runs(self, mock_openai_client):
+        """Test that a repeated run skips every node, and that any change to the prompt, graph or agents' state invalidates cached runs."""
+        cache = ResponseCache()
+        drafter = Agent(mock_openai_client, name="Drafter", system_prompt="Draft an answer.")
+        editor = Agent(mock_openai_client, name="Editor", system_prompt="Polish the draft.")
+        graph = Graph(cache=cache)
+        graph.add_node([drafter, editor])
+        graph.add_edge(START, drafter)
+        graph.add_edge(drafter, editor)
+        graph.add_edge(editor, END)
+
+        with patch.object(drafter.client, "invoke", return_value="Draft") as mock_drafter:
+            with patch.object(editor.client, "invoke", return_value="Final") as mock_editor:
+                assert graph.invoke("Explain caching") == "Final"
+                assert graph.invoke("Explain caching") == "Final"
+                assert (mock_drafter.call_count, mock_editor.call_count) == (1, 1)
+
+                # Whitespace can matter (code, tables), so a reformatted prompt is a different run
+                graph.invoke("Explain  caching")
+                assert mock_drafter.call_count == 2
+
+                # A second turn on an agent with history is not answered with the first turn's run
+                drafter.messages.append({"role": "user", "content": "Earlier question"})
+                graph.invoke("Explain caching")
+                assert mock_drafter.call_count == 3
+
+                # Neither is a run after an agent gains a tool, and that agent's own prompt is no longer answered either
+                assert mock_editor.call_count == 1
+                editor.tools.append(Tool(name="lookup", description="Look something up", function=lambda query: query, parameters=[{"name": "query", "type": str, "description": "The query"}]))
+                graph.invoke("Explain caching")
+                assert (mock_drafter.call_count, mock_editor.call_count) == (3, 2)
+
+                # A new edge changes the topology, so the run is no longer answered as a whole
+                graph.add_edge(drafter, END)
+                graph.invoke("Explain caching")
+                assert mock_drafter.call_count == 4
+
+    @pytest.mark.cache
+    def test_cached_nodes_keep_undelivered_memory(self, mock_openai_client):
+        """Test that a node answered from the cache is sent the same shared messages again on its next real turn."""
+        writer = Agent(mock_openai_client, name="Writer")
+        editor = Agent(mock_openai_client, name="Editor")
+        reader = Agent(mock_openai_client, name="Reader", shared_memory=[writer, editor])
+        graph = Graph(cache=ResponseCache())
+        graph.add_node(reader)
+        graph.add_edge(START, reader)
+        graph.add_edge(reader, END)
+        memory = Memory()
+        memory.add(writer, editor, "first")
+
+        with patch.object(reader.client, "invoke", return_value="Noted") as mock_invoke:
+            prompt, cursor = asyncio.run(graph._with_memory(reader, "Go", memory, {}))
+            cursors = {}
+            asyncio.run(graph._invoke_node(reader, "user", prompt, [], memory_cursors=cursors, cursor=cursor))
+            assert cursors == {reader: 1}
+
+            # The same prompt is answered from the cache, so it never reaches the reader and the cursor stays put
+            cursors = {}
+            asyncio.run(graph._invoke_node(reader, "user", prompt, [], memory_cursors=cursors, cursor=cursor))
+            assert mock_invoke.call_count == 1
+            assert cursors == {}
+
+    @pytest.mark.cache
+    def test_graph_answers_reworded_prompts(self, mock_openai_client):
+        """Test that a graph with a SemanticCache skips a node given a prompt similar to an earlier one."""
+        vectors = {"What time is it?": [1.0, 0.0], "Current time please": [0.98, 0.1], "Tell me a joke": [0.0, 1.0]}
+        embedder = MagicMock()
+        embedder.embeddings.create.side_effect = lambda model, input: MagicMock(data=[MagicMock(embedding=vectors[input])])
+        cache = SemanticCache(embedder, threshold=0.92)
+
+        agent = Agent(mock_openai_client, name="Clock", system_prompt="Tell the time.")
+        graph = Graph(cache=cache)
+        graph.add_node(agent)
+        graph.add_edge(START, agent)
+        graph.add_edge(agent, END)
+
+        with patch.object(agent.client, "invoke", return_value="It is noon.") as mock_invoke:
+            graph.invoke("What time is it?")
+            assert graph.invoke("Current time please") == "It is noon."
+            assert mock_invoke.call_count == 1
+
+            graph.invoke("Tell me a joke")
+            assert mock_invoke.call_count == 2
+
+        assert cache.semantic_hits == 1
@@ -0,0 +1,50 @@
+"""
+Feature tests for loading configuration from .env files.
+
+This tests the following features:
+1. Quoted and unquoted values, with and without trailing comments
+2. Lines with an 'export' prefix, values containing '=', and variables already set
+"""
+import os
+import pytest
+
+from impossibly.utils.env import load_env
+
+
+@pytest.mark.env
+class TestLoadEnv:
+    """Tests for parsing .env files."""
+
+    def _load(self, tmp_path, monkeypatch, text, environ=None):
+        """Loads a .env file with the given contents into an isolated environment and returns it."""
+        environ = dict(environ or {})
+        monkeypatch.setattr(os, "environ", environ)
+        path = tmp_path / ".env"
+        path.write_text(text, encoding="utf-8")
+        load_env(str(path))
+        return environ
+
+    @pytest.mark.env
+    def test_trailing_comments(self, tmp_path, monkeypatch):
+        """Test that comments after quoted and unquoted values are dropped, but a '#' inside quotes is kept."""
+        environ = self._load(tmp_path, monkeypatch, "\n".join([
+            'DOUBLE="abc" # comment',
+            "SINGLE='abc'   # comment",
+            "UNQUOTED=abc # comment",
+            'HASH="a # b"',
+            "PLAIN=abc#def",
+            "# A comment line",
+            "",
+        ]))
+        assert environ == {"DOUBLE": "abc", "SINGLE": "abc", "UNQUOTED": "abc", "HASH": "a # b", "PLAIN": "abc#def"}
+
+    @pytest.mark.env
+    def test_export_and_equals_signs(self, tmp_path, monkeypatch):
+        """Test that an 'export' prefix is ignored, values keep any '=' after the first, and set variables win."""
+        environ = self._load(tmp_path, monkeypatch, "\n".join([
+            "export TOKEN=secret",
+            'export QUOTED="a=b" # comment',
+            "PAIR=a=b",
+            "EXISTING=from file",
+        ]), environ={"EXISTING": "from environment"})
+        assert environ == {"TOKEN": "secret", "QUOTED": "a=b", "PAIR": "a=b", "EXISTING": "from environment"}
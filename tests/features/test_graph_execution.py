@@ -0,0 +1,401 @@
+"""
+Feature tests for graph execution strategies.
+
+This tests the following features:
+1. Concurrent fan-out to parallel branches, with async and sync clients
+2. Explicit routing taking precedence over fan-out, and fanning out to several named routes
+3. Concurrent multi-prompt runs, and offline runs through the OpenAI Batch API
+4. Streaming the response of the final node, and reading synchronous streams concurrently
+5. Compiling the graph topology ahead of a run
+"""
+import asyncio
+import json
+import time
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+
+# Import the necessary components
+from impossibly import Agent, Graph, START, END
+
+
+def _make_agent(client, name):
+    return Agent(client, model="gpt-4o", name=name, system_prompt=f"You are {name}.", description=f"{name} agent")
+
+
+@pytest.mark.graph_fan_out
+class TestGraphFanOut:
+    """Tests for concurrent execution of parallel branches."""
+
+    def _build_graph(self, client, fan_out=True, max_concurrency=None):
+        gate = _make_agent(client, "Gate")
+        experts = [_make_agent(client, f"Expert{i}") for i in range(3)]
+        summarizer = _make_agent(client, "Summarizer")
+
+        graph = Graph(fan_out=fan_out, max_concurrency=max_concurrency)
+        graph.add_node([gate, *experts, summarizer])
+        graph.add_edge(START, gate)
+        graph.add_edge(gate, experts)
+        graph.add_edge(experts, summarizer)
+        graph.add_edge(summarizer, END)
+        return graph, gate, experts, summarizer
+
+    @pytest.mark.graph_fan_out
+    def test_branches_run_concurrently(self, mock_openai_client):
+        """Test that every branch is invoked at once and the join node receives all outputs."""
+        graph, gate, experts, summarizer = self._build_graph(mock_openai_client)
+
+        running = 0
+        peak = 0
+
+        async def expert_invoke(author, prompt, files=None, edges=None, show_thinking=False):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return f"Opinion on: {prompt}"
+
+        patches = [patch.object(expert.client, "invoke", side_effect=expert_invoke) for expert in experts]
+        for p in patches:
+            p.start()
+        try:
+            with patch.object(gate.client, "invoke", return_value="Rewritten question"):
+                with patch.object(summarizer.client, "invoke", return_value="Summary") as mock_summarizer:
+                    response = graph.invoke("Question")
+        finally:
+            for p in patches:
+                p.stop()
+
+        assert response == "Summary"
+        assert peak == len(experts)
+
+        summarizer_prompt = mock_summarizer.call_args.args[1]
+        for expert in experts:
+            assert f"{expert.name}: Opinion on: Rewritten question" in summarizer_prompt
+
+    @pytest.mark.graph_fan_out
+    def test_max_concurrency_limits_branches(self, mock_openai_client):
+        """Test that no more than max_concurrency branches run at once, while every branch still runs."""
+        graph, gate, experts, summarizer = self._build_graph(mock_openai_client, max_concurrency=2)
+
+        running = 0
+        peak = 0
+
+        async def expert_invoke(author, prompt, files=None, edges=None, show_thinking=False):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return "Opinion"
+
+        patches = [patch.object(expert.client, "invoke", side_effect=expert_invoke) for expert in experts]
+        for p in patches:
+            p.start()
+        try:
+            with patch.object(gate.client, "invoke", return_value="Question"):
+                with patch.object(summarizer.client, "invoke", return_value="Summary") as mock_summarizer:
+                    assert graph.invoke("Question") == "Summary"
+        finally:
+            for p in patches:
+                p.stop()
+
+        assert peak == 2
+        assert mock_summarizer.call_args.args[1].count("Opinion") == len(experts)
+
+    @pytest.mark.graph_fan_out
+    def test_sync_client_branches_overlap(self, mock_openai_client):
+        """Test that branches backed by a synchronous client still run their requests at the same time."""
+        graph, gate, experts, summarizer = self._build_graph(mock_openai_client)
+        mock_openai_client.chat.completions.create.return_value.choices[0].message.tool_calls = None
+
+        lock = threading.Lock()
+        running = 0
+        peak = 0
+
+        def blocking_create(**kwargs):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+            return mock_openai_client.chat.completions.create.return_value
+
+        with patch.object(gate.client, "invoke", return_value="Rewritten question"):
+            with patch.object(summarizer.client, "invoke", return_value="Summary"):
+                mock_openai_client.chat.completions.create.side_effect = blocking_create
+                assert graph.invoke("Question") == "Summary"
+
+        assert peak == len(experts)
+
+    @pytest.mark.graph_fan_out
+    def test_explicit_route_skips_fan_out(self, mock_openai_client):
+        """Test that a routing command still selects a single branch."""
+        graph, gate, experts, summarizer = self._build_graph(mock_openai_client)
+
+        with patch.object(gate.client, "invoke", return_value="Over to you \\\\Expert2\\\\"):
+            with patch.object(experts[0].client, "invoke", return_value="unused") as first:
+                with patch.object(experts[2].client, "invoke", return_value="Chosen opinion") as chosen:
+                    with patch.object(summarizer.client, "invoke", return_value="Summary") as mock_summarizer:
+                        response = graph.invoke("Question")
+
+        assert response == "Summary"
+        assert first.call_count == 0
+        assert chosen.call_count == 1
+        assert mock_summarizer.call_args.args[1] == "Chosen opinion"
+
+    @pytest.mark.graph_fan_out
+    def test_several_routes_fan_out_to_subset(self, mock_openai_client):
+        """Test that naming several routes runs just those branches concurrently before the join."""
+        graph, gate, experts, summarizer = self._build_graph(mock_openai_client)
+
+        with patch.object(gate.client, "invoke", return_value="Ask both \\\\Expert0\\\\ \\\\Expert2\\\\"):
+            with patch.object(experts[0].client, "invoke", return_value="First opinion") as first:
+                with patch.object(experts[1].client, "invoke", return_value="unused") as skipped:
+                    with patch.object(experts[2].client, "invoke", return_value="Third opinion") as third:
+                        with patch.object(summarizer.client, "invoke", return_value="Summary") as mock_summarizer:
+                            assert graph.invoke("Question") == "Summary"
+
+        assert skipped.call_count == 0
+        assert first.call_args.args[1].strip() == third.call_args.args[1].strip() == "Ask both"
+        assert mock_summarizer.call_args.args[1] == "Expert0: First opinion\n\nExpert2: Third opinion"
+
+
+    @pytest.mark.graph_fan_out
+    def test_unknown_delimited_text_is_kept(self, mock_openai_client):
+        """Test that backslash-delimited text naming no route, like a Windows path, survives in the forwarded output."""
+        graph, gate, experts, summarizer = self._build_graph(mock_openai_client)
+        output = "Read C:\\Users\\data\\report.csv then \\Expert1\\ and $\\frac{a}{b}\\$"
+
+        with patch.object(gate.client, "invoke", return_value=output):
+            with patch.object(experts[1].client, "invoke", return_value="Opinion") as chosen:
+                with patch.object(summarizer.client, "invoke", return_value="Summary"):
+                    assert graph.invoke("Question") == "Summary"
+
+        assert chosen.call_args.args[1] == "Read C:\\Users\\data\\report.csv then  and $\\frac{a}{b}\\$"
+        assert graph._find_routes(gate, "C:\\Temp\\notes.txt") == ([], "C:\\Temp\\notes.txt")
+
+@pytest.mark.streaming
+class TestGraphStreaming:
+    """Tests for streaming graph output."""
+
+    @pytest.mark.streaming
+    def test_only_final_node_streams(self, mock_openai_client):
+        """Test that only the node routing to END is asked to stream, and its full response is returned."""
+        drafter = _make_agent(mock_openai_client, "Drafter")
+        editor = _make_agent(mock_openai_client, "Editor")
+
+        graph = Graph()
+        graph.add_node([drafter, editor])
+        graph.add_edge(START, drafter)
+        graph.add_edge(drafter, editor)
+        graph.add_edge(editor, END)
+
+        with patch.object(drafter.client, "invoke", return_value="Draft") as mock_drafter:
+            with patch.object(editor.client, "invoke", return_value="Final") as mock_editor:
+                assert graph.invoke("Write", stream=True) == "Final"
+
+        assert "stream" not in mock_drafter.call_args.kwargs
+        assert mock_editor.call_args.kwargs["stream"] is True
+
+
+    @pytest.mark.streaming
+    def test_sync_client_streams_overlap(self, mock_openai_client):
+        """Test that two branches streaming from a synchronous client read their chunks at the same time."""
+        branches = [_make_agent(mock_openai_client, f"Branch{i}") for i in range(2)]
+
+        lock = threading.Lock()
+        reading = 0
+        peak = 0
+
+        def make_chunk(text):
+            chunk = MagicMock()
+            chunk.choices[0].delta.content = text
+            chunk.choices[0].delta.tool_calls = None
+            return chunk
+
+        def slow_stream(**kwargs):
+            nonlocal reading, peak
+            for text in ("Hel", "lo"):
+                with lock:
+                    reading += 1
+                    peak = max(peak, reading)
+                time.sleep(0.05)
+                with lock:
+                    reading -= 1
+                yield make_chunk(text)
+
+        mock_openai_client.chat.completions.create.side_effect = slow_stream
+
+        async def collect(agent):
+            return "".join([piece async for piece in agent.stream("user", "Say hello")])
+
+        async def run_branches():
+            return await asyncio.gather(*(collect(branch) for branch in branches))
+
+        assert asyncio.run(run_branches()) == ["Hello", "Hello"]
+        assert peak == 2
+
+@pytest.mark.graph_compile
+class TestGraphCompile:
+    """Tests for validating and precomputing graph topology."""
+
+    @pytest.mark.graph_compile
+    def test_compile_finds_successors_and_joins(self, mock_openai_client):
+        """Test that compiling records each node's successors and its fan-out join, and that changes reset them."""
+        gate = _make_agent(mock_openai_client, "Gate")
+        experts = [_make_agent(mock_openai_client, f"Expert{i}") for i in range(2)]
+        summarizer = _make_agent(mock_openai_client, "Summarizer")
+
+        graph = Graph(fan_out=True)
+        graph.add_node([gate, *experts, summarizer])
+        graph.add_edge(START, gate)
+        graph.add_edge(gate, experts)
+        graph.add_edge(experts, summarizer)
+        graph.add_edge(summarizer, END)
+
+        assert graph.compile() is graph
+        assert graph._successors[gate] == tuple(experts)
+        assert graph._get_join(gate) is summarizer
+
+        # Adding an edge discards the compiled topology, and graphs with loops still compile
+        graph.add_edge(summarizer, gate)
+        assert graph._successors is None
+        graph.compile()
+        assert graph._successors[summarizer] == (END, gate)
+
+    @pytest.mark.graph_compile
+    def test_dead_ends_fail_only_when_reached(self, mock_openai_client):
+        """Test that a node with no outgoing edges compiles, and a run raises only if it reaches that node."""
+        first = _make_agent(mock_openai_client, "First")
+        stranded = _make_agent(mock_openai_client, "Stranded")
+
+        graph = Graph()
+        graph.add_node([first, stranded])
+        graph.add_edge(START, first)
+        graph.add_edge(first, [END, stranded])
+        graph.compile()
+
+        # The dead end sits behind a route that is not taken
+        with patch.object(first.client, "invoke", return_value="Done"):
+            assert graph.invoke("Hello") == "Done"
+
+        # Reaching it raises before the stranded node is called
+        with patch.object(first.client, "invoke", return_value="\\\\Stranded\\\\"):
+            with patch.object(stranded.client, "invoke") as mock_stranded:
+                with pytest.raises(ValueError, match="Stranded has no outgoing edges"):
+                    graph.invoke("Hello")
+        assert mock_stranded.call_count == 0
+
+        with pytest.raises(ValueError, match="START has no outgoing edges"):
+            Graph().compile()
+
+    @pytest.mark.graph_compile
+    def test_invalid_edges_leave_graph_unchanged(self, mock_openai_client):
+        """Test that adding edges to a node missing from the graph adds none of them."""
+        first = _make_agent(mock_openai_client, "First")
+        second = _make_agent(mock_openai_client, "Second")
+        outsider = _make_agent(mock_openai_client, "Outsider")
+
+        graph = Graph()
+        graph.add_node([first, second])
+        with pytest.raises(ValueError, match="not a valid node"):
+            graph.add_edge(first, [second, outsider])
+        assert graph.edges[first] == []
+
+        graph.add_edge([first, second], [second, END])
+        assert graph.edges[first] == [second, END]
+        assert graph.edges[second] == [second, END]
+
+
+@pytest.mark.graph_batch
+class TestGraphBatch:
+    """Tests for running graphs through the OpenAI Batch API."""
+
+    @pytest.fixture
+    def batch_client(self, mock_openai_client):
+        """Wire up a Batch API that answers every request with the last user message in upper case."""
+        uploads = []
+
+        def create_file(file, purpose):
+            uploads.append(file[1].decode("utf-8"))
+            return MagicMock(id=f"file-{len(uploads)}")
+
+        def file_content(file_id):
+            lines = []
+            for line in uploads[int(file_id.split("-")[1]) - 1].splitlines():
+                request = json.loads(line)
+                reply = request["body"]["messages"][-1]["content"].split("\n")[0].upper()
+                body = {"choices": [{"message": {"role": "assistant", "content": reply}}]}
+                lines.append(json.dumps({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}}))
+            return MagicMock(text="\n".join(lines))
+
+        mock_openai_client.files.create.side_effect = create_file
+        mock_openai_client.files.content.side_effect = file_content
+        mock_openai_client.batches = MagicMock()
+        mock_openai_client.batches.create.side_effect = lambda input_file_id, **kwargs: MagicMock(id="batch-1", status="completed", output_file_id=input_file_id)
+        return mock_openai_client, uploads
+
+    @pytest.mark.graph_batch
+    def test_batch_runs_prompts_concurrently(self, mock_openai_client):
+        """Test that batch overlaps runs up to max_concurrency and returns outputs in prompt order."""
+        agent = _make_agent(mock_openai_client, "Echo")
+        graph = Graph()
+        graph.add_node(agent)
+        graph.add_edge(START, agent)
+        graph.add_edge(agent, END)
+
+        running = 0
+        peak = 0
+
+        async def echo(author, prompt, files=None, edges=None, show_thinking=False):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return prompt.upper()
+
+        with patch.object(agent.client, "invoke", side_effect=echo):
+            outputs = graph.batch(["alpha", "beta", "gamma", "delta"], max_concurrency=3)
+
+        assert outputs == ["ALPHA", "BETA", "GAMMA", "DELTA"]
+        assert peak == 3
+        # Every run works on its own copy, leaving the original agent's history untouched
+        assert len(agent.messages) == 1
+
+    @pytest.mark.graph_batch
+    def test_runs_advance_in_lockstep(self, batch_client):
+        """Test that each graph step is one batch job covering every run, with isolated histories."""
+        client, uploads = batch_client
+        first = _make_agent(client, "First")
+        second = _make_agent(client, "Second")
+
+        graph = Graph()
+        graph.add_node([first, second])
+        graph.add_edge(START, first)
+        graph.add_edge(first, second)
+        graph.add_edge(second, END)
+
+        outputs = graph.invoke_batch(["alpha", "beta", "gamma"], poll_interval=0)
+
+        assert outputs == ["ALPHA", "BETA", "GAMMA"]
+        assert len(uploads) == 2  # One batch per step of the graph
+        assert all(len(upload.splitlines()) == 3 for upload in uploads)
+        assert client.chat.completions.create.call_count == 0
+        # The original agents are untouched, since every run works on its own copy
+        assert len(first.messages) == 1 and len(second.messages) == 1
+
+    @pytest.mark.graph_batch
+    def test_agent_answers_prompts_in_one_batch(self, batch_client):
+        """Test that an agent submits every prompt as a single batch job without touching its history."""
+        client, uploads = batch_client
+        agent = _make_agent(client, "Echo")
+
+        assert agent.invoke_batch(["alpha", "beta", "gamma"], poll_interval=0) == ["ALPHA", "BETA", "GAMMA"]
+        assert len(uploads) == 1
+        assert client.chat.completions.create.call_count == 0
+        assert len(agent.messages) == 1
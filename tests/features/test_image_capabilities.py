@@ -15,7 +15,8 @@ import pytest
 from unittest.mock import patch, mock_open, MagicMock
 
 # Import the necessary components
-from impossibly import Agent, Graph, START, END
+from impossibly import Agent, Graph, START, END, clear_image_cache, set_image_cache_size
+from impossibly.agent import DEFAULT_IMAGE_CACHE_SIZE
 
 
 @pytest.mark.image
@@ -44,6 +45,103 @@ class TestImageCapabilities:
         with patch("builtins.open", mock_open(read_data=mock_image_data)):
             yield "test_image.jpg", mock_image_base64
     
+    @pytest.mark.image_input
+    def test_image_encoding_is_cached(self, mock_openai_client, tmp_path):
+        """
+        Test that an unchanged image is only read and encoded once, and re-encoded after it changes.
+        
+        Args:
+            mock_openai_client: Mocked OpenAI client fixture
+            tmp_path: Temporary directory for the image file
+        """
+        image_path = tmp_path / "cached.png"
+        image_path.write_bytes(b"first_image_data")
+        agent = Agent(mock_openai_client, name="VisionAgent")
+        
+        with patch("builtins.open", wraps=open) as spy_open:
+            first = agent.client._encode_image(str(image_path))
+            again = agent.client._encode_image(str(image_path))
+            assert first == again == base64.b64encode(b"first_image_data").decode("utf-8")
+            assert spy_open.call_count == 1
+            
+            # A modified file is picked up
+            image_path.write_bytes(b"second_image_data!")
+            assert agent.client._encode_image(str(image_path)) == base64.b64encode(b"second_image_data!").decode("utf-8")
+            assert spy_open.call_count == 2
+
+            # Clearing the cache frees the encodings, so the image is read again
+            clear_image_cache()
+            agent.client._encode_image(str(image_path))
+            assert spy_open.call_count == 3
+
+    @pytest.mark.image_input
+    def test_image_cache_is_bounded_by_size(self, mock_openai_client, tmp_path):
+        """
+        Test that the image cache evicts the least recently used encodings once they exceed its size limit.
+
+        Args:
+            mock_openai_client: Mocked OpenAI client fixture
+            tmp_path: Temporary directory for the image files
+        """
+        paths = []
+        for name in ("a.png", "b.png", "c.png"):
+            path = tmp_path / name
+            path.write_bytes(b"x" * 30)  # 40 bytes once encoded
+            paths.append(str(path))
+        agent = Agent(mock_openai_client, name="VisionAgent")
+
+        clear_image_cache()
+        set_image_cache_size(100)
+        try:
+            with patch("builtins.open", wraps=open) as spy_open:
+                for path in paths:
+                    agent.client._encode_image(path)
+                # Only the two most recent encodings fit, so the first image is read again
+                agent.client._encode_image(paths[2])
+                agent.client._encode_image(paths[0])
+                assert spy_open.call_count == 4
+        finally:
+            set_image_cache_size(DEFAULT_IMAGE_CACHE_SIZE)
+            clear_image_cache()
+    
+    @pytest.mark.image_input
+    def test_image_data_url_uses_file_type(self, mock_openai_client, tmp_path):
+        """
+        Test that attached images are sent with the MIME type of their format.
+        
+        Args:
+            mock_openai_client: Mocked OpenAI client fixture
+            tmp_path: Temporary directory for the image files
+        """
+        png_path = tmp_path / "diagram.PNG"
+        png_path.write_bytes(b"png_data")
+        notes_path = tmp_path / "notes.txt"
+        notes_path.write_bytes(b"not an image")
+        agent = Agent(mock_openai_client, name="VisionAgent")
+        
+        msg, _ = agent.client._build_message("user", "Describe this", [str(png_path), str(notes_path)])
+        
+        # Only the image is attached, labelled as a PNG
+        assert len(msg["content"]) == 2
+        assert msg["content"][1]["image_url"]["url"] == f"data:image/png;base64,{base64.b64encode(b'png_data').decode('utf-8')}"
+    
+    @pytest.mark.image_input
+    def test_image_urls_are_passed_through(self, mock_openai_client):
+        """
+        Test that images given as URLs are referenced by URL instead of being read and inlined.
+        
+        Args:
+            mock_openai_client: Mocked OpenAI client fixture
+        """
+        agent = Agent(mock_openai_client, name="VisionAgent")
+        url = "https://example.com/charts/sales.png?size=large"
+        
+        with patch("impossibly.agent.OpenAIAgent._encode_image") as mock_encode:
+            msg, _ = agent.client._build_message("user", "Describe this", [url, "https://example.com/report.pdf"])
+        
+        assert msg["content"][1:] == [{"type": "image_url", "image_url": {"url": url}}]
+        mock_encode.assert_not_called()
+    
     @pytest.mark.image_input
     def test_agent_with_image_input(self, mock_openai_client, mock_image_file):
         """
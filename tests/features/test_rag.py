@@ -6,63 +6,65 @@ This tests the following features:
 2. Image file processing by OpenAI agents
 3. Handling of large text files without truncation
 4. Proper error handling for unsupported file types
+5. Uploading files in the background when an async agent is created inside an event loop
 """
 import os
+import asyncio
 import pytest
-import tempfile
 import json
 from unittest.mock import patch, MagicMock, call
 from impossibly import Agent
-from tests.utils.client_mocks import MockOpenAI
+from tests.utils.client_mocks import MockOpenAI, create_mock_async_openai, make_openai_response
 
 
 @pytest.mark.rag
 class TestRAGFunctionality:
     """Tests for verifying RAG functionality."""
     
-    @pytest.fixture
-    def test_files(self):
-        """Create temporary test files for testing."""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Create a text file with unique identifiable content
-            text_file = os.path.join(temp_dir, "document.txt")
-            text_content = "This is a test document with UNIQUE_IDENTIFIER_TEXT_12345."
-            with open(text_file, "w") as f:
-                f.write(text_content)
-            
-            # Create a large text file with unique identifiable content
-            large_file = os.path.join(temp_dir, "large_document.txt")
-            large_content = "This is a large document with UNIQUE_IDENTIFIER_LARGE_67890.\n" * 100
-            with open(large_file, "w") as f:
-                f.write(large_content)
-            
-            # Create a JSON file with unique identifiable content
-            json_file = os.path.join(temp_dir, "data.json")
-            json_content = {"key": "value", "unique_id": "UNIQUE_IDENTIFIER_JSON_ABCDE"}
-            with open(json_file, "w") as f:
-                f.write(json.dumps(json_content))
-            
-            # Create an image file with metadata for testing
-            image_file = os.path.join(temp_dir, "sample.png")
-            with open(image_file, "w") as f:
-                f.write("UNIQUE_IDENTIFIER_IMAGE_FGHIJ")
-            
-            # Create an unsupported file type
-            bad_file = os.path.join(temp_dir, "unsupported.xyz")
-            with open(bad_file, "w") as f:
-                f.write("This file has an unsupported extension")
-            
-            yield {
-                "text_file": text_file,
-                "text_content": text_content,
-                "large_file": large_file,
-                "large_content": large_content,
-                "json_file": json_file,
-                "json_content": json_content,
-                "image_file": image_file,
-                "image_content": "UNIQUE_IDENTIFIER_IMAGE_FGHIJ",
-                "bad_file": bad_file,
-            }
+    @pytest.fixture(scope="class")
+    @classmethod
+    def test_files(cls, tmp_path_factory):
+        """Create the test files once for the whole class, since no test modifies them."""
+        temp_dir = str(tmp_path_factory.mktemp("rag_files"))
+        # Create a text file with unique identifiable content
+        text_file = os.path.join(temp_dir, "document.txt")
+        text_content = "This is a test document with UNIQUE_IDENTIFIER_TEXT_12345."
+        with open(text_file, "w") as f:
+            f.write(text_content)
+        
+        # Create a large text file with unique identifiable content
+        large_file = os.path.join(temp_dir, "large_document.txt")
+        large_content = "This is a large document with UNIQUE_IDENTIFIER_LARGE_67890.\n" * 100
+        with open(large_file, "w") as f:
+            f.write(large_content)
+        
+        # Create a JSON file with unique identifiable content
+        json_file = os.path.join(temp_dir, "data.json")
+        json_content = {"key": "value", "unique_id": "UNIQUE_IDENTIFIER_JSON_ABCDE"}
+        with open(json_file, "w") as f:
+            f.write(json.dumps(json_content))
+        
+        # Create an image file with metadata for testing
+        image_file = os.path.join(temp_dir, "sample.png")
+        with open(image_file, "w") as f:
+            f.write("UNIQUE_IDENTIFIER_IMAGE_FGHIJ")
+        
+        # Create an unsupported file type
+        bad_file = os.path.join(temp_dir, "unsupported.xyz")
+        with open(bad_file, "w") as f:
+            f.write("This file has an unsupported extension")
+        
+        return {
+            "text_file": text_file,
+            "text_content": text_content,
+            "large_file": large_file,
+            "large_content": large_content,
+            "json_file": json_file,
+            "json_content": json_content,
+            "image_file": image_file,
+            "image_content": "UNIQUE_IDENTIFIER_IMAGE_FGHIJ",
+            "bad_file": bad_file,
+        }
     
     @pytest.mark.rag_text
     def test_openai_text_file_processing(self, mock_openai_client, test_files):
@@ -87,17 +89,11 @@ class TestRAGFunctionality:
                 file_ids.extend(kwargs['file_ids'])
             
             # Create response incorporating the unique identifier from the text file
-            mock_content = f"I found {test_files['text_content']} in the document"
-            mock_message = MagicMock()
-            mock_message.content = mock_content
-            mock_choice = MagicMock()
-            mock_choice.message = mock_message
-            mock_response = MagicMock()
-            mock_response.choices = [mock_choice]
-            return mock_response
+            return make_openai_response(f"I found {test_files['text_content']} in the document")
         
         # Replace the default mock with our custom implementation
-        mock_openai_client.chat.completions.create.side_effect = mock_completions_create
+        create = mock_openai_client.chat.completions.create
+        create.side_effect = mock_completions_create
         
         # Create agent with text file
         agent = Agent(mock_openai_client, files=[test_files["text_file"]])
@@ -114,7 +110,7 @@ class TestRAGFunctionality:
         assert "UNIQUE_IDENTIFIER_TEXT_12345" in response, "Response should contain content from the file"
         
         # Verify that at least one API call was made
-        assert mock_openai_client.chat.completions.create.call_count > 0, "API should be called"
+        assert create.call_count > 0, "API should be called"
     
     @pytest.mark.rag_large
     def test_openai_large_file_processing(self, mock_openai_client, test_files):
@@ -139,17 +135,11 @@ class TestRAGFunctionality:
                 file_ids.extend(kwargs['file_ids'])
             
             # Create response incorporating the unique identifier from the large file
-            mock_content = f"I found {test_files['large_content'][:100]} in the document"
-            mock_message = MagicMock()
-            mock_message.content = mock_content
-            mock_choice = MagicMock()
-            mock_choice.message = mock_message
-            mock_response = MagicMock()
-            mock_response.choices = [mock_choice]
-            return mock_response
+            return make_openai_response(f"I found {test_files['large_content'][:100]} in the document")
         
         # Replace the default mock with our custom implementation
-        mock_openai_client.chat.completions.create.side_effect = mock_completions_create
+        create = mock_openai_client.chat.completions.create
+        create.side_effect = mock_completions_create
         
         # Create agent with large text file
         agent = Agent(mock_openai_client, files=[test_files["large_file"]])
@@ -165,7 +155,7 @@ class TestRAGFunctionality:
         assert "UNIQUE_IDENTIFIER_LARGE_67890" in response, "Response should contain content from the file"
         
         # Verify that at least one API call was made
-        assert mock_openai_client.chat.completions.create.call_count > 0, "API should be called"
+        assert create.call_count > 0, "API should be called"
     
     @pytest.mark.rag_image
     def test_openai_image_file_processing(self, mock_openai_client, test_files):
@@ -190,17 +180,11 @@ class TestRAGFunctionality:
                 file_ids.extend(kwargs['file_ids'])
             
             # Create response referencing the image content
-            mock_content = f"The image contains {test_files['image_content']}"
-            mock_message = MagicMock()
-            mock_message.content = mock_content
-            mock_choice = MagicMock()
-            mock_choice.message = mock_message
-            mock_response = MagicMock()
-            mock_response.choices = [mock_choice]
-            return mock_response
+            return make_openai_response(f"The image contains {test_files['image_content']}")
         
         # Replace the default mock with our custom implementation
-        mock_openai_client.chat.completions.create.side_effect = mock_completions_create
+        create = mock_openai_client.chat.completions.create
+        create.side_effect = mock_completions_create
         
         # Create agent with image file
         agent = Agent(mock_openai_client, files=[test_files["image_file"]])
@@ -216,8 +200,92 @@ class TestRAGFunctionality:
         assert "UNIQUE_IDENTIFIER_IMAGE_FGHIJ" in response, "Response should contain content from the file"
         
         # Verify that at least one API call was made
-        assert mock_openai_client.chat.completions.create.call_count > 0, "API should be called"
+        assert create.call_count > 0, "API should be called"
     
+    @pytest.mark.rag_text
+    def test_async_agent_uploads_in_background(self, test_files):
+        """Test that an async agent created inside a running event loop uploads its files before its first request."""
+        client = create_mock_async_openai()
+
+        async def run():
+            agent = Agent(client, files=[test_files["text_file"]])
+            assert agent.files == []  # Construction does not wait for the upload
+            response = await agent.invoke("user", "Summarize the document")
+            return agent, response
+
+        agent, response = asyncio.run(run())
+        assert response == "This is a mock response from GPT"
+        assert [f.id for f in agent.files] == ["mock-file-id"]
+        client.files.create.assert_awaited_once()
+
+    @pytest.mark.rag_text
+    def test_clones_share_background_upload(self, test_files):
+        """Test that clones made while files are still uploading add the uploaded files once between them."""
+        client = create_mock_async_openai()
+
+        async def run():
+            agent = Agent(client, files=[test_files["text_file"]])
+            clones = [agent.clone(), agent.clone()]
+            for a in (*clones, agent):
+                await a.invoke("user", "Summarize the document")
+            return agent, clones
+
+        agent, clones = asyncio.run(run())
+        client.files.create.assert_awaited_once()
+        for a in (agent, *clones):
+            assert [f.id for f in a.files] == ["mock-file-id"]
+
+    @pytest.mark.rag_text
+    def test_concurrent_invokes_wait_for_background_upload(self, test_files):
+        """Test that every invoke started while files are uploading waits for them and sends them with its request."""
+        client = create_mock_async_openai()
+
+        async def upload(file, purpose):
+            await asyncio.sleep(0.05)
+            return MagicMock(id="mock-file-id")
+
+        client.files.create.side_effect = upload
+
+        # Record the files the agent holds as each request is sent
+        agents = []
+        sent_with = []
+        response = client.chat.completions.create.return_value
+
+        async def create(**kwargs):
+            sent_with.append([f.id for f in agents[0].files])
+            return response
+
+        client.chat.completions.create.side_effect = create
+
+        async def run():
+            agents.append(Agent(client, files=[test_files["text_file"]]))
+            await asyncio.gather(agents[0].invoke("user", "First question"), agents[0].invoke("user", "Second question"))
+
+        asyncio.run(run())
+        assert sent_with == [["mock-file-id"], ["mock-file-id"]]
+
+    @pytest.mark.rag_text
+    def test_async_agent_uploads_files_concurrently(self, test_files):
+        """Test that an async agent uploads several files at once and keeps them in the order given."""
+        client = create_mock_async_openai()
+        paths = [test_files["text_file"], test_files["json_file"], test_files["large_file"]]
+        running = 0
+        peak = 0
+
+        async def upload(file, purpose):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return MagicMock(id=os.path.basename(file.name))
+
+        client.files.create.side_effect = upload
+        agent = Agent(client, files=paths)
+
+        assert peak == len(paths)
+        assert [f.id for f in agent.files] == [os.path.basename(path) for path in paths]
+
     @pytest.mark.rag_unsupported
     def test_unsupported_file_handling(self, mock_openai_client, test_files):
         """Test OpenAI agent properly handles unsupported file types."""
@@ -231,136 +299,117 @@ class TestRAGFunctionality:
             # Verify warning message was printed
             mock_print.assert_called_once()
             # Get the first positional argument of the first call
-            call_args = mock_print.call_args[0][0]
+            call_args = mock_print.call_args.args[0]
             # Check that the string contains our expected text
             assert "Unsupported file type" in str(call_args), f"Expected warning about unsupported file type, got: {call_args}"
     
     @pytest.mark.rag_content
-    def test_openai_rag_content_reaching_agent(self, mock_openai_client):
+    def test_openai_rag_content_reaching_agent(self, mock_openai_client, tmp_path):
         """Test that RAG content actually reaches the OpenAI agent and affects its response."""
         # Create a temporary file with specific content to test
-        with tempfile.NamedTemporaryFile(suffix=".txt", mode="w") as temp_file:
-            # Write content to the file with a unique identifier
-            unique_content = "Unique identifier: XYZ-123-ABC"
-            temp_file.write(unique_content)
-            temp_file.flush()
-            
-            # Track all params passed to completions.create
-            create_params = []
-            # Track if file upload was triggered
-            file_uploaded = False
-            
-            # Mock the files.create method to verify it's called
-            original_create = mock_openai_client.files.create
-            def mock_files_create(*args, **kwargs):
-                nonlocal file_uploaded
-                file_uploaded = True
-                return original_create(*args, **kwargs)
-            mock_openai_client.files.create = mock_files_create
-            
-            # Custom mock implementation that tracks all parameters
-            def mock_completions_create(*args, **kwargs):
-                # Store all params for later verification
-                create_params.append(kwargs)
-                
-                # Create response referencing the file content
-                mock_content = f"Response referencing {unique_content}"
-                mock_message = MagicMock()
-                mock_message.content = mock_content
-                mock_choice = MagicMock()
-                mock_choice.message = mock_message
-                mock_response = MagicMock()
-                mock_response.choices = [mock_choice]
-                return mock_response
-            
-            # Replace the default mock with our custom implementation
-            mock_openai_client.chat.completions.create.side_effect = mock_completions_create
-            
-            # Create agent with the file
-            agent = Agent(mock_openai_client, files=[temp_file.name])
-            
-            # Verify file was uploaded
-            assert file_uploaded, "File upload should have been triggered"
-            
-            # Test invoking the agent with a prompt specifically asking about the content
-            response = agent.invoke("user", f"Find and tell me about {unique_content}")
-            
-            # Verify file details were passed in the API call
-            assert len(create_params) > 0, "API should be called with parameters"
-            
-            # Verify the response contains the unique identifier
-            assert unique_content in response, "Agent response should include the unique content from the file"
+        unique_content = "Unique identifier: XYZ-123-ABC"
+        file_path = tmp_path / "document.txt"
+        file_path.write_text(unique_content)
+        
+        # Track all params passed to completions.create
+        create_params = []
+        # Track if file upload was triggered
+        file_uploaded = False
+        
+        # Mock the files.create method to verify it's called
+        original_create = mock_openai_client.files.create
+        def mock_files_create(*args, **kwargs):
+            nonlocal file_uploaded
+            file_uploaded = True
+            return original_create(*args, **kwargs)
+        mock_openai_client.files.create = mock_files_create
+        
+        # Custom mock implementation that tracks all parameters
+        def mock_completions_create(*args, **kwargs):
+            # Store all params for later verification
+            create_params.append(kwargs)
             
-            # Verify the OpenAI client was called
-            assert mock_openai_client.chat.completions.create.call_count > 0, "OpenAI client should be called"
-    
+            # Create response referencing the file content
+            return make_openai_response(f"Response referencing {unique_content}")
+        
+        # Replace the default mock with our custom implementation
+        create = mock_openai_client.chat.completions.create
+        create.side_effect = mock_completions_create
+        
+        # Create agent with the file
+        agent = Agent(mock_openai_client, files=[str(file_path)])
+        
+        # Verify file was uploaded
+        assert file_uploaded, "File upload should have been triggered"
+        
+        # Test invoking the agent with a prompt specifically asking about the content
+        response = agent.invoke("user", f"Find and tell me about {unique_content}")
+        
+        # Verify file details were passed in the API call
+        assert len(create_params) > 0, "API should be called with parameters"
+        
+        # Verify the response contains the unique identifier
+        assert unique_content in response, "Agent response should include the unique content from the file"
+        
+        # Verify the OpenAI client was called
+        assert create.call_count > 0, "OpenAI client should be called"
+
     @pytest.mark.rag_multiple
-    def test_openai_multiple_file_processing(self, mock_openai_client):
+    def test_openai_multiple_file_processing(self, mock_openai_client, tmp_path):
         """Test that OpenAI agent can handle multiple files in a single request."""
-        # Create temporary files with unique identifiers
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Create first file with unique identifier
-            file1_path = os.path.join(temp_dir, "file1.txt")
-            file1_content = "Content of file 1 with ID: MULTI_FILE_ID_1"
-            with open(file1_path, "w") as f:
-                f.write(file1_content)
+        # Create first file with unique identifier
+        file1_path = str(tmp_path / "file1.txt")
+        file1_content = "Content of file 1 with ID: MULTI_FILE_ID_1"
+        with open(file1_path, "w") as f:
+            f.write(file1_content)
+        
+        # Create second file with unique identifier
+        file2_path = str(tmp_path / "file2.json")
+        file2_content = {"key": "Content of file 2 with ID: MULTI_FILE_ID_2"}
+        with open(file2_path, "w") as f:
+            f.write(json.dumps(file2_content))
+        
+        # Track each chat.completions.create call's file_ids parameter
+        api_calls = []
+        
+        # Custom mock implementation that captures file_ids and references content
+        def mock_completions_create(*args, **kwargs):
+            # Store the file_ids from this API call
+            if 'file_ids' in kwargs:
+                api_calls.append(kwargs['file_ids'])
             
-            # Create second file with unique identifier
-            file2_path = os.path.join(temp_dir, "file2.json")
-            file2_content = {"key": "Content of file 2 with ID: MULTI_FILE_ID_2"}
-            with open(file2_path, "w") as f:
-                f.write(json.dumps(file2_content))
+            # Create response incorporating unique IDs from both files
+            return make_openai_response(f"Found content: MULTI_FILE_ID_1 and MULTI_FILE_ID_2 in the files")
+        
+        # Replace the default mock
+        create = mock_openai_client.chat.completions.create
+        create.side_effect = mock_completions_create
+        
+        # Create agent with multiple files - use a special mock for each file
+        with patch.object(mock_openai_client.files, 'create') as mock_create:
+            # Return a different mock file for each path. Uploads may run concurrently, so ids are keyed by 
+            # path rather than by the order of the calls
+            ids = {file1_path: "mock-file-id-1", file2_path: "mock-file-id-2"}
+            mock_create.side_effect = lambda file, purpose: MagicMock(id=ids[file.name])
             
-            # Track each chat.completions.create call's file_ids parameter
-            api_calls = []
+            # Create the agent with both files
+            agent = Agent(mock_openai_client, files=[file1_path, file2_path])
             
-            # Custom mock implementation that captures file_ids and references content
-            def mock_completions_create(*args, **kwargs):
-                # Store the file_ids from this API call
-                if 'file_ids' in kwargs:
-                    api_calls.append(kwargs['file_ids'])
-                
-                # Create response incorporating unique IDs from both files
-                mock_content = f"Found content: MULTI_FILE_ID_1 and MULTI_FILE_ID_2 in the files"
-                mock_message = MagicMock()
-                mock_message.content = mock_content
-                mock_choice = MagicMock()
-                mock_choice.message = mock_message
-                mock_response = MagicMock()
-                mock_response.choices = [mock_choice]
-                return mock_response
+            # Verify both files were initialized with different IDs, in the order given
+            assert len(agent.files) == 2, "Both files should be initialized for RAG"
+            assert agent.files[0].id == "mock-file-id-1"
+            assert agent.files[1].id == "mock-file-id-2"
             
-            # Replace the default mock
-            mock_openai_client.chat.completions.create.side_effect = mock_completions_create
+            # Verify every file was uploaded exactly once, without fixing how many calls or in which order
+            uploaded = [c.kwargs['file'].name for c in mock_create.call_args_list]
+            assert sorted(uploaded) == sorted([file1_path, file2_path])
+        
+            # Test invoking the agent with a prompt asking about both files
+            response = agent.invoke("user", "Compare the content of both files")
             
-            # Create agent with multiple files - use a special mock for each file
-            with patch.object(mock_openai_client.files, 'create') as mock_create:
-                # Create different mock file objects for each file
-                mock_file1 = MagicMock(id="mock-file-id-1")
-                mock_file2 = MagicMock(id="mock-file-id-2")
-                
-                # Return different mock files for each call
-                mock_create.side_effect = [mock_file1, mock_file2]
-                
-                # Create the agent with both files
-                agent = Agent(mock_openai_client, files=[file1_path, file2_path])
-                
-                # Verify both files were initialized with different IDs
-                assert len(agent.files) == 2, "Both files should be initialized for RAG"
-                assert agent.files[0].id == "mock-file-id-1"
-                assert agent.files[1].id == "mock-file-id-2"
-                
-                # Verify files.create was called twice with different file paths
-                assert mock_create.call_count == 2
-                assert mock_create.call_args_list[0].kwargs['file'].name == file1_path
-                assert mock_create.call_args_list[1].kwargs['file'].name == file2_path
+            # Verify that OpenAI API was called
+            assert create.call_count > 0, "OpenAI API should be called"
             
-                # Test invoking the agent with a prompt asking about both files
-                response = agent.invoke("user", "Compare the content of both files")
-                
-                # Verify that OpenAI API was called
-                assert mock_openai_client.chat.completions.create.call_count > 0, "OpenAI API should be called"
-                
-                # Verify the response contains both unique identifiers
-                assert "MULTI_FILE_ID_1" in response, "Response should contain content from file 1"
-                assert "MULTI_FILE_ID_2" in response, "Response should contain content from file 2" 
\ No newline at end of file
+            # Verify the response contains both unique identifiers
+            assert "MULTI_FILE_ID_1" in response, "Response should contain content from file 1"
+            assert "MULTI_FILE_ID_2" in response, "Response should contain content from file 2" 
\ No newline at end of file
@@ -6,13 +6,17 @@ This tests the following features:
 2. Tool execution with parameters
 3. Agent using tools for task completion
 4. Tool error handling
+5. Concurrent execution of the tool calls in one response
+6. Memoizing the results of cacheable tools
 """
+import asyncio
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 # Import the necessary components
 from impossibly import Agent, Tool, START, END
 from impossibly.utils.tools import format_tools_for_api
+from tests.utils.client_mocks import make_openai_response, make_openai_tool_calls
 
 
 @pytest.mark.tools
@@ -99,6 +103,47 @@ class TestToolFunctionality:
         with pytest.raises(NotImplementedError):
             format_tools_for_api(basic_tools, api="anthropic")
     
+    @pytest.mark.tools
+    def test_list_parameter_items(self):
+        """Test that list parameters describe their element type."""
+        tool = Tool(
+            name="search_many",
+            description="Search several queries",
+            function=lambda queries: queries,
+            parameters=[{"name": "queries", "type": list, "items": str, "description": "The queries"}]
+        )
+
+        properties = tool.format_for_api("openai")["function"]["parameters"]["properties"]
+        assert properties["queries"] == {"type": "array", "description": "The queries", "items": {"type": "string"}}
+
+        with pytest.raises(ValueError):
+            Tool(name="bad", description="", function=print, parameters=[{"name": "x", "type": list, "items": set, "description": ""}])
+
+    @pytest.mark.tools_direct
+    def test_cacheable_tool_memoizes_results(self):
+        """Test that a cacheable tool runs once per distinct set of arguments, for sync and async functions."""
+        calls = []
+
+        def add(a, b):
+            calls.append((a, b))
+            return a + b
+
+        async def add_async(a, b):
+            calls.append((a, b))
+            return a + b
+
+        for function in (add, add_async):
+            calls.clear()
+            tool = Tool(name="add", description="Add two numbers", function=function, cacheable=True)
+            assert tool.execute(a=1, b=2) == 3
+            assert tool.execute(b=2, a=1) == 3  # Argument order does not matter
+            assert tool.execute(a=2, b=2) == 4
+            assert calls == [(1, 2), (2, 2)]
+            assert tool.cache.hits == 1
+
+        # Tools are not memoized unless they opt in
+        assert Tool(name="add", description="", function=add).cache is None
+
     @pytest.mark.tools_async
     def test_agent_with_async_tool(self, mock_anthropic_client):
         """Test that an agent can use async tools."""
@@ -134,4 +179,55 @@ class TestToolFunctionality:
         assert agent.tools[0].name == "fetch_data"
         
         # In a real test, we would set up mocks to simulate the async tool execution
-        # and verify the agent can handle the async nature correctly 
\ No newline at end of file
+        # and verify the agent can handle the async nature correctly 
+
+    @pytest.mark.tools_async
+    def test_tool_calls_run_concurrently(self, mock_openai_client):
+        """Test that the tool calls in one response run at the same time, with results kept in order."""
+        running = 0
+        peak = 0
+
+        async def slow_search(query):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return f"results for {query}"
+
+        search_tool = Tool(
+            name="search",
+            description="Search the web",
+            function=slow_search,
+            parameters=[{"name": "query", "type": str, "description": "The search query"}]
+        )
+
+        # The first response requests three searches, the second answers with their results
+        planning = make_openai_tool_calls("search", [{"query": query} for query in ["alpha", "beta", "gamma"]])
+        mock_openai_client.chat.completions.create.side_effect = [planning, make_openai_response("Done")]
+
+        agent = Agent(mock_openai_client, name="Searcher", tools=[search_tool])
+
+        assert agent.invoke("user", "Search three things") == "Done"
+        assert peak == 3
+        tool_messages = [m for m in agent.messages if m.get("role") == "tool"]
+        assert [m["content"] for m in tool_messages] == [f"Result from search: results for {q}" for q in ["alpha", "beta", "gamma"]]
+        assert [m["tool_call_id"] for m in tool_messages] == ["call-0", "call-1", "call-2"]
+
+    @pytest.mark.tools
+    def test_tools_added_later_are_used(self, mock_openai_client):
+        """Test that a tool added to an agent after it was created is advertised to the model and can be called."""
+        agent = Agent(mock_openai_client, name="Searcher")
+        agent.tools.append(Tool(
+            name="search",
+            description="Search the web",
+            function=lambda query: f"results for {query}",
+            parameters=[{"name": "query", "type": str, "description": "The search query"}]
+        ))
+
+        create = mock_openai_client.chat.completions.create
+        create.side_effect = [make_openai_tool_calls("search", [{"query": "alpha"}]), make_openai_response("Done")]
+
+        assert agent.invoke("user", "Search something") == "Done"
+        assert [tool["function"]["name"] for tool in create.call_args_list[0].kwargs["tools"]] == ["search"]
+        assert [m["content"] for m in agent.messages if m.get("role") == "tool"] == ["Result from search: results for alpha"]
@@ -4,9 +4,10 @@ Mock clients for testing.
 This module provides functions to create mock clients that will pass isinstance checks
 while also providing the necessary structure for testing.
 """
-from unittest.mock import MagicMock
+import json
+from unittest.mock import AsyncMock, MagicMock
 from anthropic import Anthropic
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 
 class MockAnthropic(Anthropic):
@@ -63,6 +64,23 @@ class MockOpenAI(OpenAI):
         self.files.delete.return_value = delete_response
 
 
+class MockAsyncOpenAI(AsyncOpenAI):
+    """A class that inherits from AsyncOpenAI for isinstance checks, with awaitable API methods."""
+    
+    def __init__(self):
+        # Don't call super().__init__() because it requires API keys
+        self.chat = MagicMock()
+        mock_message = MagicMock()
+        mock_message.content = "This is a mock response from GPT"
+        mock_message.tool_calls = None
+        self.chat.completions.create = AsyncMock(return_value=MagicMock(choices=[MagicMock(message=mock_message)]))
+        
+        self.files = MagicMock()
+        mock_file = MagicMock()
+        mock_file.id = "mock-file-id"
+        self.files.create = AsyncMock(return_value=mock_file)
+
+
 def create_mock_anthropic():
     """Create a mock Anthropic client that will pass isinstance checks."""
     return MockAnthropic()
@@ -70,4 +88,30 @@ def create_mock_anthropic():
 
 def create_mock_openai():
     """Create a mock OpenAI client that will pass isinstance checks."""
-    return MockOpenAI() 
\ No newline at end of file
+    return MockOpenAI() 
+
+
+def create_mock_async_openai():
+    """Create a mock AsyncOpenAI client that will pass isinstance checks."""
+    return MockAsyncOpenAI()
+
+
+def make_openai_response(content):
+    """Create a chat completion response that answers with text and requests no tool calls."""
+    message = MagicMock()
+    message.content = content
+    message.tool_calls = None
+    return MagicMock(choices=[MagicMock(message=message)])
+
+
+def make_openai_tool_calls(name, arguments):
+    """Create a chat completion response that calls one tool once for each set of arguments, with ids call-0, call-1, ..."""
+    calls = []
+    for i, args in enumerate(arguments):
+        call = MagicMock(id=f"call-{i}")
+        call.function.name = name
+        call.function.arguments = json.dumps(args)
+        calls.append(call)
+    message = MagicMock()
+    message.tool_calls = calls
+    return MagicMock(choices=[MagicMock(message=message)])
@@ -10,6 +10,12 @@ import json
 import base64
 from pathlib import Path
 
+# A minimal valid PNG file for a 1x1 transparent pixel, decoded once at import
+MIN_PNG_BYTES = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+P+/HgAFEwJgGmBKJQAA"
+    "AABJRU5ErkJggg=="
+)
+
 
 def create_test_files(output_dir):
     """Create test files for RAG testing.
@@ -64,13 +70,8 @@ def create_test_files(output_dir):
             f.write(lorem_ipsum)
     
     # Create a minimal valid PNG file (1x1 pixel)
-    # This is a minimal valid PNG file for a 1x1 transparent pixel
-    png_data = base64.b64decode(
-        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+P+/HgAFEwJgGmBKJQAA"
-        "AABJRU5ErkJggg=="
-    )
     with open(os.path.join(output_dir, "sample.png"), "wb") as f:
-        f.write(png_data)
+        f.write(MIN_PNG_BYTES)
     
     # Create a file with an unsupported extension
     with open(os.path.join(output_dir, "unsupported.xyz"), "w") as f: